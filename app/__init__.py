@@ -6,6 +6,8 @@ def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
     init_db()
+    from app.services import runtime
+    runtime.subscribe("app-config", None, lambda changed: app.config.update({k: runtime.coerce(k, v) for k, v in changed.items()}))
     admin_prefix = f"/{app.config['ADMIN_PATH']}" if app.config["ADMIN_PATH"] else ""
     payment_prefix = f"/{app.config['PAYMENT_PATH']}" if app.config["PAYMENT_PATH"] else ""
     from app.routes.api import api_bp
@@ -14,8 +16,20 @@ def create_app():
     app.register_blueprint(api_bp, url_prefix=payment_prefix)
     app.register_blueprint(make_payment_bp(payment_prefix))
     app.register_blueprint(make_admin_bp(admin_prefix))
+    from app.services import admission
+    admission.init_app(app)
+    from app.services import assets
+    assets.init_app(app)
     from app.services.monitor import start_monitor
     start_monitor(app)
+    from app.services.sweeper import start_sweeper
+    start_sweeper(app)
+    from app.services.subscriber import start_subscribers
+    start_subscribers(app)
+    from app.services.archiver import start_maintenance
+    start_maintenance(app)
+    from app.services.webhooks import start_webhooks
+    start_webhooks(app)
     from updater import Updater
     _version = Updater().current_version
     @app.context_processor
@@ -9,13 +9,68 @@ class Config:
     MAIN_WALLET_ADDRESS = os.getenv("MAIN_WALLET_ADDRESS", "")  # blank = auto-derive from MAIN_MNEMONIC index 0
     BSC_RPC_URL = os.getenv("BSC_RPC_URL", "https://bsc-dataseed.binance.org")
     POLYGON_RPC_URL = os.getenv("POLYGON_RPC_URL", "https://polygon-rpc.com")
+    RPC_HEDGE = os.getenv("RPC_HEDGE", "true").lower() == "true"
+    RPC_HEDGE_MIN_MS = int(os.getenv("RPC_HEDGE_MIN_MS", 150))
+    RPC_HEDGE_DEFAULT_MS = int(os.getenv("RPC_HEDGE_DEFAULT_MS", 1000))  # hedge deadline until an endpoint has a p95
+    RPC_BREAKER_FAILURES = int(os.getenv("RPC_BREAKER_FAILURES", 3))
+    RPC_BREAKER_COOLDOWN_SECONDS = int(os.getenv("RPC_BREAKER_COOLDOWN_SECONDS", 30))
+    RPC_EWMA_ALPHA = float(os.getenv("RPC_EWMA_ALPHA", 0.3))
+    RPC_BUDGET_PER_SECOND = float(os.getenv("RPC_BUDGET_PER_SECOND", 0))  # 0 = unlimited
+    BSC_RPC_BUDGET_PER_SECOND = os.getenv("BSC_RPC_BUDGET_PER_SECOND", "")  # blank = RPC_BUDGET_PER_SECOND
+    POLYGON_RPC_BUDGET_PER_SECOND = os.getenv("POLYGON_RPC_BUDGET_PER_SECOND", "")
+    RPC_BUDGET_BURST_SECONDS = float(os.getenv("RPC_BUDGET_BURST_SECONDS", 2))
+    RPC_BUDGET_RESERVE_PERCENT = int(os.getenv("RPC_BUDGET_RESERVE_PERCENT", 25))
+    RPC_BUDGET_MAX_WAIT_SECONDS = float(os.getenv("RPC_BUDGET_MAX_WAIT_SECONDS", 5))
+    BSC_WS_URL = os.getenv("BSC_WS_URL", "")  # blank = polling only
+    POLYGON_WS_URL = os.getenv("POLYGON_WS_URL", "")  # blank = polling only
     ADMIN_PATH = os.getenv("ADMIN_PATH", "admin")
     PAYMENT_PATH = os.getenv("PAYMENT_PATH", "pay")
     INVOICE_TTL_MINUTES = int(os.getenv("INVOICE_TTL_MINUTES", 30))
+    MERCHANT_REF_METADATA_KEY = os.getenv("MERCHANT_REF_METADATA_KEY", "order_id")  # blank = only explicit merchant_ref
+    IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", 24))
+    IDEMPOTENCY_WAIT_SECONDS = int(os.getenv("IDEMPOTENCY_WAIT_SECONDS", 30))  # how long a duplicate waits on the in-flight original
+    IDEMPOTENCY_STALE_SECONDS = int(os.getenv("IDEMPOTENCY_STALE_SECONDS", 120))
     BSC_CONFIRMATIONS = int(os.getenv("BSC_CONFIRMATIONS", 3))
     POLYGON_CONFIRMATIONS = int(os.getenv("POLYGON_CONFIRMATIONS", 1))
     GAS_BUFFER_PERCENT = int(os.getenv("GAS_BUFFER_PERCENT", 60))
+    BSC_FEE_MODE = os.getenv("BSC_FEE_MODE", "legacy")  # legacy | eip1559 | auto
+    POLYGON_FEE_MODE = os.getenv("POLYGON_FEE_MODE", "auto")
+    BSC_MIN_PRIORITY_GWEI = float(os.getenv("BSC_MIN_PRIORITY_GWEI", 0))
+    POLYGON_MIN_PRIORITY_GWEI = float(os.getenv("POLYGON_MIN_PRIORITY_GWEI", 30))
+    FEE_HISTORY_BLOCKS = int(os.getenv("FEE_HISTORY_BLOCKS", 20))
+    FEE_PRIORITY_PERCENTILE = int(os.getenv("FEE_PRIORITY_PERCENTILE", 50))
+    FEE_HISTORY_TTL = float(os.getenv("FEE_HISTORY_TTL", 15))
+    TOKEN_GAS_LIMIT_MARGIN_PERCENT = int(os.getenv("TOKEN_GAS_LIMIT_MARGIN_PERCENT", 10))
     POLL_INTERVAL_SECONDS = int(os.getenv("POLL_INTERVAL_SECONDS", 20))
+    WS_POLL_INTERVAL_SECONDS = int(os.getenv("WS_POLL_INTERVAL_SECONDS", 120))  # safety-net poll while subscriptions are live
+    WS_CHECK_NATIVE_ON_HEAD = os.getenv("WS_CHECK_NATIVE_ON_HEAD", "true").lower() == "true"
+    BSC_SWEEP_MAX_GAS_GWEI = float(os.getenv("BSC_SWEEP_MAX_GAS_GWEI", 0))
+    POLYGON_SWEEP_MAX_GAS_GWEI = float(os.getenv("POLYGON_SWEEP_MAX_GAS_GWEI", 0))
+    SWEEP_MAX_DELAY_MINUTES = int(os.getenv("SWEEP_MAX_DELAY_MINUTES", 60))
+    SWEEP_BATCH_SIZE = int(os.getenv("SWEEP_BATCH_SIZE", 20))
+    SWEEP_INTERVAL_SECONDS = int(os.getenv("SWEEP_INTERVAL_SECONDS", 0))  # 0 = POLL_INTERVAL_SECONDS
+    RECEIPT_POLL_SECONDS = float(os.getenv("RECEIPT_POLL_SECONDS", 2))
+    RECEIPT_TIMEOUT_SECONDS = int(os.getenv("RECEIPT_TIMEOUT_SECONDS", 300))
+    RECEIPT_STUCK_SECONDS = int(os.getenv("RECEIPT_STUCK_SECONDS", 60))
+    RECEIPT_BUMP_PERCENT = int(os.getenv("RECEIPT_BUMP_PERCENT", 20))
+    RECEIPT_MAX_BUMPS = int(os.getenv("RECEIPT_MAX_BUMPS", 2))  # keep bump**n under GAS_BUFFER_PERCENT
+    ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 30))
+    MAINTENANCE_INTERVAL_MINUTES = int(os.getenv("MAINTENANCE_INTERVAL_MINUTES", 60))
+    ADDRESS_RECYCLING = os.getenv("ADDRESS_RECYCLING", "false").lower() == "true"
+    ADDRESS_RECYCLE_COOLDOWN_HOURS = float(os.getenv("ADDRESS_RECYCLE_COOLDOWN_HOURS", 72))
+    ADDRESS_RECYCLE_BATCH = int(os.getenv("ADDRESS_RECYCLE_BATCH", 100))  # addresses checked per maintenance run
+    INVOICE_CACHE_OPEN_TTL = int(os.getenv("INVOICE_CACHE_OPEN_TTL", 5))
+    INVOICE_CACHE_TERMINAL_TTL = int(os.getenv("INVOICE_CACHE_TERMINAL_TTL", 3600))
+    PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", 1000))  # rendered pay pages kept per invoice state
+    COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 500))
+    COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", 6))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", 5))  # only if the brotli package is installed
+    DB_WRITER_MAX_BATCH = int(os.getenv("DB_WRITER_MAX_BATCH", 256))
+    DB_WRITER_LINGER_MS = float(os.getenv("DB_WRITER_LINGER_MS", 2))  # bounded extra latency per write for group commit
+    DB_READERS = int(os.getenv("DB_READERS", 8))
+    RPC_CACHE_GAS_PRICE_TTL = float(os.getenv("RPC_CACHE_GAS_PRICE_TTL", 5))
+    RPC_CACHE_BLOCK_TTL = float(os.getenv("RPC_CACHE_BLOCK_TTL", 2))
+    RPC_CACHE_BALANCE_TTL = int(os.getenv("RPC_CACHE_BALANCE_TTL", 10))  # fee-wallet balances on dashboard and /api/wallets only
     PORT = int(os.getenv("PORT", 5000))
     AUTO_UPDATE = os.getenv("AUTO_UPDATE", "true").lower() == "true"
     UPDATE_CHECK_INTERVAL = int(os.getenv("UPDATE_CHECK_INTERVAL", 300))
@@ -24,3 +79,18 @@ class Config:
     UPDATE_HTTPS_PROXY = os.getenv("UPDATE_HTTPS_PROXY", "")
     ENV_PATH = os.getenv("ENV_PATH", "/etc/ghostpayments/.env")
     WAITRESS_THREADS = int(os.getenv("WAITRESS_THREADS", 8))
+    ADMISSION_PUBLIC_CONCURRENCY = int(os.getenv("ADMISSION_PUBLIC_CONCURRENCY", 0))  # 0 = half of WAITRESS_THREADS
+    ADMISSION_STREAM_CONCURRENCY = int(os.getenv("ADMISSION_STREAM_CONCURRENCY", 0))  # 0 = quarter of WAITRESS_THREADS
+    ADMISSION_RATE_PER_SECOND = int(os.getenv("ADMISSION_RATE_PER_SECOND", 5))
+    ADMISSION_BURST = int(os.getenv("ADMISSION_BURST", 20))
+    PAY_STREAM_POLL_SECONDS = float(os.getenv("PAY_STREAM_POLL_SECONDS", 10))
+    HANDOFF_READY_TIMEOUT_SECONDS = float(os.getenv("HANDOFF_READY_TIMEOUT_SECONDS", 60))
+    HANDOFF_DRAIN_SECONDS = float(os.getenv("HANDOFF_DRAIN_SECONDS", 30))
+    HANDOFF_SWEEP_GRACE_SECONDS = float(os.getenv("HANDOFF_SWEEP_GRACE_SECONDS", 60))
+    WEBHOOK_CONCURRENCY = int(os.getenv("WEBHOOK_CONCURRENCY", 8))
+    WEBHOOK_HOST_CONCURRENCY = int(os.getenv("WEBHOOK_HOST_CONCURRENCY", 2))  # keep-alive connections / in-flight deliveries per merchant host
+    WEBHOOK_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", 10))
+    WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", 8))  # then dead-lettered
+    WEBHOOK_BACKOFF_SECONDS = float(os.getenv("WEBHOOK_BACKOFF_SECONDS", 10))
+    WEBHOOK_MAX_BACKOFF_SECONDS = float(os.getenv("WEBHOOK_MAX_BACKOFF_SECONDS", 3600))
+    WEBHOOK_POLL_SECONDS = float(os.getenv("WEBHOOK_POLL_SECONDS", 2))
@@ -2,7 +2,7 @@ import sqlite3
 import os
 from flask import g, current_app
 
-SCHEMA_VERSION = 2
+SCHEMA_VERSION = 11
 
 def get_db():
     if "db" not in g:
@@ -28,14 +28,18 @@ def open_db(db_path=None):
 def init_db(db_path=None):
     db_path = db_path or os.getenv("DB_PATH", "data/ghost.db")
     os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    fresh = not os.path.exists(db_path) or os.path.getsize(db_path) == 0
     db = sqlite3.connect(db_path, check_same_thread=False)
     db.row_factory = sqlite3.Row
+    if fresh:
+        db.execute("PRAGMA auto_vacuum=INCREMENTAL")
     db.execute("PRAGMA journal_mode=WAL")
     db.execute("PRAGMA foreign_keys=ON")
     db.execute("PRAGMA busy_timeout=5000")
     version = db.execute("PRAGMA user_version").fetchone()[0]
     if version == 0:
         _apply_initial_schema(db)
+        version = db.execute("PRAGMA user_version").fetchone()[0]
     _run_migrations(db, version)
     db.close()
 
@@ -89,3 +93,168 @@ def _run_migrations(db, current_version):
         db.execute("UPDATE invoices SET amount_requested=amount_native WHERE amount_requested IS NULL")
         db.execute("PRAGMA user_version=2")
         db.commit()
+    if current_version < 3:
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS invoices_archive (
+                id              TEXT PRIMARY KEY,
+                chain           TEXT NOT NULL,
+                token           TEXT NOT NULL,
+                amount_native   TEXT NOT NULL,
+                amount_requested TEXT,
+                amount_usd      REAL,
+                deposit_address TEXT NOT NULL,
+                hd_index        INTEGER NOT NULL,
+                status          TEXT NOT NULL,
+                tx_in_hash      TEXT,
+                gas_tx_hash     TEXT,
+                tx_out_hash     TEXT,
+                webhook_url     TEXT,
+                metadata        TEXT,
+                created_at      TEXT NOT NULL,
+                expires_at      TEXT NOT NULL,
+                confirmed_at    TEXT,
+                completed_at    TEXT
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_invoices_archive_status   ON invoices_archive(status);
+            CREATE INDEX IF NOT EXISTS idx_invoices_archive_created  ON invoices_archive(created_at);
+            CREATE INDEX IF NOT EXISTS idx_invoices_archive_hd_index ON invoices_archive(hd_index);
+            CREATE INDEX IF NOT EXISTS idx_invoices_hd_index         ON invoices(hd_index);
+        """)
+        _create_invoices_view(db)
+        db.execute("PRAGMA user_version=3")
+        db.commit()
+    if current_version < 4:
+        for table in ("invoices", "invoices_archive"):
+            db.execute(f"ALTER TABLE {table} ADD COLUMN gas_expected_wei INTEGER")
+            db.execute(f"ALTER TABLE {table} ADD COLUMN gas_spent_wei INTEGER")
+        _create_invoices_view(db)
+        db.execute("PRAGMA user_version=4")
+        db.commit()
+    if current_version < 5:
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS invoice_events (
+                id              INTEGER PRIMARY KEY AUTOINCREMENT,
+                invoice_id      TEXT NOT NULL,
+                chain           TEXT NOT NULL,
+                event           TEXT NOT NULL,
+                tx_hash         TEXT,
+                block_number    INTEGER,
+                detail          TEXT,
+                created_at      TEXT NOT NULL
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_invoice_events_invoice ON invoice_events(invoice_id, id);
+            CREATE INDEX IF NOT EXISTS idx_invoice_events_event   ON invoice_events(event, created_at);
+
+            CREATE TRIGGER IF NOT EXISTS invoice_events_no_update BEFORE UPDATE ON invoice_events
+            BEGIN SELECT RAISE(ABORT, 'invoice_events is append-only'); END;
+            CREATE TRIGGER IF NOT EXISTS invoice_events_no_delete BEFORE DELETE ON invoice_events
+            BEGIN SELECT RAISE(ABORT, 'invoice_events is append-only'); END;
+
+            PRAGMA user_version = 5;
+        """)
+        db.commit()
+    if current_version < 6:
+        key = os.getenv("MERCHANT_REF_METADATA_KEY", "order_id")
+        for table in ("invoices", "invoices_archive"):
+            db.execute(f"ALTER TABLE {table} ADD COLUMN merchant_ref TEXT")
+            if key:
+                db.execute(f"""UPDATE {table} SET merchant_ref=CAST(json_extract(metadata, '$.' || ?) AS TEXT)
+                    WHERE metadata IS NOT NULL AND json_valid(metadata)""", (key,))
+            db.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_merchant_ref ON {table}(merchant_ref, created_at) WHERE merchant_ref IS NOT NULL")
+        _create_invoices_view(db)
+        db.execute("PRAGMA user_version=6")
+        db.commit()
+    if current_version < 7:
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+                api_key_id      TEXT NOT NULL,
+                idem_key        TEXT NOT NULL,
+                request_hash    TEXT NOT NULL,
+                state           TEXT NOT NULL CHECK(state IN ('in_flight','done')),
+                response_code   INTEGER,
+                response_body   TEXT,
+                created_at      TEXT NOT NULL,
+                expires_at      TEXT NOT NULL,
+                PRIMARY KEY (api_key_id, idem_key)
+            ) WITHOUT ROWID;
+
+            CREATE INDEX IF NOT EXISTS idx_idempotency_expires ON idempotency_keys(expires_at);
+
+            PRAGMA user_version = 7;
+        """)
+        db.commit()
+    if current_version < 8:
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS webhook_outbox (
+                id              INTEGER PRIMARY KEY AUTOINCREMENT,
+                invoice_id      TEXT NOT NULL,
+                event           TEXT NOT NULL,
+                url             TEXT NOT NULL,
+                payload         TEXT NOT NULL,
+                state           TEXT NOT NULL DEFAULT 'pending' CHECK(state IN ('pending','delivered','dead')),
+                attempts        INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at TEXT NOT NULL,
+                last_status     INTEGER,
+                last_error      TEXT,
+                created_at      TEXT NOT NULL,
+                delivered_at    TEXT
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_outbox_due ON webhook_outbox(next_attempt_at) WHERE state='pending';
+            CREATE INDEX IF NOT EXISTS idx_outbox_state ON webhook_outbox(state, created_at);
+            CREATE INDEX IF NOT EXISTS idx_outbox_invoice ON webhook_outbox(invoice_id);
+
+            PRAGMA user_version = 8;
+        """)
+        db.commit()
+    if current_version < 9:
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS sweep_journal (
+                id              INTEGER PRIMARY KEY AUTOINCREMENT,
+                invoice_id      TEXT NOT NULL,
+                chain           TEXT NOT NULL,
+                kind            TEXT NOT NULL CHECK(kind IN ('gas_topup','transfer','refund')),
+                from_address    TEXT NOT NULL,
+                nonce           INTEGER NOT NULL,
+                raw_tx          TEXT NOT NULL,
+                tx_hash         TEXT NOT NULL,
+                state           TEXT NOT NULL DEFAULT 'signed' CHECK(state IN ('signed','broadcast','mined','replaced')),
+                block_number    INTEGER,
+                created_at      TEXT NOT NULL,
+                updated_at      TEXT NOT NULL
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_journal_invoice ON sweep_journal(invoice_id, kind);
+            CREATE INDEX IF NOT EXISTS idx_journal_open ON sweep_journal(state) WHERE state IN ('signed','broadcast');
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_journal_hash ON sweep_journal(tx_hash);
+
+            PRAGMA user_version = 9;
+        """)
+        db.commit()
+    if current_version < 10:
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS address_pool (
+                hd_index        INTEGER PRIMARY KEY,
+                deposit_address TEXT NOT NULL,
+                state           TEXT NOT NULL CHECK(state IN ('available','leased','dirty')),
+                checked_at      TEXT NOT NULL,
+                leased_at       TEXT
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_address_pool_available ON address_pool(checked_at) WHERE state='available';
+
+            PRAGMA user_version = 10;
+        """)
+        db.commit()
+    if current_version < 11:
+        from app.services.search import create_search_index
+        create_search_index(db)
+        db.execute("PRAGMA user_version = 11")
+        db.commit()
+
+def _create_invoices_view(db):
+    cols = ", ".join(r[1] for r in db.execute("PRAGMA table_info(invoices)").fetchall())
+    db.execute("DROP VIEW IF EXISTS invoices_all")
+    db.execute(f"CREATE VIEW invoices_all AS SELECT {cols} FROM invoices UNION ALL SELECT {cols} FROM invoices_archive")
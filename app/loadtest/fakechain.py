@@ -0,0 +1,177 @@
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import rlp
+from eth_account import Account
+from eth_utils import keccak, to_checksum_address
+
+BALANCE_OF = "0x70a08231"
+DECIMALS = "0x313ce567"
+TRANSFER = "a9059cbb"
+CHAIN_IDS = {"BSC": 56, "POLYGON": 137}
+
+def _hex(value):
+    return hex(value)
+
+def _word(value):
+    return "0x" + value.to_bytes(32, "big").hex()
+
+def _addr(raw):
+    return to_checksum_address("0x" + raw.hex()) if raw else None
+
+class FakeChain:
+    def __init__(self, chain="BSC", block_time=1.0, gas_price=3 * 10**9, token_decimals=18, token_gas=52000):
+        self.chain = chain
+        self.chain_id = CHAIN_IDS.get(chain, 1337)
+        self.block_time = block_time
+        self.gas_price = gas_price
+        self.token_decimals = token_decimals
+        self.token_gas = token_gas
+        self.block = 1
+        self.native = {}
+        self.tokens = {}
+        self.nonces = {}
+        self.mempool = []
+        self.receipts = {}
+        self.calls = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._server = None
+
+    def credit(self, address, amount, token=False):
+        book = self.tokens if token else self.native
+        with self._lock:
+            key = address.lower()
+            book[key] = book.get(key, 0) + amount
+
+    def balance(self, address, token=False):
+        with self._lock:
+            return (self.tokens if token else self.native).get(address.lower(), 0)
+
+    def mine(self):
+        with self._lock:
+            self.block += 1
+            pending, self.mempool = self.mempool, []
+            for index, (tx_hash, sender, to, value, data, gas_price, token) in enumerate(pending):
+                gas_used = self.token_gas if token else 21000
+                self.native[sender] = self.native.get(sender, 0) - value - gas_used * gas_price
+                status = 1
+                if token:
+                    recipient, amount = "0x" + data[16:36].hex(), int.from_bytes(data[36:68], "big")
+                    if self.tokens.get(sender, 0) >= amount:
+                        self.tokens[sender] = self.tokens.get(sender, 0) - amount
+                        self.tokens[recipient] = self.tokens.get(recipient, 0) + amount
+                    else:
+                        status = 0
+                elif to:
+                    self.native[to.lower()] = self.native.get(to.lower(), 0) + value
+                self.receipts[tx_hash] = {"transactionHash": tx_hash, "blockNumber": _hex(self.block),
+                    "blockHash": "0x" + keccak(self.block.to_bytes(8, "big")).hex(), "transactionIndex": _hex(index),
+                    "from": sender, "to": to, "gasUsed": _hex(gas_used), "cumulativeGasUsed": _hex(gas_used),
+                    "effectiveGasPrice": _hex(gas_price), "status": _hex(status), "type": "0x0", "logs": [],
+                    "logsBloom": "0x" + "00" * 256, "contractAddress": None}
+
+    def _send_raw(self, raw_hex):
+        raw = bytes.fromhex(raw_hex[2:])
+        sender = Account.recover_transaction(raw).lower()
+        if raw[0] == 2:
+            fields = rlp.decode(raw[1:])
+            nonce, gas_price, to, value, data = fields[1], fields[3], fields[5], fields[6], fields[7]
+        else:
+            fields = rlp.decode(raw)
+            nonce, gas_price, to, value, data = fields[0], fields[1], fields[3], fields[4], fields[5]
+        tx_hash = "0x" + keccak(raw).hex()
+        token = data[:4].hex() == TRANSFER
+        with self._lock:
+            self.nonces[sender] = max(self.nonces.get(sender, 0), int.from_bytes(nonce, "big") + 1)
+            self.mempool.append((tx_hash, sender, _addr(to), int.from_bytes(value, "big"), data,
+                int.from_bytes(gas_price, "big"), token))
+        return tx_hash
+
+    def _call(self, tx):
+        data = tx.get("data") or tx.get("input") or "0x"
+        if data.startswith(BALANCE_OF):
+            return _word(self.balance("0x" + data[-40:], token=True))
+        if data.startswith(DECIMALS):
+            return _word(self.token_decimals)
+        return "0x"
+
+    def _block(self):
+        return {"number": _hex(self.block), "hash": "0x" + keccak(self.block.to_bytes(8, "big")).hex(),
+            "parentHash": "0x" + keccak((self.block - 1).to_bytes(8, "big")).hex(), "timestamp": _hex(int(time.time())),
+            "extraData": "0x", "gasLimit": _hex(30_000_000), "gasUsed": "0x0", "miner": "0x" + "00" * 20,
+            "difficulty": "0x2", "nonce": "0x0000000000000000", "transactions": [], "uncles": [], "size": "0x200",
+            "logsBloom": "0x" + "00" * 256, "sha3Uncles": "0x" + "00" * 32, "stateRoot": "0x" + "00" * 32,
+            "transactionsRoot": "0x" + "00" * 32, "receiptsRoot": "0x" + "00" * 32}
+
+    def handle(self, method, params):
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        if method == "eth_chainId":
+            return _hex(self.chain_id)
+        if method == "net_version":
+            return str(self.chain_id)
+        if method == "eth_blockNumber":
+            return _hex(self.block)
+        if method == "eth_gasPrice":
+            return _hex(self.gas_price)
+        if method == "eth_getBalance":
+            return _hex(self.balance(params[0]))
+        if method == "eth_getTransactionCount":
+            with self._lock:
+                return _hex(self.nonces.get(params[0].lower(), 0))
+        if method == "eth_call":
+            return self._call(params[0])
+        if method == "eth_estimateGas":
+            return _hex(self.token_gas if (params[0].get("data") or "").startswith("0x" + TRANSFER) else 21000)
+        if method == "eth_getBlockByNumber":
+            return self._block()
+        if method == "eth_sendRawTransaction":
+            return self._send_raw(params[0])
+        if method == "eth_getTransactionReceipt":
+            with self._lock:
+                return self.receipts.get(params[0])
+        raise NotImplementedError(method)
+
+    def _dispatch(self, request):
+        try:
+            result = self.handle(request["method"], request.get("params") or [])
+            return {"jsonrpc": "2.0", "id": request.get("id"), "result": result}
+        except NotImplementedError as e:
+            return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32601, "message": f"method not found: {e}"}}
+        except Exception as e:
+            return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32000, "message": str(e)}}
+
+    def _miner(self):
+        while not self._stop.wait(self.block_time):
+            self.mine()
+
+    def start(self, host="127.0.0.1", port=0):
+        chain = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                result = [chain._dispatch(r) for r in payload] if isinstance(payload, list) else chain._dispatch(payload)
+                body = json.dumps(result).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name=f"fakechain-{self.chain}", daemon=True).start()
+        threading.Thread(target=self._miner, name=f"fakechain-{self.chain}-miner", daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}"
+
+    def stop(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
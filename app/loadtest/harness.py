@@ -0,0 +1,328 @@
+import os
+import sys
+import json
+import time
+import random
+import importlib
+import hashlib
+import logging
+import argparse
+import tempfile
+import threading
+from decimal import Decimal
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from app.loadtest.fakechain import FakeChain
+
+MNEMONIC = "abandon abandon abandon abandon abandon abandon abandon abandon abandon abandon abandon about"
+MAIN_WALLET = "0x000000000000000000000000000000000000dEaD"
+API_KEY = "gp_loadtest000000000000000000000000000"
+TERMINAL = ("completed", "expired", "failed")
+SSE_RETRY_SECONDS = 3
+
+def _percentile(values, pct):
+    from app.services.events import _percentile
+    return _percentile(values, pct)
+
+def _summary(values):
+    values = sorted(values)
+    if not values:
+        return None
+    return {"count": len(values), "p50": round(_percentile(values, 50), 4), "p95": round(_percentile(values, 95), 4),
+        "p99": round(_percentile(values, 99), 4), "max": round(values[-1], 4)}
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = {}
+        self.errors = {}
+        self.payment = {}
+        self.outcomes = {}
+
+    def request(self, kind, seconds, code):
+        with self._lock:
+            self.latency.setdefault(kind, []).append(seconds)
+            if not isinstance(code, int) or code >= 400:
+                self.errors.setdefault(kind, {}).setdefault(code, 0)
+                self.errors[kind][code] += 1
+
+    def failed(self, kind, error):
+        with self._lock:
+            self.errors.setdefault(kind, {}).setdefault(type(error).__name__, 0)
+            self.errors[kind][type(error).__name__] += 1
+
+    def payment_latency(self, phase, seconds):
+        with self._lock:
+            self.payment.setdefault(phase, []).append(seconds)
+
+    def outcome(self, status):
+        with self._lock:
+            self.outcomes[status] = self.outcomes.get(status, 0) + 1
+
+class ThreadSampler(threading.Thread):
+    def __init__(self, dispatcher, interval=0.05):
+        super().__init__(name="loadtest-sampler", daemon=True)
+        self.dispatcher = dispatcher
+        self.interval = interval
+        self.samples = []
+        self._halt = threading.Event()
+
+    def run(self):
+        d = self.dispatcher
+        while not self._halt.wait(self.interval):
+            with d.lock:
+                self.samples.append((len(d.threads), d.active_count, len(d.queue)))
+
+    def stop(self):
+        self._halt.set()
+        self.join()
+
+    def report(self):
+        if not self.samples:
+            return {}
+        threads = max(s[0] for s in self.samples)
+        busy = [min(s[1], s[0]) for s in self.samples]
+        return {"threads": threads, "peak_busy": max(busy), "mean_busy_pct": round(100 * sum(busy) / (threads * len(busy)), 1),
+            "saturated_pct": round(100 * sum(1 for s in self.samples if s[1] >= s[0]) / len(self.samples), 1),
+            "peak_queue": max(s[2] for s in self.samples), "samples": len(self.samples)}
+
+class Checkout:
+    def __init__(self, n, base, pp, args, chain, recorder):
+        self.n = n
+        self.base = base
+        self.pp = pp
+        self.args = args
+        self.chain = chain
+        self.recorder = recorder
+        self.session = requests.Session()
+        self.browser = {"X-Real-IP": f"10.{n // 65536 % 256}.{n // 256 % 256}.{n % 256}"}
+        self.paid_at = None
+        self.status = "pending"
+        self.done = threading.Event()
+
+    def _call(self, kind, method, path, **kwargs):
+        start = time.perf_counter()
+        try:
+            resp = self.session.request(method, self.base + path, timeout=self.args.timeout, **kwargs)
+        except requests.RequestException as e:
+            self.recorder.failed(kind, e)
+            raise
+        self.recorder.request(kind, time.perf_counter() - start, resp.status_code)
+        return resp
+
+    def _observe(self, source, status):
+        if self.paid_at is None or status == "pending":
+            return
+        elapsed = time.monotonic() - self.paid_at
+        if status in ("confirming", "sweeping", "completed") and self.status == "pending":
+            self.recorder.payment_latency(f"detected_{source}", elapsed)
+        if status == "completed" and self.status != "completed":
+            self.recorder.payment_latency(f"completed_{source}", elapsed)
+        self.status = status
+        if status in TERMINAL:
+            self.done.set()
+
+    def _stream(self, invoice_id):
+        deadline = time.monotonic() + self.args.timeout
+        while not self.done.is_set() and time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                resp = requests.get(f"{self.base}{self.pp}/pay/{invoice_id}/stream", headers=self.browser, stream=True,
+                    timeout=(5, self.args.timeout))
+            except requests.RequestException as e:
+                self.recorder.failed("pay_stream", e)
+                self.done.wait(SSE_RETRY_SECONDS)
+                continue
+            if resp.status_code != 200:
+                self.recorder.request("pay_stream", time.perf_counter() - start, resp.status_code)
+                resp.close()
+                self.done.wait(SSE_RETRY_SECONDS)
+                continue
+            first = True
+            retry = None
+            try:
+                for line in resp.iter_lines(chunk_size=None, decode_unicode=True):
+                    if line and line.startswith("retry:"):
+                        retry = int(line[6:]) / 1000
+                    if not line or not line.startswith("data:"):
+                        continue
+                    if first:
+                        self.recorder.request("pay_stream", time.perf_counter() - start, 200)
+                        first = False
+                    self._observe("sse", json.loads(line[5:])["status"])
+                    if self.done.is_set():
+                        break
+            except requests.RequestException as e:
+                self.recorder.failed("pay_stream", e)
+            finally:
+                resp.close()
+            if first and retry is not None:
+                self.recorder.request("pay_stream", time.perf_counter() - start, "retry")
+                self.done.wait(retry)
+
+    def run(self):
+        try:
+            token = random.choice(("USDT", "BNB")) if self.args.token == "mix" else self.args.token
+            amount = f"{random.randint(1, 500)}.{random.randint(0, 99):02d}"
+            resp = self._call("create_invoice", "POST", f"{self.pp}/api/invoice", headers={"X-GhostPay-Key": API_KEY},
+                json={"chain": "BSC", "token": token, "amount_native": amount})
+            if resp.status_code != 201:
+                self.recorder.outcome("create_failed")
+                return
+            invoice = resp.json()
+            self._call("pay_page", "GET", f"{self.pp}/pay/{invoice['invoice_id']}", headers=self.browser)
+            viewer = threading.Thread(target=self._stream, args=(invoice["invoice_id"],), daemon=True)
+            viewer.start()
+            resp = self._call("api_get", "GET", f"{self.pp}/api/invoice/{invoice['invoice_id']}", headers=self.browser)
+            etag = resp.headers.get("ETag")
+            due = resp.json().get("amount_requested") or amount
+            time.sleep(random.uniform(0, self.args.think))
+            self.paid_at = time.monotonic()
+            self.chain.credit(invoice["deposit_address"], int(Decimal(due) * 10**18), token=token == "USDT")
+            deadline = self.paid_at + self.args.timeout
+            while not self.done.is_set() and time.monotonic() < deadline:
+                headers = dict(self.browser, **({"If-None-Match": etag} if etag else {}))
+                resp = self._call("api_get", "GET", f"{self.pp}/api/invoice/{invoice['invoice_id']}", headers=headers)
+                if resp.status_code == 200:
+                    etag = resp.headers.get("ETag")
+                    self._observe("api", resp.json()["status"])
+                self.done.wait(self.args.api_poll)
+            viewer.join(self.args.timeout)
+            self.recorder.outcome(self.status if self.done.is_set() else f"timed_out_{self.status}")
+        except Exception:
+            self.recorder.outcome("error")
+        finally:
+            self.done.set()
+            self.session.close()
+
+def _configure(args, rpc_url, db_path):
+    env = {"DB_PATH": db_path, "BSC_RPC_URL": rpc_url, "POLYGON_RPC_URL": rpc_url, "BSC_WS_URL": "", "POLYGON_WS_URL": "",
+        "MAIN_MNEMONIC": MNEMONIC, "FEE_MNEMONIC": MNEMONIC, "FEE_PRIVATE_KEY": "", "MAIN_WALLET_ADDRESS": MAIN_WALLET,
+        "BSC_CONFIRMATIONS": "1", "BSC_SWEEP_MAX_GAS_GWEI": "0", "POLL_INTERVAL_SECONDS": str(args.poll_interval),
+        "PAY_STREAM_POLL_SECONDS": str(args.stream_poll), "RECEIPT_POLL_SECONDS": str(args.block_time / 2),
+        "WAITRESS_THREADS": str(args.threads), "AUTO_UPDATE": "false"}
+    for item in args.set:
+        key, _, value = item.partition("=")
+        env[key] = value
+    os.environ.update(env)
+
+def _seed_api_key(db_path):
+    from app.db import open_db
+    db = open_db(db_path)
+    db.execute("INSERT OR REPLACE INTO api_keys (id, label, key_hash, key_prefix, is_active, created_at) VALUES ('loadtest','loadtest',?,?,1,?)",
+        (hashlib.sha256(API_KEY.encode()).hexdigest(), API_KEY[:8], datetime.now(timezone.utc).isoformat()))
+    db.commit()
+    db.close()
+
+def run_loadtest(args):
+    chain = FakeChain("BSC", block_time=args.block_time)
+    rpc_url = chain.start()
+    workdir = tempfile.mkdtemp(prefix="ghostpay-loadtest-")
+    db_path = os.path.join(workdir, "loadtest.db")
+    _configure(args, rpc_url, db_path)
+    from app.db import init_db
+    init_db(db_path)
+    _seed_api_key(db_path)
+    from app.services.chains import clear_rpc_cache
+    from app.services.wallet import get_fee_address
+    clear_rpc_cache()
+    fee_address, _ = get_fee_address(MNEMONIC, "BSC")
+    chain.credit(fee_address, 10**24)
+    from app import create_app
+    from app import config
+    app = create_app()
+    app.config.from_object(importlib.reload(config).Config)
+    pp = app.config["PAYMENT_PATH"] and f"/{app.config['PAYMENT_PATH']}"
+    from waitress import create_server
+    server = create_server(app, host="127.0.0.1", port=0, threads=args.threads, channel_timeout=120)
+    threading.Thread(target=server.run, name="loadtest-server", daemon=True).start()
+    base = f"http://127.0.0.1:{server.effective_port}"
+    sampler = ThreadSampler(server.task_dispatcher)
+    sampler.start()
+    recorder = Recorder()
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="checkout") as pool:
+            for n in range(args.checkouts):
+                pool.submit(Checkout(n, base, pp, args, chain, recorder).run)
+                if args.ramp:
+                    time.sleep(args.ramp / args.checkouts)
+    finally:
+        elapsed = time.perf_counter() - started
+        sampler.stop()
+        time.sleep(args.stream_poll + 0.5)
+        server.close()
+        from app.extensions import scheduler
+        for job in ("monitor", "maintenance"):
+            if scheduler.get_job(job):
+                scheduler.remove_job(job)
+        chain.stop()
+    from app.services.admission import admission_stats
+    total = sum(len(v) for v in recorder.latency.values())
+    return {
+        "checkouts": args.checkouts, "concurrency": args.concurrency, "duration_s": round(elapsed, 2),
+        "requests": total, "throughput_rps": round(total / elapsed, 1) if elapsed else 0,
+        "outcomes": recorder.outcomes,
+        "endpoints": {kind: dict(_summary(v), rps=round(len(v) / elapsed, 1), errors=recorder.errors.get(kind, {}))
+            for kind, v in sorted(recorder.latency.items())},
+        "transport_errors": {k: v for k, v in recorder.errors.items() if k not in recorder.latency},
+        "threads": sampler.report(),
+        "payment_to_status": {phase: _summary(v) for phase, v in sorted(recorder.payment.items())},
+        "admission": admission_stats(),
+        "rpc_calls": dict(sorted(chain.calls.items())),
+    }
+
+def _ms(value):
+    return f"{value * 1000:8.1f}"
+
+def print_report(report, out=sys.stdout):
+    w = out.write
+    w(f"== {report['checkouts']} checkouts, concurrency {report['concurrency']}, {report['duration_s']}s, "
+        f"{report['requests']} requests ({report['throughput_rps']} req/s)\n")
+    w(f"   outcomes: {report['outcomes']}\n")
+    w(f"\n   {'endpoint':<16}{'count':>7}{'rps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}  errors\n")
+    for kind, s in report["endpoints"].items():
+        w(f"   {kind:<16}{s['count']:>7}{s['rps']:>8}{_ms(s['p50'])} {_ms(s['p95'])} {_ms(s['p99'])} {_ms(s['max'])}  {s['errors'] or '-'}\n")
+    if report["transport_errors"]:
+        w(f"   transport errors: {report['transport_errors']}\n")
+    t = report["threads"]
+    if t:
+        w(f"\n   waitress threads: {t['threads']}, peak busy {t['peak_busy']}, mean busy {t['mean_busy_pct']}%, "
+            f"saturated {t['saturated_pct']}% of samples, peak queue {t['peak_queue']}\n")
+    w(f"\n   {'payment ->':<16}{'count':>7}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}{'max s':>9}\n")
+    for phase, s in report["payment_to_status"].items():
+        w(f"   {phase:<16}{s['count']:>7}{s['p50']:>9.2f}{s['p95']:>9.2f}{s['p99']:>9.2f}{s['max']:>9.2f}\n")
+    a = report["admission"]
+    w(f"\n   admission: admitted {a['admitted']}, shed 503 {a['shed_503']}, throttled 429 {a['throttled_429']}, "
+        f"streams deferred {a['streams_deferred']}\n")
+    w(f"   fake chain rpc calls: {report['rpc_calls']}\n")
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="ghostpayments loadtest",
+        description="Drive simulated checkouts against a local node backed by a fake chain")
+    parser.add_argument("--checkouts", type=int, default=40, help="Total simulated checkouts")
+    parser.add_argument("--concurrency", type=int, default=10, help="Checkouts in flight at once")
+    parser.add_argument("--threads", type=int, default=int(os.getenv("WAITRESS_THREADS", 8)), help="Waitress worker threads")
+    parser.add_argument("--token", choices=("USDT", "BNB", "mix"), default="mix")
+    parser.add_argument("--think", type=float, default=2.0, help="Max seconds between opening the pay page and paying")
+    parser.add_argument("--ramp", type=float, default=0.0, help="Spread checkout starts over this many seconds")
+    parser.add_argument("--api-poll", type=float, default=1.0, help="Merchant status poll interval")
+    parser.add_argument("--poll-interval", type=int, default=1, help="POLL_INTERVAL_SECONDS for the monitor")
+    parser.add_argument("--stream-poll", type=float, default=1.0, help="PAY_STREAM_POLL_SECONDS for pay_stream")
+    parser.add_argument("--block-time", type=float, default=1.0, help="Fake chain block time in seconds")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-checkout timeout")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="Extra env override, repeatable")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    if not args.verbose:
+        for name in ("waitress", "waitress.queue", "apscheduler", "app"):
+            logging.getLogger(name).setLevel(logging.ERROR)
+    report = run_loadtest(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0 if report["outcomes"].get("completed", 0) == args.checkouts else 1
@@ -1,11 +1,13 @@
 import hashlib
 import os
 import re
-from datetime import datetime, timezone
+import time
+from datetime import datetime, timezone, timedelta
 from flask import Blueprint, render_template, abort, request, redirect, flash, jsonify, current_app
 from nanoid import generate
 from app.db import get_db
 from app.services.env_writer import write_env
+from app.services import rpc_budget
 
 def _now():
     return datetime.now(timezone.utc).isoformat()
@@ -15,18 +17,29 @@ def _hash_key(key):
 
 def make_admin_bp(url_prefix):
     admin_bp = Blueprint("admin", __name__, url_prefix=url_prefix)
+    admin_bp.before_request(lambda: rpc_budget.set_priority("admin"))
+    admin_bp.teardown_request(lambda e=None: rpc_budget.set_priority(None))
 
     @admin_bp.route("/")
     @admin_bp.route("/dashboard")
     def dashboard():
         db = get_db()
         stats = {
-            "total": db.execute("SELECT COUNT(*) FROM invoices").fetchone()[0],
-            "completed": db.execute("SELECT COUNT(*) FROM invoices WHERE status='completed'").fetchone()[0],
+            "total": db.execute("SELECT COUNT(*) FROM invoices_all").fetchone()[0],
+            "completed": db.execute("SELECT COUNT(*) FROM invoices_all WHERE status='completed'").fetchone()[0],
             "pending": db.execute("SELECT COUNT(*) FROM invoices WHERE status='pending'").fetchone()[0],
-            "expired": db.execute("SELECT COUNT(*) FROM invoices WHERE status='expired'").fetchone()[0],
+            "expired": db.execute("SELECT COUNT(*) FROM invoices_all WHERE status='expired'").fetchone()[0],
         }
-        invoices = db.execute("SELECT * FROM invoices ORDER BY created_at DESC LIMIT 50").fetchall()
+        invoices = db.execute("SELECT * FROM invoices_all ORDER BY created_at DESC LIMIT 50").fetchall()
+        since = (datetime.now(timezone.utc) - timedelta(days=30)).isoformat()
+        gas_report = {}
+        for row in db.execute("""SELECT chain, COUNT(*), SUM(gas_expected_wei), SUM(gas_spent_wei) FROM invoices_all
+                WHERE created_at >= ? AND gas_spent_wei IS NOT NULL GROUP BY chain""", (since,)).fetchall():
+            gas_report[row[0]] = {"sweeps": row[1], "expected": (row[2] or 0) / 10**18, "spent": (row[3] or 0) / 10**18, "held": 0}
+        for row in db.execute("SELECT chain, COUNT(*) FROM invoices WHERE status='confirming' GROUP BY chain").fetchall():
+            gas_report.setdefault(row[0], {"sweeps": 0, "expected": 0, "spent": 0, "held": 0})["held"] = row[1]
+        from app.services.events import latency_report
+        latency = latency_report(db, since)
         fee_balances = {}
         try:
             from app.services.chains import get_native_balance
@@ -35,11 +48,11 @@ def make_admin_bp(url_prefix):
             fee_privkey = current_app.config["FEE_PRIVATE_KEY"]
             for chain in ("BSC", "POLYGON"):
                 addr, _ = get_fee_address(fee_mnemonic or None)
-                bal_wei = get_native_balance(chain, addr)
+                bal_wei = get_native_balance(chain, addr, max_age=int(os.getenv("RPC_CACHE_BALANCE_TTL", 10)))
                 fee_balances[chain] = {"address": addr, "balance_wei": bal_wei, "balance": bal_wei / 10**18}
         except Exception:
             pass
-        return render_template("admin/dashboard.html", stats=stats, invoices=[dict(i) for i in invoices], fee_balances=fee_balances)
+        return render_template("admin/dashboard.html", stats=stats, invoices=[dict(i) for i in invoices], fee_balances=fee_balances, gas_report=gas_report, latency=latency)
 
     @admin_bp.route("/keys", methods=["GET", "POST"])
     def keys():
@@ -83,10 +96,43 @@ def make_admin_bp(url_prefix):
     @admin_bp.route("/invoice/<invoice_id>")
     def invoice_detail(invoice_id):
         db = get_db()
-        invoice = db.execute("SELECT * FROM invoices WHERE id=?", (invoice_id,)).fetchone()
+        invoice = db.execute("SELECT * FROM invoices_all WHERE id=?", (invoice_id,)).fetchone()
         if not invoice:
             abort(404)
-        return render_template("admin/detail.html", invoice=dict(invoice))
+        from app.services.events import invoice_events
+        return render_template("admin/detail.html", invoice=dict(invoice), events=invoice_events(db, invoice_id))
+
+    @admin_bp.route("/search")
+    def search():
+        from app.services.search import search_invoices
+        query = request.args.get("q", "").strip()
+        page = max(1, int(request.args.get("page", 1)))
+        results, has_next = search_invoices(get_db(), query, page) if query else ([], False)
+        if request.args.get("format") == "json":
+            return jsonify({"query": query, "page": page, "has_next": has_next, "invoices": results})
+        return render_template("admin/search.html", query=query, invoices=results, page=page, has_next=has_next)
+
+    @admin_bp.route("/webhooks")
+    def webhooks():
+        from app.services.webhooks import outbox_counts
+        db = get_db()
+        state = request.args.get("state", "dead")
+        if state not in ("dead", "pending", "delivered"):
+            state = "dead"
+        page = max(1, int(request.args.get("page", 1)))
+        counts = outbox_counts(db)
+        pages = max(1, (counts.get(state, 0) + 19) // 20)
+        rows = db.execute("SELECT * FROM webhook_outbox WHERE state=? ORDER BY created_at DESC LIMIT 20 OFFSET ?",
+            (state, (page - 1) * 20)).fetchall()
+        return render_template("admin/webhooks.html", deliveries=[dict(r) for r in rows], counts=counts, state=state, page=page, pages=pages)
+
+    @admin_bp.route("/webhooks/retry", methods=["POST"])
+    @admin_bp.route("/webhooks/<int:outbox_id>/retry", methods=["POST"])
+    def retry_webhook(outbox_id=None):
+        from app.services.webhooks import retry
+        count = retry(outbox_id)
+        flash(f"Requeued {count} webhook{'s' if count != 1 else ''}.", "success")
+        return redirect(url_prefix + "/webhooks")
 
     @admin_bp.route("/settings")
     def settings():
@@ -98,7 +144,9 @@ def make_admin_bp(url_prefix):
             bsc_confs=cfg["BSC_CONFIRMATIONS"], pol_confs=cfg["POLYGON_CONFIRMATIONS"],
             gas_buffer=cfg["GAS_BUFFER_PERCENT"], poll_interval=cfg["POLL_INTERVAL_SECONDS"],
             auto_update=cfg["AUTO_UPDATE"], update_interval=cfg["UPDATE_CHECK_INTERVAL"],
-            waitress_threads=cfg["WAITRESS_THREADS"],
+            waitress_threads=cfg["WAITRESS_THREADS"], archive_after_days=cfg["ARCHIVE_AFTER_DAYS"],
+            admission_public=cfg["ADMISSION_PUBLIC_CONCURRENCY"], admission_stream=cfg["ADMISSION_STREAM_CONCURRENCY"],
+            admission_rate=cfg["ADMISSION_RATE_PER_SECOND"], admission_burst=cfg["ADMISSION_BURST"],
             update_on_startup=cfg["UPDATE_CHECK_ON_STARTUP"],
             http_proxy=cfg["UPDATE_HTTP_PROXY"], https_proxy=cfg["UPDATE_HTTPS_PROXY"])
 
@@ -141,8 +189,9 @@ def make_admin_bp(url_prefix):
             if val:
                 updates[field] = val
         if updates:
-            write_env(updates)
-            flash("Wallet settings saved. Restart required.", "restart")
+            from app.services import runtime
+            runtime.save(updates)
+            flash("Wallet settings saved and applied.", "success")
         return redirect(url_prefix + "/settings")
 
     @admin_bp.route("/settings/tuning", methods=["POST"])
@@ -151,7 +200,9 @@ def make_admin_bp(url_prefix):
         int_fields = {"INVOICE_TTL_MINUTES": (1, 1440), "BSC_CONFIRMATIONS": (1, 100),
             "POLYGON_CONFIRMATIONS": (1, 100), "GAS_BUFFER_PERCENT": (0, 100),
             "POLL_INTERVAL_SECONDS": (5, 3600), "UPDATE_CHECK_INTERVAL": (60, 86400),
-            "WAITRESS_THREADS": (2, 256)}
+            "WAITRESS_THREADS": (2, 256), "ARCHIVE_AFTER_DAYS": (0, 3650),
+            "ADMISSION_PUBLIC_CONCURRENCY": (0, 1024), "ADMISSION_STREAM_CONCURRENCY": (0, 1024),
+            "ADMISSION_RATE_PER_SECOND": (1, 1000), "ADMISSION_BURST": (1, 10000)}
         for key, (mn, mx) in int_fields.items():
             val = request.form.get(key, "").strip()
             if val:
@@ -168,23 +219,59 @@ def make_admin_bp(url_prefix):
         for field in ("UPDATE_HTTP_PROXY", "UPDATE_HTTPS_PROXY"):
             updates[field] = request.form.get(field, "").strip()
         if updates:
-            write_env(updates)
-            flash("Tuning saved. Restart required for thread count changes.", "success")
+            from app.services import runtime
+            runtime.save(updates)
+            flash("Tuning saved and applied.", "success")
         return redirect(url_prefix + "/settings")
 
     @admin_bp.route("/settings/test-rpc", methods=["POST"])
     def test_rpc():
+        from web3 import Web3
+        from app.services.rpc_pool import parse_urls, pool_stats
         chain = request.form.get("chain", "").upper()
-        url = request.form.get("url", "").strip()
-        if chain not in ("BSC", "POLYGON") or not url:
+        urls = parse_urls(request.form.get("url", ""))
+        if chain not in ("BSC", "POLYGON") or not urls:
             return jsonify({"ok": False, "error": "invalid params"})
-        try:
-            from web3 import Web3
-            w3 = Web3(Web3.HTTPProvider(url))
-            block = w3.eth.block_number
-            return jsonify({"ok": True, "block": block})
-        except Exception as e:
-            return jsonify({"ok": False, "error": str(e)})
+        live = {e["url"]: e for e in pool_stats().get(chain, {}).get("endpoints", [])}
+        endpoints = []
+        for url in urls:
+            result = {"url": url, "health": live.get(url)}
+            start = time.monotonic()
+            try:
+                rpc_budget.acquire(chain, name="admin")
+                result["block"] = Web3(Web3.HTTPProvider(url, request_kwargs={"timeout": 10})).eth.block_number
+                result["ok"] = True
+            except Exception as e:
+                result.update(ok=False, error=str(e))
+            result["latency_ms"] = round((time.monotonic() - start) * 1000, 1)
+            endpoints.append(result)
+        ok = [e for e in endpoints if e["ok"]]
+        if not ok:
+            return jsonify({"ok": False, "error": endpoints[0]["error"], "endpoints": endpoints})
+        return jsonify({"ok": True, "block": max(e["block"] for e in ok), "endpoints": endpoints})
+
+    @admin_bp.route("/system/stats")
+    def system_stats():
+        from app.services.admission import admission_stats
+        from app.services.invoices import cache_stats
+        from app.services.subscriber import subscriber_stats
+        from app.services.chains import rpc_cache_stats
+        from app.services.rpc_pool import pool_stats
+        from app.services.receipts import receipt_stats
+        from app.services.fees import gas_usage_stats
+        from app.services.webhooks import webhook_stats
+        from app.services.runtime import runtime_stats
+        from app.services.storage import storage_stats
+        from app.services.working_set import working_set_stats
+        from app.services.rpc_budget import budget_stats
+        from app.services.recycler import pool_stats as address_pool_stats
+        from app.services.assets import asset_stats
+        return jsonify({"admission": admission_stats(), "invoice_cache": cache_stats(), "rpc_cache": rpc_cache_stats(),
+            "rpc_endpoints": pool_stats(), "receipts": receipt_stats(), "gas_usage": gas_usage_stats(),
+            "subscriptions": subscriber_stats(), "webhooks": webhook_stats(), "runtime": runtime_stats(),
+            "storage": storage_stats(), "open_invoices": working_set_stats(),
+            "rpc_budget": budget_stats(), "address_pool": address_pool_stats(),
+            "pages": asset_stats()})
 
     @admin_bp.route("/system/update-check")
     def system_update_check():
@@ -202,9 +289,11 @@ def make_admin_bp(url_prefix):
     def system_update_apply():
         import asyncio, threading
         from updater import Updater
+        from app.services.handoff import request_restart
         updater = Updater(
             http_proxy=current_app.config["UPDATE_HTTP_PROXY"],
             https_proxy=current_app.config["UPDATE_HTTPS_PROXY"],
+            restart=request_restart,
         )
         def _do():
             loop = asyncio.new_event_loop()
@@ -217,11 +306,12 @@ def make_admin_bp(url_prefix):
 
     @admin_bp.route("/system/restart", methods=["POST"])
     def system_restart():
-        import os, signal, threading
+        import threading
+        from app.services.handoff import request_restart
         def _do():
             import time
             time.sleep(0.3)
-            os.kill(os.getpid(), signal.SIGTERM)
+            request_restart()
         threading.Thread(target=_do, daemon=True).start()
         return jsonify({"ok": True})
 
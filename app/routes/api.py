@@ -4,11 +4,12 @@ import json
 from decimal import Decimal
 from datetime import datetime, timezone, timedelta
 from functools import wraps
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, g
 from nanoid import generate
 from app.db import get_db
-from app.services.wallet import derive_address
-from app.services.chains import get_gas_price
+from app.services.invoices import get_invoice as fetch_invoice, write_invoice
+from app.services.idempotency import idempotent
+from app.services import storage, working_set, rpc_budget
 
 api_bp = Blueprint("api", __name__)
 
@@ -18,6 +19,16 @@ def _now():
 def _hash_key(key):
     return hashlib.sha256(key.encode()).hexdigest()
 
+def _merchant_ref(data):
+    ref = data.get("merchant_ref")
+    key = os.getenv("MERCHANT_REF_METADATA_KEY", "order_id")
+    if ref is None and key and isinstance(data.get("metadata"), dict):
+        ref = data["metadata"].get(key)
+    return None if ref is None or ref == "" else str(ref)
+
+def _touch_key(db, key_id, used_at):
+    db.execute("UPDATE api_keys SET last_used_at=? WHERE id=?", (used_at, key_id))
+
 def require_api_key(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -29,13 +40,32 @@ def require_api_key(f):
         row = db.execute("SELECT * FROM api_keys WHERE key_hash=? AND is_active=1", (key_hash,)).fetchone()
         if not row:
             return jsonify({"error": "invalid or revoked api key"}), 401
-        db.execute("UPDATE api_keys SET last_used_at=? WHERE id=?", (_now(), row["id"]))
-        db.commit()
+        storage.submit(_touch_key, row["id"], _now())
+        g.api_key_id = row["id"]
         return f(*args, **kwargs)
     return decorated
 
+def _insert_invoice(db, mnemonic, invoice_id, chain, token, amount_native, amount_requested, amount_usd, webhook_url, metadata,
+        merchant_ref, created_at, expires_at):
+    from app.services.wallet import derive_address
+    from app.services.recycler import lease
+    pooled = lease(db)
+    if pooled is not None:
+        hd_index, deposit_address = pooled["hd_index"], pooled["deposit_address"]
+    else:
+        max_idx = db.execute("""SELECT MAX(COALESCE((SELECT MAX(hd_index) FROM invoices), 0),
+            COALESCE((SELECT MAX(hd_index) FROM invoices_archive), 0))""").fetchone()[0]
+        hd_index = max_idx + 1
+        deposit_address, _ = derive_address(mnemonic, hd_index)
+    db.execute("""INSERT INTO invoices
+        (id, chain, token, amount_native, amount_requested, amount_usd, deposit_address, hd_index, status, webhook_url, metadata, merchant_ref, created_at, expires_at)
+        VALUES (?,?,?,?,?,?,?,?,'pending',?,?,?,?,?)""",
+        (invoice_id, chain, token, amount_native, amount_requested, amount_usd, deposit_address, hd_index, webhook_url, metadata, merchant_ref, created_at, expires_at))
+    return deposit_address
+
 @api_bp.route("/api/invoice", methods=["POST"])
 @require_api_key
+@idempotent
 def create_invoice():
     data = request.get_json(force=True)
     chain = data.get("chain", "").upper()
@@ -44,6 +74,9 @@ def create_invoice():
     amount_usd = data.get("amount_usd")
     webhook_url = data.get("webhook_url", "")
     metadata = json.dumps(data.get("metadata")) if data.get("metadata") else None
+    merchant_ref = _merchant_ref(data)
+    if merchant_ref is not None and len(merchant_ref) > 128:
+        return jsonify({"error": "merchant_ref too long"}), 400
     if chain not in ("BSC", "POLYGON"):
         return jsonify({"error": "invalid chain"}), 400
     if token not in ("USDT", "BNB", "POL"):
@@ -52,28 +85,20 @@ def create_invoice():
         return jsonify({"error": "amount_native required"}), 400
     if token != "USDT":
         try:
-            gas_buffer = int(os.getenv("GAS_BUFFER_PERCENT", "60"))
-            gas_price = get_gas_price(chain)
-            gas_cost_wei = int(21000 * gas_price * (1 + gas_buffer / 100))
+            from app.services.fees import get_fees, native_sweep_reserve
+            gas_cost_wei = native_sweep_reserve(get_fees(chain))
             amount_requested = str(Decimal(amount_native) + Decimal(gas_cost_wei) / Decimal(10**18))
         except Exception:
             amount_requested = amount_native
     else:
         amount_requested = amount_native
-    db = get_db()
-    max_idx = db.execute("SELECT MAX(hd_index) FROM invoices").fetchone()[0]
-    hd_index = (max_idx or 0) + 1
-    mnemonic = current_app.config["MAIN_MNEMONIC"]
-    deposit_address, _ = derive_address(mnemonic, hd_index)
     invoice_id = generate(size=20)
     ttl = current_app.config["INVOICE_TTL_MINUTES"]
     now = datetime.now(timezone.utc)
     expires_at = (now + timedelta(minutes=ttl)).isoformat()
-    db.execute("""INSERT INTO invoices
-        (id, chain, token, amount_native, amount_requested, amount_usd, deposit_address, hd_index, status, webhook_url, metadata, created_at, expires_at)
-        VALUES (?,?,?,?,?,?,?,?,'pending',?,?,?,?)""",
-        (invoice_id, chain, token, amount_native, amount_requested, amount_usd, deposit_address, hd_index, webhook_url, metadata, now.isoformat(), expires_at))
-    db.commit()
+    deposit_address = storage.write(_insert_invoice, current_app.config["MAIN_MNEMONIC"], invoice_id, chain, token, amount_native,
+        amount_requested, amount_usd, webhook_url, metadata, merchant_ref, now.isoformat(), expires_at)
+    working_set.refresh(invoice_id)
     payment_path = current_app.config["PAYMENT_PATH"]
     host = request.host_url.rstrip("/")
     return jsonify({
@@ -82,6 +107,7 @@ def create_invoice():
         "chain": chain,
         "token": token,
         "amount_native": amount_native,
+        "merchant_ref": merchant_ref,
         "payment_url": f"{host}/{payment_path}/pay/{invoice_id}",
         "expires_at": expires_at,
         "status": "pending"
@@ -89,23 +115,24 @@ def create_invoice():
 
 @api_bp.route("/api/invoice/<invoice_id>", methods=["GET"])
 def get_invoice(invoice_id):
-    db = get_db()
-    row = db.execute("SELECT * FROM invoices WHERE id=?", (invoice_id,)).fetchone()
-    if not row:
+    invoice, etag = fetch_invoice(invoice_id, get_db)
+    if not invoice:
         return jsonify({"error": "not found"}), 404
-    return jsonify(dict(row))
+    resp = jsonify(invoice)
+    resp.set_etag(etag)
+    resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
 
 @api_bp.route("/api/invoice/<invoice_id>/cancel", methods=["POST"])
 @require_api_key
 def cancel_invoice(invoice_id):
     db = get_db()
-    row = db.execute("SELECT * FROM invoices WHERE id=?", (invoice_id,)).fetchone()
+    row = db.execute("SELECT * FROM invoices_all WHERE id=?", (invoice_id,)).fetchone()
     if not row:
         return jsonify({"error": "not found"}), 404
     if row["status"] not in ("pending", "underpaid"):
         return jsonify({"error": "cannot cancel invoice in current state"}), 400
-    db.execute("UPDATE invoices SET status='expired' WHERE id=?", (invoice_id,))
-    db.commit()
+    write_invoice(invoice_id, status="expired")
     return jsonify({"ok": True})
 
 @api_bp.route("/api/invoices", methods=["GET"])
@@ -117,20 +144,47 @@ def list_invoices():
     offset = (page - 1) * limit
     status = request.args.get("status")
     chain = request.args.get("chain")
-    query = "SELECT * FROM invoices WHERE 1=1"
+    merchant_ref = request.args.get("merchant_ref")
+    where = " WHERE 1=1"
     params = []
     if status:
-        query += " AND status=?"
+        where += " AND status=?"
         params.append(status)
     if chain:
-        query += " AND chain=?"
+        where += " AND chain=?"
         params.append(chain.upper())
-    query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
-    params += [limit, offset]
-    rows = db.execute(query, params).fetchall()
-    total = db.execute("SELECT COUNT(*) FROM invoices WHERE 1=1" + (" AND status=?" if status else "") + (" AND chain=?" if chain else ""), [p for p in params if p not in (limit, offset)]).fetchone()[0]
+    if merchant_ref:
+        where += " AND merchant_ref=?"
+        params.append(merchant_ref)
+    rows = db.execute("SELECT * FROM invoices_all" + where + " ORDER BY created_at DESC LIMIT ? OFFSET ?", params + [limit, offset]).fetchall()
+    total = db.execute("SELECT COUNT(*) FROM invoices_all" + where, params).fetchone()[0]
     return jsonify({"invoices": [dict(r) for r in rows], "total": total, "page": page, "limit": limit})
 
+@api_bp.route("/api/invoices/by-ref/<path:ref>", methods=["GET"])
+@require_api_key
+def get_invoices_by_ref(ref):
+    rows = get_db().execute("SELECT * FROM invoices_all WHERE merchant_ref=? ORDER BY created_at DESC", (ref,)).fetchall()
+    if not rows:
+        return jsonify({"error": "not found"}), 404
+    return jsonify({"merchant_ref": ref, "invoices": [dict(r) for r in rows]})
+
+@api_bp.route("/api/invoices/export", methods=["GET"])
+@require_api_key
+def export_invoices():
+    from app.services.export import FORMATS, export_invoices as stream
+    fmt = request.args.get("format", "csv").lower()
+    if fmt not in FORMATS:
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+    compress = request.args.get("gzip", "").lower() in ("1", "true", "yes")
+    statuses = [s for s in request.args.get("status", "").split(",") if s]
+    filename = f"invoices-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}.{fmt}" + (".gz" if compress else "")
+    chunks = stream(fmt, compress, since=request.args.get("from"), until=request.args.get("to"),
+        statuses=statuses, chain=request.args.get("chain"))
+    resp = Response(chunks, mimetype="application/gzip" if compress else FORMATS[fmt])
+    resp.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
 @api_bp.route("/api/wallets", methods=["GET"])
 @require_api_key
 def get_wallets():
@@ -141,7 +195,8 @@ def get_wallets():
     for chain in ("BSC", "POLYGON"):
         try:
             addr, _ = get_fee_address(fee_mnemonic, chain)
-            bal = get_native_balance(chain, addr)
+            with rpc_budget.priority("admin"):
+                bal = get_native_balance(chain, addr, max_age=int(os.getenv("RPC_CACHE_BALANCE_TTL", 10)))
             results[chain] = {"address": addr, "native_balance_wei": bal}
         except Exception as e:
             results[chain] = {"error": str(e)}
@@ -1,29 +1,35 @@
+import os
 import time
-from flask import Blueprint, render_template, abort, current_app, Response, stream_with_context
-from app.db import get_db, open_db
+import hashlib
+from flask import Blueprint, render_template, abort, request, make_response, Response, stream_with_context
+from app.db import get_db
+from app.services.invoices import get_invoice
+from app.services import handoff, assets
 
 def make_payment_bp(url_prefix):
     payment_bp = Blueprint("payment", __name__, url_prefix=url_prefix)
+    from updater import Updater
+    version = Updater().current_version
 
     @payment_bp.route("/pay/<invoice_id>")
     def pay_page(invoice_id):
-        db = get_db()
-        invoice = db.execute("SELECT * FROM invoices WHERE id=?", (invoice_id,)).fetchone()
+        invoice, etag = get_invoice(invoice_id, get_db)
         if not invoice:
             abort(404)
-        if invoice["status"] == "expired":
-            return render_template("expired.html", invoice=dict(invoice))
-        if invoice["status"] == "completed":
-            return render_template("success.html", invoice=dict(invoice))
-        return render_template("pay.html", invoice=dict(invoice))
+        template = {"expired": "expired.html", "completed": "success.html"}.get(invoice["status"], "pay.html")
+        etag = hashlib.sha1(f"{etag}:{version}:{template}".encode()).hexdigest()
+        if request.if_none_match.contains_weak(etag):
+            resp = make_response("", 304)
+            resp.set_etag(etag, weak=True)
+            return resp
+        resp = assets.page_response(etag, lambda: render_template(template, invoice=invoice))
+        resp.cache_control.no_cache = True
+        return resp
 
     @payment_bp.route("/pay/<invoice_id>/stream")
     def pay_stream(invoice_id):
-        db_path = current_app.config["DB_PATH"]
         def generate():
-            db = open_db(db_path)
-            row = db.execute("SELECT status FROM invoices WHERE id=?", (invoice_id,)).fetchone()
-            db.close()
+            row, _ = get_invoice(invoice_id)
             if not row:
                 yield "event: status\ndata: {\"status\": \"not_found\"}\n\n"
                 return
@@ -32,12 +38,13 @@ def make_payment_bp(url_prefix):
             terminal = {"completed", "expired", "failed"}
             if last in terminal:
                 return
+            interval = float(os.getenv("PAY_STREAM_POLL_SECONDS", 10))
             while True:
-                time.sleep(10)
+                time.sleep(interval)
+                if handoff.draining():
+                    return
                 yield ": ping\n\n"
-                db = open_db(db_path)
-                row = db.execute("SELECT status FROM invoices WHERE id=?", (invoice_id,)).fetchone()
-                db.close()
+                row, _ = get_invoice(invoice_id)
                 if not row:
                     return
                 if row["status"] != last:
@@ -0,0 +1,166 @@
+import os
+import math
+import time
+import hashlib
+import threading
+from flask import Response, request, g, jsonify
+from app.db import open_db
+
+LANES = {"api.get_invoice": "public", "payment.pay_page": "public", "payment.pay_stream": "stream"}
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+class Lane:
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self.active >= self.limit:
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+
+_lock = threading.Lock()
+_lanes = {}
+_buckets = {}
+_limits = {}
+_stats = {"admitted": 0, "shed_503": 0, "throttled_429": 0, "streams_deferred": 0}
+
+def configure(overrides=None):
+    overrides = overrides or {}
+    def _get(key, default):
+        return int(overrides.get(key) or os.getenv(key) or default)
+    threads = _get("WAITRESS_THREADS", 8)
+    limits = {
+        "public": _get("ADMISSION_PUBLIC_CONCURRENCY", 0) or max(1, threads // 2),
+        "stream": _get("ADMISSION_STREAM_CONCURRENCY", 0) or max(1, threads // 4),
+        "rate": _get("ADMISSION_RATE_PER_SECOND", 5),
+        "burst": _get("ADMISSION_BURST", 20),
+    }
+    with _lock:
+        _limits.clear()
+        _limits.update(limits)
+        for name in ("public", "stream"):
+            lane = _lanes.get(name)
+            if lane is None:
+                _lanes[name] = Lane(name, limits[name])
+            else:
+                with lane._lock:
+                    lane.limit = limits[name]
+        for bucket in _buckets.values():
+            bucket.rate, bucket.burst = limits["rate"], limits["burst"]
+            bucket.tokens = min(bucket.tokens, bucket.burst)
+
+def _client_id():
+    if request.remote_addr in ("127.0.0.1", "::1") and request.headers.get("X-Real-IP"):
+        return request.headers["X-Real-IP"]
+    return request.remote_addr or "-"
+
+_active_keys = {"hashes": frozenset(), "loaded": 0.0}
+
+def _is_authenticated():
+    key = request.headers.get("X-GhostPay-Key")
+    if not key:
+        return False
+    now = time.monotonic()
+    if now - _active_keys["loaded"] > 30:
+        db = open_db()
+        try:
+            _active_keys["hashes"] = frozenset(r[0] for r in db.execute("SELECT key_hash FROM api_keys WHERE is_active=1").fetchall())
+        finally:
+            db.close()
+        _active_keys["loaded"] = now
+    return hashlib.sha256(key.encode()).hexdigest() in _active_keys["hashes"]
+
+def _reject(code, retry_after, error):
+    resp = jsonify({"error": error})
+    resp.status_code = code
+    resp.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return resp
+
+def _defer_stream(retry_after):
+    _stats["streams_deferred"] += 1
+    return Response(f"retry: {max(1, math.ceil(retry_after)) * 1000}\n\n", mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache"})
+
+def _take_token(client):
+    with _lock:
+        bucket = _buckets.get(client)
+        if bucket is None:
+            if len(_buckets) >= 50000:
+                _buckets.clear()
+            bucket = _buckets[client] = TokenBucket(_limits["rate"], _limits["burst"])
+        return bucket.take()
+
+def before_request():
+    lane_name = LANES.get(request.endpoint)
+    if lane_name is None or _is_authenticated():
+        return None
+    wait = _take_token(_client_id())
+    if wait:
+        if lane_name == "stream":
+            return _defer_stream(wait)
+        _stats["throttled_429"] += 1
+        return _reject(429, wait, "rate limit exceeded")
+    lane = _lanes[lane_name]
+    if not lane.try_acquire():
+        if lane_name == "stream":
+            return _defer_stream(10)
+        _stats["shed_503"] += 1
+        return _reject(503, 1, "server busy")
+    _stats["admitted"] += 1
+    once = threading.Lock()
+    def release():
+        if once.acquire(blocking=False):
+            lane.release()
+    g.admission_release = release
+
+def after_request(response):
+    if response.is_streamed:
+        release = g.pop("admission_release", None)
+        if release is not None:
+            response.call_on_close(release)
+    return response
+
+def teardown_request(exc=None):
+    release = g.pop("admission_release", None)
+    if release is not None:
+        release()
+
+def admission_stats():
+    with _lock:
+        lanes = {name: {"active": lane.active, "limit": lane.limit} for name, lane in _lanes.items()}
+        return dict(_stats, lanes=lanes, rate=_limits.get("rate"), burst=_limits.get("burst"), clients=len(_buckets))
+
+def init_app(app):
+    from app.services import runtime
+    configure()
+    runtime.subscribe("admission", ("WAITRESS_THREADS", "ADMISSION_PUBLIC_CONCURRENCY", "ADMISSION_STREAM_CONCURRENCY",
+        "ADMISSION_RATE_PER_SECOND", "ADMISSION_BURST"), lambda changed: configure())
+    app.before_request(before_request)
+    app.after_request(after_request)
+    app.teardown_request(teardown_request)
@@ -0,0 +1,80 @@
+import os
+import logging
+from datetime import datetime, timezone, timedelta
+from app.extensions import scheduler
+from app.db import open_db
+from app.services import storage
+from app.services.idempotency import purge_expired
+
+logger = logging.getLogger(__name__)
+
+def _archive_batch(db, cutoff, batch_size):
+    cols = ", ".join(r[1] for r in db.execute("PRAGMA table_info(invoices)").fetchall())
+    ids = [r[0] for r in db.execute(
+        "SELECT id FROM invoices WHERE status IN ('completed','expired','failed') AND created_at < ? LIMIT ?",
+        (cutoff, batch_size)).fetchall()]
+    if ids:
+        marks = ",".join("?" * len(ids))
+        db.execute(f"INSERT OR REPLACE INTO invoices_archive ({cols}) SELECT {cols} FROM invoices WHERE id IN ({marks})", ids)
+        db.execute(f"DELETE FROM invoices WHERE id IN ({marks})", ids)
+    return len(ids)
+
+def archive_invoices(older_than_days=None, batch_size=200):
+    days = older_than_days if older_than_days is not None else int(os.getenv("ARCHIVE_AFTER_DAYS", 30))
+    if days <= 0:
+        return 0
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    moved = 0
+    while True:
+        count = storage.write(_archive_batch, cutoff, batch_size)
+        moved += count
+        if count < batch_size:
+            return moved
+
+def _vacuum_step(db, pages):
+    db.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+    return db.execute("PRAGMA freelist_count").fetchone()[0]
+
+def _analyze(db):
+    db.execute("PRAGMA analysis_limit=1000")
+    db.execute("ANALYZE invoices")
+    db.execute("ANALYZE invoices_archive")
+
+def run_maintenance():
+    moved = archive_invoices()
+    if moved:
+        logger.info("Archived %d terminal invoices", moved)
+    purge_expired()
+    while storage.write(_vacuum_step, 1000):
+        pass
+    storage.write(_analyze)
+    from app.services.recycler import recycle_addresses
+    recycle_addresses()
+
+def compact_database(db_path=None):
+    db = open_db(db_path)
+    try:
+        if db.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        db.execute("VACUUM")
+        from app.services.search import rebuild_search_index
+        rebuild_search_index(db)
+        db.commit()
+        return db.execute("PRAGMA page_count").fetchone()[0] * db.execute("PRAGMA page_size").fetchone()[0]
+    finally:
+        db.close()
+
+def start_maintenance(app):
+    interval = int(os.getenv("MAINTENANCE_INTERVAL_MINUTES", 60))
+    if not scheduler.running:
+        scheduler.start()
+    def _job():
+        with app.app_context():
+            try:
+                run_maintenance()
+            except Exception as e:
+                logger.error("Maintenance run failed: %s", e, exc_info=True)
+    scheduler.add_job(_job, "interval", minutes=interval, id="maintenance", replace_existing=True)
+    from app.services import runtime
+    runtime.subscribe("maintenance", ("MAINTENANCE_INTERVAL_MINUTES",), lambda changed: scheduler.reschedule_job("maintenance",
+        trigger="interval", minutes=int(changed["MAINTENANCE_INTERVAL_MINUTES"])))
@@ -0,0 +1,171 @@
+import os
+import gzip
+import hashlib
+import mimetypes
+import threading
+from collections import OrderedDict
+from flask import Response, request, current_app, send_from_directory
+from werkzeug.security import safe_join
+
+COMPRESSIBLE = (".css", ".js", ".svg", ".json", ".txt", ".html")
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+IMMUTABLE_MAX_AGE = 31536000
+
+_lock = threading.Lock()
+_hashes = {}
+_static = {}
+_pages = OrderedDict()
+_stats = {"page_hits": 0, "page_misses": 0, "compressed": 0, "bytes_in": 0, "bytes_out": 0}
+
+def _brotli():
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+def compress(data, encoding):
+    if encoding == "br":
+        return _brotli().compress(data, quality=int(os.getenv("COMPRESS_BROTLI_QUALITY", 5)))
+    return gzip.compress(data, compresslevel=int(os.getenv("COMPRESS_GZIP_LEVEL", 6)), mtime=0)
+
+def _encodings(precompressed=False):
+    return [e for e in SUFFIXES if request.accept_encodings[e] and (e != "br" or precompressed or _brotli() is not None)]
+
+def content_hash(folder, filename):
+    path = safe_join(folder, filename)
+    if path is None:
+        return None
+    digest = _hashes.get(path)
+    if digest is None:
+        try:
+            with open(path, "rb") as f:
+                digest = _hashes[path] = hashlib.sha256(f.read()).hexdigest()[:12]
+        except OSError:
+            return None
+    return digest
+
+def precompress(folder):
+    brotli = _brotli()
+    count = 0
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                data = f.read()
+            with open(path + ".gz", "wb") as f:
+                f.write(gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(path + ".br", "wb") as f:
+                    f.write(brotli.compress(data, quality=11))
+            count += 1
+    return count
+
+def _encoded_static(folder, filename, encoding):
+    key = (folder, filename, encoding)
+    body = _static.get(key)
+    if body is None and (encoding != "br" or _brotli() is not None):
+        with open(safe_join(folder, filename), "rb") as f:
+            body = _static[key] = compress(f.read(), encoding)
+    return body
+
+def serve_static(filename):
+    folder = current_app.static_folder
+    digest = content_hash(folder, filename)
+    resp = None
+    if digest is not None and filename.endswith(COMPRESSIBLE):
+        for encoding in _encodings(precompressed=True):
+            path = safe_join(folder, filename + SUFFIXES[encoding])
+            if path is not None and os.path.isfile(path):
+                resp = send_from_directory(folder, filename + SUFFIXES[encoding], mimetype=mimetypes.guess_type(filename)[0])
+            else:
+                body = _encoded_static(folder, filename, encoding)
+                if body is None:
+                    continue
+                resp = Response(body, mimetype=mimetypes.guess_type(filename)[0])
+                resp.set_etag(f"{digest}-{encoding}")
+                resp.make_conditional(request)
+            resp.headers["Content-Encoding"] = encoding
+            break
+    if resp is None:
+        resp = send_from_directory(folder, filename)
+    if filename.endswith(COMPRESSIBLE):
+        resp.vary.add("Accept-Encoding")
+    if digest is not None and request.args.get("v") == digest:
+        resp.cache_control.public = True
+        resp.cache_control.max_age = IMMUTABLE_MAX_AGE
+        resp.cache_control.immutable = True
+    return resp
+
+def _hash_static_urls(endpoint, values):
+    if endpoint == "static" and "filename" in values and "v" not in values:
+        digest = content_hash(current_app.static_folder, values["filename"])
+        if digest is not None:
+            values["v"] = digest
+
+def _weaken(resp):
+    etag, weak = resp.get_etag()
+    if etag and not weak:
+        resp.set_etag(etag, weak=True)
+
+def page_response(etag, render):
+    encodings = _encodings()
+    with _lock:
+        entry = _pages.get(etag)
+        if entry is not None:
+            _pages.move_to_end(etag)
+            _stats["page_hits"] += 1
+    if entry is None:
+        entry = {None: render().encode()}
+        with _lock:
+            _stats["page_misses"] += 1
+            _pages[etag] = entry
+            while len(_pages) > int(os.getenv("PAGE_CACHE_SIZE", 1000)):
+                _pages.popitem(last=False)
+    body = entry[None]
+    resp = Response(body, mimetype="text/html")
+    resp.vary.add("Accept-Encoding")
+    if encodings and len(body) >= int(os.getenv("COMPRESS_MIN_BYTES", 500)):
+        encoding = encodings[0]
+        if encoding not in entry:
+            entry[encoding] = compress(body, encoding)
+            with _lock:
+                _stats["compressed"] += 1
+                _stats["bytes_in"] += len(body)
+                _stats["bytes_out"] += len(entry[encoding])
+        resp.set_data(entry[encoding])
+        resp.headers["Content-Encoding"] = encoding
+    resp.set_etag(etag, weak=True)
+    return resp
+
+def compress_response(resp):
+    if (resp.direct_passthrough or resp.is_streamed or resp.status_code != 200 or resp.mimetype != "text/html"
+            or "Content-Encoding" in resp.headers):
+        return resp
+    data = resp.get_data()
+    if len(data) < int(os.getenv("COMPRESS_MIN_BYTES", 500)):
+        return resp
+    resp.vary.add("Accept-Encoding")
+    encodings = _encodings()
+    if not encodings:
+        return resp
+    body = compress(data, encodings[0])
+    resp.set_data(body)
+    resp.headers["Content-Encoding"] = encodings[0]
+    _weaken(resp)
+    with _lock:
+        _stats["compressed"] += 1
+        _stats["bytes_in"] += len(data)
+        _stats["bytes_out"] += len(body)
+    return resp
+
+def asset_stats():
+    with _lock:
+        return dict(_stats, pages=len(_pages), hashed_assets=len(_hashes), brotli=_brotli() is not None)
+
+def init_app(app):
+    app.view_functions["static"] = serve_static
+    app.url_defaults(_hash_static_urls)
+    app.after_request(compress_response)
@@ -1,6 +1,9 @@
 import os
+import time
+import threading
 from web3 import Web3
 from web3.middleware import ExtraDataToPOAMiddleware
+from app.services import runtime
 
 USDT_ABI = [
     {"inputs": [{"name": "account", "type": "address"}], "name": "balanceOf", "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "view", "type": "function"},
@@ -13,19 +16,92 @@ USDT_CONTRACTS = {
     "POLYGON": "0xc2132D05D31c914a87C6611C10748AEb04B58e8F",
 }
 
-def _make_w3(rpc_url, poa=False):
-    w3 = Web3(Web3.HTTPProvider(rpc_url))
+_cache_lock = threading.Lock()
+_cache = {}
+_inflight = {}
+_w3s = {}
+_cache_stats = {"hits": 0, "misses": 0, "coalesced": 0}
+
+class _Flight:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+def _cached(key, ttl, fetch):
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None and (entry[0] is None or entry[0] > now):
+            _cache_stats["hits"] += 1
+            return entry[1]
+        flight = _inflight.get(key)
+        if flight is None:
+            flight = _inflight[key] = _Flight()
+            _cache_stats["misses"] += 1
+            leader = True
+        else:
+            _cache_stats["coalesced"] += 1
+            leader = False
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+    try:
+        flight.value = fetch()
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _cache_lock:
+            _inflight.pop(key, None)
+            if flight.error is None and ttl != 0:
+                if len(_cache) >= 10000:
+                    _cache.clear()
+                _cache[key] = (None if ttl is None else time.monotonic() + ttl, flight.value)
+        flight.done.set()
+    return flight.value
+
+def _ttl(name, default):
+    return float(os.getenv(name, default))
+
+def clear_rpc_cache():
+    with _cache_lock:
+        _cache.clear()
+        _w3s.clear()
+
+runtime.subscribe("rpc", ("BSC_RPC_URL", "POLYGON_RPC_URL", "RPC_CACHE_GAS_PRICE_TTL", "RPC_CACHE_BLOCK_TTL",
+    "RPC_CACHE_BALANCE_TTL", "FEE_HISTORY_TTL"), lambda changed: clear_rpc_cache())
+
+def rpc_cache_stats():
+    with _cache_lock:
+        return dict(_cache_stats, size=len(_cache), inflight=len(_inflight))
+
+def _make_w3(chain, urls, poa=False):
+    from app.services.rpc_pool import PooledProvider, get_pool
+    w3 = Web3(PooledProvider(get_pool(chain, urls)))
     if poa:
         w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
     return w3
 
-def get_w3(chain):
+def get_rpc_urls(chain):
+    from app.services.rpc_pool import parse_urls
     if chain == "BSC":
-        return _make_w3(os.getenv("BSC_RPC_URL", "https://bsc-dataseed.binance.org"), poa=True)
-    return _make_w3(os.getenv("POLYGON_RPC_URL", "https://polygon-rpc.com"), poa=True)
+        return parse_urls(os.getenv("BSC_RPC_URL", "https://bsc-dataseed.binance.org"))
+    return parse_urls(os.getenv("POLYGON_RPC_URL", "https://polygon-rpc.com"))
+
+def get_w3(chain):
+    urls = tuple(get_rpc_urls(chain))
+    w3 = _w3s.get((chain, urls))
+    if w3 is None:
+        w3 = _w3s[(chain, urls)] = _make_w3(chain, urls, poa=True)
+    return w3
 
-def get_native_balance(chain, address):
-    return get_w3(chain).eth.get_balance(address)
+def get_native_balance(chain, address, max_age=0):
+    return _cached(("balance", chain, address.lower()), max_age, lambda: get_w3(chain).eth.get_balance(address))
 
 def get_token_balance(chain, address, token):
     w3 = get_w3(chain)
@@ -33,42 +109,89 @@ def get_token_balance(chain, address, token):
     return contract.functions.balanceOf(Web3.to_checksum_address(address)).call()
 
 def get_block_number(chain):
-    return get_w3(chain).eth.block_number
+    return _cached(("block_number", chain), _ttl("RPC_CACHE_BLOCK_TTL", 2), lambda: get_w3(chain).eth.block_number)
 
 def get_gas_price(chain):
-    return get_w3(chain).eth.gas_price
+    return _cached(("gas_price", chain), _ttl("RPC_CACHE_GAS_PRICE_TTL", 5), lambda: get_w3(chain).eth.gas_price)
 
-def send_native(chain, from_privkey, to_address, value_wei, gas_price=None):
-    w3 = get_w3(chain)
-    account = w3.eth.account.from_key(from_privkey)
-    nonce = w3.eth.get_transaction_count(account.address)
-    if gas_price is None:
-        gas_price = w3.eth.gas_price
-    tx = {"to": Web3.to_checksum_address(to_address), "value": value_wei, "gas": 21000, "gasPrice": gas_price, "nonce": nonce, "chainId": w3.eth.chain_id}
+def get_chain_id(chain):
+    return _cached(("chain_id", chain), None, lambda: get_w3(chain).eth.chain_id)
+
+def get_nonce(chain, address):
+    return get_w3(chain).eth.get_transaction_count(Web3.to_checksum_address(address), "pending")
+
+def _fee_fields(chain, gas_price, fees):
+    if fees is not None:
+        return fees.tx_fields()
+    if gas_price is not None:
+        return {"gasPrice": gas_price}
+    from app.services.fees import get_fees
+    return get_fees(chain).tx_fields()
+
+def _signed(w3, tx, from_privkey):
     signed = w3.eth.account.sign_transaction(tx, from_privkey)
-    return w3.eth.send_raw_transaction(signed.raw_transaction).hex()
+    return "0x" + signed.raw_transaction.hex().removeprefix("0x"), _hex_hash(signed.hash.hex())
+
+def sign_native(chain, from_privkey, to_address, value_wei, nonce, gas_price=None, fees=None):
+    w3 = get_w3(chain)
+    tx = {"to": Web3.to_checksum_address(to_address), "value": value_wei, "gas": 21000, "nonce": nonce, "chainId": get_chain_id(chain),
+        **_fee_fields(chain, gas_price, fees)}
+    return _signed(w3, tx, from_privkey)
 
-def send_token(chain, from_privkey, token, to_address, amount):
+def sign_token(chain, from_privkey, token, to_address, amount, nonce, gas_price=None, fees=None):
+    from app.services.fees import token_gas_limit
     w3 = get_w3(chain)
     account = w3.eth.account.from_key(from_privkey)
     contract = w3.eth.contract(address=Web3.to_checksum_address(USDT_CONTRACTS[chain]), abi=USDT_ABI)
-    nonce = w3.eth.get_transaction_count(account.address)
-    gas_price = w3.eth.gas_price
-    tx = contract.functions.transfer(Web3.to_checksum_address(to_address), amount).build_transaction({"from": account.address, "gas": 100000, "gasPrice": gas_price, "nonce": nonce, "chainId": w3.eth.chain_id})
-    signed = w3.eth.account.sign_transaction(tx, from_privkey)
-    return w3.eth.send_raw_transaction(signed.raw_transaction).hex()
+    tx = contract.functions.transfer(Web3.to_checksum_address(to_address), amount).build_transaction({"from": account.address,
+        "gas": token_gas_limit(chain, token), "nonce": nonce, "chainId": get_chain_id(chain), **_fee_fields(chain, gas_price, fees)})
+    return _signed(w3, tx, from_privkey)
+
+def broadcast(chain, raw_tx):
+    return _hex_hash(get_w3(chain).eth.send_raw_transaction(raw_tx).hex())
+
+def send_native(chain, from_privkey, to_address, value_wei, gas_price=None, nonce=None, fees=None):
+    if nonce is None:
+        nonce = get_w3(chain).eth.get_transaction_count(get_w3(chain).eth.account.from_key(from_privkey).address)
+    raw_tx, _ = sign_native(chain, from_privkey, to_address, value_wei, nonce, gas_price, fees)
+    return broadcast(chain, raw_tx)
+
+def send_token(chain, from_privkey, token, to_address, amount, gas_price=None, nonce=None, fees=None):
+    if nonce is None:
+        nonce = get_w3(chain).eth.get_transaction_count(get_w3(chain).eth.account.from_key(from_privkey).address)
+    raw_tx, _ = sign_token(chain, from_privkey, token, to_address, amount, nonce, gas_price, fees)
+    return broadcast(chain, raw_tx)
 
 def estimate_token_transfer_gas(chain, token):
-    return 65000
+    from app.services.fees import estimated_gas
+    return estimated_gas(chain, token)
+
+RECEIPT_INT_FIELDS = ("blockNumber", "gasUsed", "cumulativeGasUsed", "effectiveGasPrice", "status", "transactionIndex", "type")
+
+def _hex_hash(tx_hash):
+    return tx_hash if tx_hash.startswith("0x") else "0x" + tx_hash
+
+def get_receipts(chain, tx_hashes):
+    responses = get_w3(chain).provider.make_batch_request([("eth_getTransactionReceipt", [_hex_hash(h)]) for h in tx_hashes])
+    if not isinstance(responses, list):
+        raise RuntimeError(f"eth_getTransactionReceipt batch failed: {responses.get('error')}")
+    receipts = []
+    for resp in responses:
+        receipt = resp.get("result")
+        if receipt:
+            receipt = dict(receipt, **{k: int(receipt[k], 16) for k in RECEIPT_INT_FIELDS if isinstance(receipt.get(k), str)})
+        receipts.append(receipt)
+    return receipts
 
 def wait_for_receipt(chain, tx_hash, timeout=120):
-    w3 = get_w3(chain)
-    return w3.eth.wait_for_transaction_receipt(tx_hash, timeout=timeout)
+    from app.services.receipts import track
+    return track(chain, tx_hash).result(timeout=timeout)
 
 def token_decimals(chain, token):
-    w3 = get_w3(chain)
-    contract = w3.eth.contract(address=Web3.to_checksum_address(USDT_CONTRACTS[chain]), abi=USDT_ABI)
-    return contract.functions.decimals().call()
+    def fetch():
+        contract = get_w3(chain).eth.contract(address=Web3.to_checksum_address(USDT_CONTRACTS[chain]), abi=USDT_ABI)
+        return contract.functions.decimals().call()
+    return _cached(("decimals", chain, token), None, fetch)
 
 def parse_token_amount(chain, token, amount_str):
     decimals = token_decimals(chain, token)
@@ -0,0 +1,60 @@
+import math
+import logging
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+EVENTS = ("detected", "confirmed", "gas_topup_sent", "gas_topup_mined", "transfer_sent", "transfer_mined",
+    "refund_sent", "refund_mined", "sweep_reverted", "late_payment", "webhook_delivered", "webhook_dead")
+
+PHASES = (
+    ("total", "detected", "transfer_mined"),
+    ("detect_to_confirm", "detected", "confirmed"),
+    ("gas_topup", "gas_topup_sent", "gas_topup_mined"),
+    ("transfer", "transfer_sent", "transfer_mined"),
+)
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+def record_event(db, invoice_id, chain, event, tx_hash=None, block_number=None, detail=None, commit=True):
+    db.execute("""INSERT INTO invoice_events (invoice_id, chain, event, tx_hash, block_number, detail, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)""", (invoice_id, chain, event, tx_hash, block_number, detail, _now()))
+    if commit:
+        db.commit()
+
+def record(invoice_id, chain, event, tx_hash=None, block_number=None, detail=None):
+    from app.services import storage
+    try:
+        storage.write(record_event, invoice_id, chain, event, tx_hash, block_number, detail, commit=False)
+    except Exception as e:
+        logger.warning("Could not record %s event for invoice %s: %s", event, invoice_id, e)
+
+def invoice_events(db, invoice_id):
+    return [dict(r) for r in db.execute("SELECT * FROM invoice_events WHERE invoice_id=? ORDER BY id", (invoice_id,)).fetchall()]
+
+def _percentile(values, pct):
+    index = max(0, min(len(values) - 1, math.ceil(pct / 100 * len(values)) - 1))
+    return values[index]
+
+def latency_report(db, since):
+    rows = db.execute("""SELECT invoice_id, chain, event, MIN(created_at) FROM invoice_events
+        WHERE invoice_id IN (SELECT invoice_id FROM invoice_events WHERE event='detected' AND created_at >= ?)
+        GROUP BY invoice_id, event""", (since,)).fetchall()
+    timelines = {}
+    for invoice_id, chain, event, at in rows:
+        timelines.setdefault((chain, invoice_id), {})[event] = datetime.fromisoformat(at)
+    samples = {}
+    for (chain, _), events in timelines.items():
+        for phase, start, end in PHASES:
+            if start in events and end in events:
+                samples.setdefault(chain, {}).setdefault(phase, []).append((events[end] - events[start]).total_seconds())
+    report = {}
+    for chain, phases in sorted(samples.items()):
+        report[chain] = {}
+        for phase, _, _ in PHASES:
+            values = sorted(phases.get(phase, []))
+            if values:
+                report[chain][phase] = {"count": len(values), "p50": _percentile(values, 50),
+                    "p95": _percentile(values, 95), "p99": _percentile(values, 99)}
+    return report
@@ -0,0 +1,78 @@
+import io
+import csv
+import json
+import zlib
+from app.db import open_db
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+def _query(since=None, until=None, statuses=None, chain=None):
+    query = "SELECT * FROM invoices_all WHERE 1=1"
+    params = []
+    if since:
+        query += " AND created_at >= ?"
+        params.append(since)
+    if until:
+        query += " AND created_at < ?"
+        params.append(until)
+    if statuses:
+        # "+" keeps the created_at index driving the scan so rows stream in order without a full sort
+        query += f" AND +status IN ({','.join('?' * len(statuses))})"
+        params.extend(statuses)
+    if chain:
+        query += " AND +chain=?"
+        params.append(chain.upper())
+    return query + " ORDER BY created_at, id", params
+
+def iter_rows(since=None, until=None, statuses=None, chain=None, batch_size=500, db_path=None):
+    db = open_db(db_path)
+    try:
+        cursor = db.execute(*_query(since, until, statuses, chain))
+        columns = [d[0] for d in cursor.description]
+        yield columns
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield tuple(row)
+    finally:
+        db.close()
+
+def _csv_chunks(rows, flush_every=200):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % flush_every == 0:
+            yield buf.getvalue().encode()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+def _ndjson_chunks(rows, flush_every=200):
+    columns = next(rows, None)
+    if columns is None:
+        return
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(columns, row)), default=str))
+        if len(lines) >= flush_every:
+            yield ("\n".join(lines) + "\n").encode()
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_invoices(fmt="csv", compress=False, **filters):
+    rows = iter_rows(**filters)
+    chunks = _csv_chunks(rows) if fmt == "csv" else _ndjson_chunks(rows)
+    return _gzip_chunks(chunks) if compress else chunks
@@ -0,0 +1,105 @@
+import os
+import threading
+from collections import deque
+from app.services.chains import get_w3, get_gas_price, _cached, _ttl
+
+DEFAULT_TOKEN_GAS = 100000
+GAS_SAMPLES = 50
+_gas_lock = threading.Lock()
+_gas_samples = {}
+
+class Fees:
+    __slots__ = ("gas_price", "max_fee", "priority_fee", "base_fee")
+
+    def __init__(self, gas_price=None, max_fee=None, priority_fee=None, base_fee=None):
+        self.gas_price = gas_price
+        self.max_fee = max_fee
+        self.priority_fee = priority_fee
+        self.base_fee = base_fee
+
+    @property
+    def is_eip1559(self):
+        return self.max_fee is not None
+
+    @property
+    def price(self):
+        if self.is_eip1559:
+            return min(self.max_fee, self.base_fee + self.priority_fee)
+        return self.gas_price
+
+    @property
+    def ceiling(self):
+        return self.max_fee if self.is_eip1559 else self.gas_price
+
+    def bumped(self, factor):
+        if self.is_eip1559:
+            return Fees(max_fee=int(self.max_fee * factor), priority_fee=int(self.priority_fee * factor), base_fee=self.base_fee)
+        return Fees(gas_price=int(self.gas_price * factor))
+
+    def tx_fields(self):
+        if self.is_eip1559:
+            return {"type": 2, "maxFeePerGas": self.max_fee, "maxPriorityFeePerGas": self.priority_fee}
+        return {"gasPrice": self.gas_price}
+
+    def __repr__(self):
+        if self.is_eip1559:
+            return f"Fees(max_fee={self.max_fee}, priority_fee={self.priority_fee}, base_fee={self.base_fee})"
+        return f"Fees(gas_price={self.gas_price})"
+
+def fee_mode(chain):
+    mode = os.getenv(f"{chain}_FEE_MODE", "auto" if chain == "POLYGON" else "legacy").lower()
+    if mode == "auto":
+        block = _cached(("latest_block_header", chain), None, lambda: get_w3(chain).eth.get_block("latest"))
+        return "eip1559" if block.get("baseFeePerGas") is not None else "legacy"
+    return mode
+
+def _fee_history(chain):
+    blocks = int(os.getenv("FEE_HISTORY_BLOCKS", 20))
+    percentile = int(os.getenv("FEE_PRIORITY_PERCENTILE", 50))
+    def fetch():
+        history = get_w3(chain).eth.fee_history(blocks, "latest", [percentile])
+        rewards = sorted(r[0] for r in history["reward"] if r)
+        return history["baseFeePerGas"][-1], rewards[len(rewards) // 2] if rewards else 0
+    return _cached(("fee_history", chain), _ttl("FEE_HISTORY_TTL", 15), fetch)
+
+def get_fees(chain):
+    if fee_mode(chain) != "eip1559":
+        return Fees(gas_price=get_gas_price(chain))
+    base_fee, priority_fee = _fee_history(chain)
+    floor = int(float(os.getenv(f"{chain}_MIN_PRIORITY_GWEI", 30 if chain == "POLYGON" else 0)) * 10**9)
+    priority_fee = max(priority_fee, floor)
+    return Fees(max_fee=2 * base_fee + priority_fee, priority_fee=priority_fee, base_fee=base_fee)
+
+def native_sweep_reserve(fees):
+    return int(21000 * fees.ceiling * (1 + int(os.getenv("GAS_BUFFER_PERCENT", 60)) / 100))
+
+def record_gas_used(chain, token, gas_used):
+    with _gas_lock:
+        _gas_samples.setdefault((chain, token), deque(maxlen=GAS_SAMPLES)).append(gas_used)
+
+GAS_SAMPLES_QUERY = """SELECT e.detail FROM invoice_events e WHERE e.event = 'transfer_mined' AND e.chain = ? AND e.detail IS NOT NULL
+    AND EXISTS (SELECT 1 FROM invoices_all i WHERE i.id = e.invoice_id AND i.token = 'USDT') ORDER BY e.created_at DESC LIMIT ?"""
+
+def load_gas_samples():
+    from app.services import storage
+    rows = {}
+    with storage.reader() as db:
+        for chain in ("BSC", "POLYGON"):
+            rows[chain] = db.execute(GAS_SAMPLES_QUERY, (chain, GAS_SAMPLES)).fetchall()
+    with _gas_lock:
+        _gas_samples.clear()
+        for chain, samples in rows.items():
+            if samples:
+                _gas_samples[(chain, "USDT")] = deque((int(r[0]) for r in reversed(samples)), maxlen=GAS_SAMPLES)
+
+def estimated_gas(chain, token):
+    with _gas_lock:
+        samples = _gas_samples.get((chain, token))
+        return max(samples) if samples else DEFAULT_TOKEN_GAS
+
+def token_gas_limit(chain, token):
+    return int(estimated_gas(chain, token) * (1 + int(os.getenv("TOKEN_GAS_LIMIT_MARGIN_PERCENT", 10)) / 100))
+
+def gas_usage_stats():
+    with _gas_lock:
+        return {f"{chain}/{token}": {"samples": len(s), "max": max(s), "last": s[-1]} for (chain, token), s in _gas_samples.items()}
@@ -0,0 +1,153 @@
+import os
+import sys
+import time
+import select
+import signal
+import socket
+import logging
+import threading
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+LISTEN_FD = "GHOSTPAY_LISTEN_FD"
+READY_FD = "GHOSTPAY_READY_FD"
+
+_lock = threading.Lock()
+_draining = threading.Event()
+_state = {"server": None, "socket": None}
+
+def draining():
+    return _draining.is_set()
+
+def listen_socket(host, port):
+    fd = os.environ.pop(LISTEN_FD, None)
+    if fd:
+        sock = socket.socket(fileno=int(fd))
+        logger.info("Inherited listening socket %s:%s", *sock.getsockname()[:2])
+        return sock
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, "SO_REUSEPORT"):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    return sock
+
+def _sd_notify(message):
+    addr = os.getenv("NOTIFY_SOCKET", "")
+    if not addr:
+        return
+    if addr.startswith("@"):
+        addr = "\0" + addr[1:]
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as s:
+            s.connect(addr)
+            s.sendall(message.encode())
+    except OSError as e:
+        logger.warning("sd_notify failed: %s", e)
+
+def notify_ready():
+    fd = os.environ.pop(READY_FD, None)
+    if fd:
+        os.write(int(fd), b"1")
+        os.close(int(fd))
+    _sd_notify(f"READY=1\nMAINPID={os.getpid()}")
+
+def _argv():
+    return [sys.executable, *sys.argv[1:]] if getattr(sys, "frozen", False) else [sys.executable, *sys.argv]
+
+def _env():
+    env = dict(os.environ)
+    env_path = os.getenv("ENV_PATH", "/etc/ghostpayments/.env")
+    if os.path.exists(env_path):
+        from dotenv import dotenv_values
+        env.update({k: v for k, v in dotenv_values(env_path).items() if v is not None})
+    return env
+
+def spawn(sock, argv=None):
+    r, w = os.pipe()
+    env = dict(_env(), **{LISTEN_FD: str(sock.fileno()), READY_FD: str(w)})
+    proc = subprocess.Popen(argv or _argv(), env=env, pass_fds=(sock.fileno(), w))
+    os.close(w)
+    try:
+        ready, _, _ = select.select([r], [], [], float(os.getenv("HANDOFF_READY_TIMEOUT_SECONDS", 60)))
+        if ready and os.read(r, 1) == b"1":
+            return proc
+    finally:
+        os.close(r)
+    logger.error("Successor process %d did not signal readiness, keeping this one", proc.pid)
+    proc.kill()
+    proc.wait()
+    return None
+
+def _busy(server):
+    return any(ch.requests for ch in list(server.active_channels.values())) or server.task_dispatcher.queue
+
+def drain(server):
+    from app.extensions import scheduler
+    from app.services import sweeper, journal, storage, webhooks, subscriber, receipts
+    server.accepting = False
+    server.pull_trigger()
+    if scheduler.running:
+        scheduler.pause()
+    subscriber.stop_subscribers()
+    webhooks.dispatcher.stop()
+    deadline = time.monotonic() + float(os.getenv("HANDOFF_DRAIN_SECONDS", 30))
+    while _busy(server) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    if _busy(server):
+        logger.warning("HTTP drain deadline reached with requests still in flight")
+    if not sweeper._cycle_lock.acquire(timeout=float(os.getenv("HANDOFF_SWEEP_GRACE_SECONDS", 60))):
+        logger.info("Sweep still running, stopping at the next journal safe point")
+    receipts.tracker.stop()
+    journal.quiesce()
+    if not webhooks.dispatcher.stop(float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", 10))):
+        logger.warning("Webhook deliveries still in flight, the new process retries them after their lease")
+    try:
+        storage.flush(float(os.getenv("HANDOFF_DRAIN_SECONDS", 30)))
+    except Exception as e:
+        logger.warning("Queued writes not flushed before exit: %s", e)
+
+def restart(argv=None, rollback=None):
+    with _lock:
+        if _draining.is_set():
+            return False
+        _draining.set()
+    server, sock = _state["server"], _state["socket"]
+    if server is None:
+        _draining.clear()
+        return False
+    if os.getpid() != 1:
+        proc = spawn(sock, argv)
+        if proc is None:
+            if rollback is not None:
+                logger.warning("Rolling back the installed update")
+                rollback()
+            _draining.clear()
+            return False
+        logger.info("Successor process %d ready, draining", proc.pid)
+    else:
+        logger.info("Running as PID 1, draining before exit without a successor")
+    drain(server)
+    logger.info("Drained, exiting")
+    logging.shutdown()
+    os._exit(0)
+
+def request_restart(rollback=None):
+    if _state["server"] is None:
+        os.kill(os.getpid(), signal.SIGTERM)
+        return
+    threading.Thread(target=restart, kwargs={"rollback": rollback}, name="handoff", daemon=True).start()
+
+def serve(app, host, port, threads):
+    from waitress import create_server
+    sock = listen_socket(host, port)
+    server = create_server(app, sockets=[sock], threads=threads, channel_timeout=120)
+    _state.update(server=server, socket=sock)
+    from app.services import runtime
+    runtime.subscribe("waitress", ("WAITRESS_THREADS",),
+        lambda changed: server.task_dispatcher.set_thread_count(int(changed["WAITRESS_THREADS"])))
+    signal.signal(signal.SIGHUP, lambda *args: request_restart())
+    notify_ready()
+    server.run()
@@ -0,0 +1,125 @@
+import os
+import time
+import hashlib
+import threading
+from functools import wraps
+from datetime import datetime, timezone, timedelta
+from flask import request, g, jsonify, current_app
+from app.db import get_db
+from app.services import storage
+
+_lock = threading.Lock()
+_inflight = {}
+
+def _now():
+    return datetime.now(timezone.utc)
+
+def _fetch(db, scope, key):
+    return db.execute("SELECT * FROM idempotency_keys WHERE api_key_id=? AND idem_key=?", (scope, key)).fetchone()
+
+def _insert(db, scope, key, request_hash):
+    now = _now()
+    ttl = timedelta(hours=int(os.getenv("IDEMPOTENCY_TTL_HOURS", 24)))
+    return db.execute("""INSERT INTO idempotency_keys (api_key_id, idem_key, request_hash, state, created_at, expires_at)
+        VALUES (?, ?, ?, 'in_flight', ?, ?) ON CONFLICT DO NOTHING""",
+        (scope, key, request_hash, now.isoformat(), (now + ttl).isoformat())).rowcount
+
+def _finish(db, scope, key, code=None, body=None):
+    if code is not None:
+        db.execute("UPDATE idempotency_keys SET state='done', response_code=?, response_body=? WHERE api_key_id=? AND idem_key=?",
+            (code, body, scope, key))
+    else:
+        db.execute("DELETE FROM idempotency_keys WHERE api_key_id=? AND idem_key=? AND state='in_flight'", (scope, key))
+
+def _claim(db, scope, key, request_hash):
+    if storage.write(_insert, scope, key, request_hash) == 1:
+        with _lock:
+            _inflight[(scope, key)] = threading.Event()
+        return True
+    return False
+
+def _release(db, scope, key, response=None):
+    if response is not None and response.status_code == 201:
+        storage.write(_finish, scope, key, response.status_code, response.get_data(as_text=True))
+    else:
+        storage.write(_finish, scope, key)
+    with _lock:
+        event = _inflight.pop((scope, key), None)
+    if event is not None:
+        event.set()
+
+def _is_reclaimable(row, scope, key):
+    if row["expires_at"] <= _now().isoformat():
+        return True
+    if row["state"] != "in_flight":
+        return False
+    with _lock:
+        local = (scope, key) in _inflight
+    stale = _now() - datetime.fromisoformat(row["created_at"]) > timedelta(seconds=int(os.getenv("IDEMPOTENCY_STALE_SECONDS", 120)))
+    return not local and stale
+
+def _wait(db, scope, key, request_hash):
+    deadline = time.monotonic() + int(os.getenv("IDEMPOTENCY_WAIT_SECONDS", 30))
+    while True:
+        row = _fetch(db, scope, key)
+        if row is None or _is_reclaimable(row, scope, key):
+            if row is not None:
+                storage.write(lambda w: w.execute("DELETE FROM idempotency_keys WHERE api_key_id=? AND idem_key=? AND created_at=?",
+                    (scope, key, row["created_at"])))
+            if _claim(db, scope, key, request_hash):
+                return None
+            continue
+        if row["state"] == "done" or time.monotonic() >= deadline:
+            return row
+        with _lock:
+            event = _inflight.get((scope, key))
+        if event is not None:
+            event.wait(min(1.0, max(0.0, deadline - time.monotonic())))
+        else:
+            time.sleep(0.1)
+
+def _replay(row):
+    resp = current_app.response_class(row["response_body"], status=row["response_code"], mimetype="application/json")
+    resp.headers["Idempotent-Replayed"] = "true"
+    return resp
+
+def idempotent(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get("Idempotency-Key", "").strip()
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > 255:
+            return jsonify({"error": "Idempotency-Key too long"}), 400
+        scope = g.get("api_key_id", "")
+        request_hash = hashlib.sha256(request.get_data()).hexdigest()
+        db = get_db()
+        row = _wait(db, scope, key, request_hash)
+        if row is not None:
+            if row["request_hash"] != request_hash:
+                return jsonify({"error": "Idempotency-Key reused with a different request body"}), 422
+            if row["state"] == "done":
+                return _replay(row)
+            resp = jsonify({"error": "a request with this Idempotency-Key is still in progress"})
+            resp.status_code = 409
+            resp.headers["Retry-After"] = "1"
+            return resp
+        response = None
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+            return response
+        finally:
+            _release(db, scope, key, response)
+    return wrapper
+
+def _purge_batch(db, now, limit):
+    return db.execute("""DELETE FROM idempotency_keys WHERE (api_key_id, idem_key) IN
+        (SELECT api_key_id, idem_key FROM idempotency_keys WHERE expires_at <= ? LIMIT ?)""", (now, limit)).rowcount
+
+def purge_expired(batch_size=500):
+    now, purged = _now().isoformat(), 0
+    while True:
+        count = storage.write(_purge_batch, now, batch_size)
+        purged += count
+        if count < batch_size:
+            return purged
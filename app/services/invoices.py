@@ -0,0 +1,87 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from app.services import webhooks, runtime, storage, working_set
+
+TERMINAL_STATUSES = ("completed", "expired", "failed")
+
+_lock = threading.Lock()
+_cache = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+_generation = 0
+
+def _ttl(status):
+    if status in TERMINAL_STATUSES:
+        return int(os.getenv("INVOICE_CACHE_TERMINAL_TTL", 3600))
+    return int(os.getenv("INVOICE_CACHE_OPEN_TTL", 5))
+
+def _etag(invoice):
+    return hashlib.sha1(json.dumps(invoice, sort_keys=True, default=str).encode()).hexdigest()
+
+def get_invoice(invoice_id, connect=None):
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(invoice_id)
+        if entry and entry[0] > now:
+            _cache.move_to_end(invoice_id)
+            _stats["hits"] += 1
+            return entry[1], entry[2]
+        _stats["misses"] += 1
+        generation = _generation
+    if connect is not None:
+        row = connect().execute("SELECT * FROM invoices_all WHERE id=?", (invoice_id,)).fetchone()
+    else:
+        with storage.reader() as conn:
+            row = conn.execute("SELECT * FROM invoices_all WHERE id=?", (invoice_id,)).fetchone()
+    if not row:
+        return None, None
+    invoice = dict(row)
+    etag = _etag(invoice)
+    with _lock:
+        if generation != _generation:
+            return invoice, etag
+        _cache[invoice_id] = (now + _ttl(invoice["status"]), invoice, etag)
+        _cache.move_to_end(invoice_id)
+        while len(_cache) > int(os.getenv("INVOICE_CACHE_MAX", 10000)):
+            _cache.popitem(last=False)
+    return invoice, etag
+
+def invalidate(invoice_id):
+    global _generation
+    with _lock:
+        _generation += 1
+        if _cache.pop(invoice_id, None) is not None:
+            _stats["invalidations"] += 1
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+
+runtime.subscribe("invoice-cache", ("INVOICE_CACHE_OPEN_TTL", "INVOICE_CACHE_TERMINAL_TTL", "INVOICE_CACHE_MAX"),
+    lambda changed: clear_cache())
+
+def cache_stats():
+    with _lock:
+        return dict(_stats, size=len(_cache))
+
+def update_invoice(db, invoice_id, commit=True, **fields):
+    assignments = ", ".join(f"{k}=?" for k in fields)
+    db.execute(f"UPDATE invoices SET {assignments} WHERE id=?", (*fields.values(), invoice_id))
+    if "status" in fields:
+        webhooks.enqueue(db, invoice_id, fields["status"])
+    if commit:
+        db.commit()
+        committed(invoice_id)
+
+def write_invoice(invoice_id, **fields):
+    storage.write(update_invoice, invoice_id, commit=False, **fields)
+    committed(invoice_id)
+
+def committed(*invoice_ids):
+    for invoice_id in invoice_ids:
+        invalidate(invoice_id)
+    working_set.refresh(*invoice_ids)
+    webhooks.wake()
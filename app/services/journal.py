@@ -0,0 +1,94 @@
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from concurrent.futures import Future
+from app.services import storage
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("gas_topup", "transfer", "refund")
+
+_guard = threading.Condition()
+_steps = 0
+_held = False
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+@contextmanager
+def step():
+    global _steps
+    with _guard:
+        while _held:
+            _guard.wait()
+        _steps += 1
+    try:
+        yield
+    finally:
+        with _guard:
+            _steps -= 1
+            _guard.notify_all()
+
+def quiesce(timeout=None):
+    global _held
+    with _guard:
+        _held = True
+        return _guard.wait_for(lambda: _steps == 0, timeout)
+
+def release():
+    global _held
+    with _guard:
+        _held = False
+        _guard.notify_all()
+
+def _insert(db, invoice_id, chain, kind, from_address, nonce, raw_tx, tx_hash):
+    now = _now()
+    db.execute("""INSERT OR IGNORE INTO sweep_journal (invoice_id, chain, kind, from_address, nonce, raw_tx, tx_hash, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""", (invoice_id, chain, kind, from_address, nonce, raw_tx, tx_hash, now, now))
+
+def _mark(db, tx_hash, state):
+    db.execute("UPDATE sweep_journal SET state=?, updated_at=? WHERE tx_hash=? AND state IN ('signed','broadcast')",
+        (state, _now(), tx_hash))
+
+def _settle(db, invoice_id, kind, tx_hash, block_number):
+    now = _now()
+    db.execute("UPDATE sweep_journal SET state='mined', block_number=?, updated_at=? WHERE invoice_id=? AND kind=? AND tx_hash=?",
+        (block_number, now, invoice_id, kind, tx_hash))
+    db.execute("UPDATE sweep_journal SET state='replaced', updated_at=? WHERE invoice_id=? AND kind=? AND tx_hash!=? AND state!='mined'",
+        (now, invoice_id, kind, tx_hash))
+
+def record_signed(invoice_id, chain, kind, from_address, nonce, raw_tx, tx_hash):
+    storage.write(_insert, invoice_id, chain, kind, from_address, nonce, raw_tx, tx_hash)
+
+def mark(tx_hash, state):
+    storage.write(_mark, tx_hash, state)
+
+def settle(invoice_id, kind, receipt):
+    storage.write(_settle, invoice_id, kind, receipt.get("transactionHash"), receipt.get("blockNumber"))
+
+def entries(invoice_id, kind):
+    with storage.reader() as db:
+        return [dict(r) for r in db.execute("SELECT * FROM sweep_journal WHERE invoice_id=? AND kind=? ORDER BY id",
+            (invoice_id, kind)).fetchall()]
+
+def open_count():
+    with storage.reader() as db:
+        return db.execute("SELECT COUNT(*) FROM sweep_journal WHERE state IN ('signed','broadcast')").fetchone()[0]
+
+def resume(chain, rows, rebroadcast=None):
+    from app.services.chains import get_receipts, broadcast
+    from app.services.receipts import track
+    for row, receipt in zip(rows, get_receipts(chain, [r["tx_hash"] for r in rows])):
+        if receipt:
+            future = Future()
+            future.set_result(receipt)
+            return row["tx_hash"], future
+    latest = rows[-1]
+    try:
+        broadcast(chain, latest["raw_tx"])
+    except Exception as e:
+        logger.info("Rebroadcast of journaled %s %s: %s", latest["kind"], latest["tx_hash"], e)
+    mark(latest["tx_hash"], "broadcast")
+    logger.info("Resumed journaled %s %s for invoice %s", latest["kind"], latest["tx_hash"], latest["invoice_id"])
+    return latest["tx_hash"], track(chain, latest["tx_hash"], rebroadcast)
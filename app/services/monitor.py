@@ -1,69 +1,85 @@
 import os
 import logging
+import time
+import threading
 from datetime import datetime, timezone
 from app.extensions import scheduler
-from app.db import open_db
-from app.services.chains import get_token_balance, get_native_balance, get_block_number, parse_token_amount
-from app.services.sweeper import sweep_token, sweep_native
+from app.services import storage, working_set, rpc_budget
+from app.services.invoices import update_invoice, write_invoice, committed
+from app.services.events import record_event
 from decimal import Decimal
 
 logger = logging.getLogger(__name__)
+_poll_lock = threading.Lock()
 
 def _now():
     return datetime.now(timezone.utc).isoformat()
 
-def poll_invoices():
-    db = open_db()
+def _mark_detected(db, inv, block):
+    update_invoice(db, inv["id"], commit=False, status="confirming", confirmed_at=_now())
+    record_event(db, inv["id"], inv["chain"], "detected", block_number=block, commit=False)
+
+def _detected(inv, get_block_number):
     try:
-        invoices = db.execute("SELECT * FROM invoices WHERE status IN ('pending','underpaid','confirming','sweeping')").fetchall()
-        for inv in invoices:
-            inv = dict(inv)
-            now = datetime.now(timezone.utc)
-            expires = datetime.fromisoformat(inv["expires_at"].replace("Z", "+00:00"))
-            if now >= expires and inv["status"] in ("pending", "underpaid"):
-                db.execute("UPDATE invoices SET status='expired' WHERE id=?", (inv["id"],))
-                db.commit()
+        with rpc_budget.priority("confirm"):
+            block = get_block_number(inv["chain"])
+    except Exception:
+        block = None
+    storage.write(_mark_detected, inv, block)
+    committed(inv["id"])
+
+def poll_invoices(ids=None, sweep=True):
+    from app.services.chains import get_token_balance, get_native_balance, get_block_number, parse_token_amount
+    from app.services.sweeper import wake_sweeps
+    detected = False
+    with _poll_lock, rpc_budget.priority("detect"):
+        now = time.time()
+        for inv in working_set.expiring(now):
+            if ids is None or inv.id in ids:
+                try:
+                    write_invoice(inv.id, status="expired")
+                except Exception as e:
+                    logger.error("Error expiring invoice %s: %s", inv.id, e, exc_info=True)
+        deferred = set()
+        for inv in working_set.snapshot(ids, statuses=("pending",)):
+            if inv.expires <= now or inv.chain in deferred:
                 continue
-            chain = inv["chain"]
-            token = inv["token"]
+            chain = inv.chain
+            token = inv.token
             try:
                 if token == "USDT":
-                    balance = get_token_balance(chain, inv["deposit_address"], token)
-                    required = parse_token_amount(chain, token, inv["amount_requested"] or inv["amount_native"])
-                    if balance >= required and inv["status"] == "pending":
+                    balance = get_token_balance(chain, inv.deposit_address, token)
+                    required = parse_token_amount(chain, token, inv.amount_requested or inv.amount_native)
+                    if balance >= required:
                         confs = int(os.getenv(f"{chain}_CONFIRMATIONS", 3 if chain == "BSC" else 1))
-                        db.execute("UPDATE invoices SET status='confirming', confirmed_at=? WHERE id=?", (_now(), inv["id"]))
-                        db.commit()
-                        inv["status"] = "confirming"
-                    if inv["status"] == "confirming":
-                        db.execute("UPDATE invoices SET status='sweeping' WHERE id=?", (inv["id"],))
-                        db.commit()
-                        inv["status"] = "sweeping"
-                    if inv["status"] == "sweeping":
-                        sweep_token(inv)
+                        _detected(inv, get_block_number)
+                        detected = True
                 else:
-                    balance_wei = get_native_balance(chain, inv["deposit_address"])
-                    required_wei = int(Decimal(inv["amount_requested"] or inv["amount_native"]) * Decimal(10 ** 18))
-                    if balance_wei >= required_wei and inv["status"] == "pending":
-                        db.execute("UPDATE invoices SET status='confirming', confirmed_at=? WHERE id=?", (_now(), inv["id"]))
-                        db.commit()
-                        inv["status"] = "confirming"
-                    if inv["status"] == "confirming":
-                        db.execute("UPDATE invoices SET status='sweeping' WHERE id=?", (inv["id"],))
-                        db.commit()
-                        inv["status"] = "sweeping"
-                    if inv["status"] == "sweeping":
-                        sweep_native(inv)
+                    balance_wei = get_native_balance(chain, inv.deposit_address)
+                    required_wei = int(Decimal(inv.amount_requested or inv.amount_native) * Decimal(10 ** 18))
+                    if balance_wei >= required_wei:
+                        _detected(inv, get_block_number)
+                        detected = True
+            except rpc_budget.RPCBudgetExceeded as e:
+                logger.info("Deferring %s deposit checks to the next poll: %s", chain, e)
+                deferred.add(chain)
             except Exception as e:
-                logger.error("Error processing invoice %s: %s", inv["id"], e, exc_info=True)
-    finally:
-        db.close()
+                logger.error("Error processing invoice %s: %s", inv.id, e, exc_info=True)
+    if detected and sweep:
+        wake_sweeps()
 
 def start_monitor(app):
     interval = int(os.getenv("POLL_INTERVAL_SECONDS", 20))
+    logger.info("Loaded %d open invoices into the working set", working_set.load())
     if not scheduler.running:
         scheduler.start()
     def _job():
         with app.app_context():
             poll_invoices()
     scheduler.add_job(_job, "interval", seconds=interval, id="monitor", replace_existing=True)
+
+def set_poll_interval(seconds):
+    job = scheduler.get_job("monitor")
+    if job is not None and job.trigger.interval.total_seconds() != seconds:
+        scheduler.reschedule_job("monitor", trigger="interval", seconds=seconds)
+        logger.info("Monitor poll interval set to %ds", seconds)
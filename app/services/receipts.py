@@ -0,0 +1,123 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import Future
+from app.services import rpc_budget
+
+logger = logging.getLogger(__name__)
+
+class Pending:
+    __slots__ = ("chain", "hashes", "future", "rebroadcast", "sent_at", "deadline", "bumps")
+
+    def __init__(self, chain, tx_hash, rebroadcast, timeout):
+        now = time.monotonic()
+        self.chain = chain
+        self.hashes = [tx_hash]
+        self.future = Future()
+        self.rebroadcast = rebroadcast
+        self.sent_at = now
+        self.deadline = now + timeout
+        self.bumps = 0
+
+class ReceiptTracker:
+    def __init__(self, fetch=None, autostart=True):
+        self._fetch = fetch
+        self._autostart = autostart
+        self._lock = threading.Lock()
+        self._pending = []
+        self._thread = None
+        self._stopped = threading.Event()
+        self.stats = {"tracked": 0, "mined": 0, "batches": 0, "rebroadcasts": 0, "timeouts": 0}
+
+    def track(self, chain, tx_hash, rebroadcast=None, timeout=None):
+        timeout = timeout or int(os.getenv("RECEIPT_TIMEOUT_SECONDS", 300))
+        entry = Pending(chain, tx_hash, rebroadcast, timeout)
+        with self._lock:
+            self._pending.append(entry)
+            self.stats["tracked"] += 1
+            if self._autostart and not self._stopped.is_set() and (self._thread is None or not self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._run, name="receipt-tracker", daemon=True)
+                self._thread.start()
+        return entry.future
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.wait(float(os.getenv("RECEIPT_POLL_SECONDS", 2))):
+            try:
+                with rpc_budget.priority("critical"):
+                    self.tick()
+            except Exception as e:
+                logger.error("Receipt tracker tick failed: %s", e, exc_info=True)
+            with self._lock:
+                if not self._pending:
+                    self._thread = None
+                    return
+        with self._lock:
+            self._thread = None
+
+    def tick(self):
+        fetch = self._fetch
+        if fetch is None:
+            from app.services.chains import get_receipts as fetch
+        with self._lock:
+            by_chain = {}
+            for entry in self._pending:
+                by_chain.setdefault(entry.chain, []).append(entry)
+        for chain, entries in by_chain.items():
+            hashes = [h for entry in entries for h in entry.hashes]
+            try:
+                receipts = dict(zip(hashes, fetch(chain, hashes)))
+                self.stats["batches"] += 1
+            except Exception as e:
+                logger.warning("Batched receipt lookup failed for %s: %s", chain, e)
+                receipts = None
+            now = time.monotonic()
+            for entry in entries:
+                receipt = next((receipts[h] for h in entry.hashes if receipts.get(h)), None) if receipts else None
+                if receipt is not None:
+                    self._finish(entry)
+                    self.stats["mined"] += 1
+                    entry.future.set_result(receipt)
+                elif now >= entry.deadline:
+                    self._finish(entry)
+                    self.stats["timeouts"] += 1
+                    entry.future.set_exception(TimeoutError(f"transaction {entry.hashes[-1]} not mined"))
+                elif receipts is not None and self._is_stuck(entry, now):
+                    self._bump(entry, now)
+
+    def _is_stuck(self, entry, now):
+        return (entry.rebroadcast is not None and entry.bumps < int(os.getenv("RECEIPT_MAX_BUMPS", 2))
+            and now - entry.sent_at >= int(os.getenv("RECEIPT_STUCK_SECONDS", 60)))
+
+    def _bump(self, entry, now):
+        entry.bumps += 1
+        factor = (1 + int(os.getenv("RECEIPT_BUMP_PERCENT", 20)) / 100) ** entry.bumps
+        try:
+            new_hash = entry.rebroadcast(factor)
+        except Exception as e:
+            logger.warning("Rebroadcast of stuck transaction %s failed: %s", entry.hashes[-1], e)
+            entry.sent_at = now
+            return
+        logger.info("Transaction %s stuck, rebroadcast as %s at %.2fx gas", entry.hashes[-1], new_hash, factor)
+        entry.hashes.append(new_hash)
+        entry.sent_at = now
+        self.stats["rebroadcasts"] += 1
+
+    def _finish(self, entry):
+        with self._lock:
+            self._pending.remove(entry)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, pending=len(self._pending))
+
+tracker = ReceiptTracker()
+
+def track(chain, tx_hash, rebroadcast=None, timeout=None):
+    return tracker.track(chain, tx_hash, rebroadcast, timeout)
+
+def receipt_stats():
+    return tracker.snapshot()
@@ -0,0 +1,108 @@
+import os
+import logging
+from datetime import datetime, timezone, timedelta
+from app.services import storage, rpc_budget
+from app.services.events import record
+
+logger = logging.getLogger(__name__)
+
+CHAINS = ("BSC", "POLYGON")
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+def enabled():
+    return os.getenv("ADDRESS_RECYCLING", "false").lower() == "true"
+
+def _candidates(db, cutoff, limit):
+    return db.execute("""SELECT i.hd_index, i.deposit_address, MAX(i.id) AS invoice_id, i.chain FROM invoices i
+        WHERE i.status='expired' AND i.expires_at <= ?
+        AND NOT EXISTS (SELECT 1 FROM address_pool p WHERE p.hd_index=i.hd_index AND p.state!='leased')
+        AND NOT EXISTS (SELECT 1 FROM invoices_all j WHERE j.hd_index=i.hd_index AND (j.status!='expired' OR j.expires_at > ?
+            OR EXISTS (SELECT 1 FROM invoice_events e WHERE e.invoice_id=j.id AND e.event NOT LIKE 'webhook%')))
+        GROUP BY i.hd_index LIMIT ?""", (cutoff, cutoff, limit)).fetchall()
+
+def _cooling(db, cutoff):
+    return db.execute("""SELECT i.id AS invoice_id, i.chain, i.token, i.hd_index, i.deposit_address FROM invoices i
+        WHERE i.status='expired' AND i.expires_at > ?
+        AND NOT EXISTS (SELECT 1 FROM address_pool p WHERE p.hd_index=i.hd_index AND p.state='dirty')
+        AND NOT EXISTS (SELECT 1 FROM invoice_events e WHERE e.invoice_id=i.id AND e.event='late_payment')""", (cutoff,)).fetchall()
+
+def _activity(address):
+    from app.services.chains import get_native_balance, get_token_balance, get_nonce
+    for chain in CHAINS:
+        if get_native_balance(chain, address) or get_token_balance(chain, address, "USDT") or get_nonce(chain, address):
+            return chain
+    return None
+
+def _paid(row):
+    from app.services.chains import get_native_balance, get_token_balance
+    if row["token"] == "USDT":
+        return get_token_balance(row["chain"], row["deposit_address"], "USDT")
+    return get_native_balance(row["chain"], row["deposit_address"])
+
+def _pool(db, hd_index, deposit_address, state):
+    db.execute("""INSERT INTO address_pool (hd_index, deposit_address, state, checked_at) VALUES (?,?,?,?)
+        ON CONFLICT(hd_index) DO UPDATE SET state=excluded.state, checked_at=excluded.checked_at, leased_at=NULL""",
+        (hd_index, deposit_address, state, _now()))
+
+def _retire(row, chain):
+    storage.write(_pool, row["hd_index"], row["deposit_address"], "dirty")
+    logger.warning("Expired invoice %s address %s has %s activity, retiring hd_index %d", row["invoice_id"],
+        row["deposit_address"], chain, row["hd_index"])
+    record(row["invoice_id"], chain, "late_payment", detail=row["deposit_address"])
+
+def watch_late_payments(cutoff):
+    with storage.reader() as db:
+        rows = _cooling(db, cutoff)
+    found = 0
+    for row in rows:
+        try:
+            if _paid(row):
+                _retire(row, row["chain"])
+                found += 1
+        except rpc_budget.RPCBudgetExceeded:
+            break
+        except Exception as e:
+            logger.warning("Could not check %s for a late payment: %s", row["deposit_address"], e)
+    return found
+
+def recycle_addresses(limit=None):
+    if not enabled():
+        return 0
+    cooldown = float(os.getenv("ADDRESS_RECYCLE_COOLDOWN_HOURS", 72))
+    cutoff = (datetime.now(timezone.utc) - timedelta(hours=cooldown)).isoformat()
+    with rpc_budget.priority("admin"):
+        watch_late_payments(cutoff)
+        with storage.reader() as db:
+            rows = _candidates(db, cutoff, limit or int(os.getenv("ADDRESS_RECYCLE_BATCH", 100)))
+        released = 0
+        for row in rows:
+            try:
+                chain = _activity(row["deposit_address"])
+            except rpc_budget.RPCBudgetExceeded:
+                break
+            except Exception as e:
+                logger.warning("Could not check %s for recycling: %s", row["deposit_address"], e)
+                continue
+            if chain:
+                _retire(row, chain)
+            else:
+                storage.write(_pool, row["hd_index"], row["deposit_address"], "available")
+                released += 1
+    if released:
+        logger.info("Returned %d expired deposit addresses to the pool", released)
+    return released
+
+def lease(db):
+    if not enabled():
+        return None
+    row = db.execute("SELECT hd_index, deposit_address FROM address_pool WHERE state='available' ORDER BY checked_at LIMIT 1").fetchone()
+    if row is not None:
+        db.execute("UPDATE address_pool SET state='leased', leased_at=? WHERE hd_index=?", (_now(), row["hd_index"]))
+    return row
+
+def pool_stats():
+    with storage.reader() as db:
+        counts = dict(db.execute("SELECT state, COUNT(*) FROM address_pool GROUP BY state").fetchall())
+    return {"enabled": enabled(), **{state: counts.get(state, 0) for state in ("available", "leased", "dirty")}}
@@ -0,0 +1,111 @@
+import os
+import time
+import itertools
+import threading
+from contextlib import contextmanager
+
+PRIORITIES = ("critical", "confirm", "detect", "admin")
+SHEDDABLE = PRIORITIES.index("detect")
+
+_local = threading.local()
+_budgets = {}
+_budgets_lock = threading.Lock()
+_seq = itertools.count()
+
+class RPCBudgetExceeded(RuntimeError):
+    pass
+
+@contextmanager
+def priority(name):
+    previous = getattr(_local, "name", None)
+    _local.name = name
+    try:
+        yield
+    finally:
+        _local.name = previous
+
+def set_priority(name):
+    _local.name = name
+
+def current_priority():
+    return getattr(_local, "name", None) or "detect"
+
+def _rate(chain):
+    return float(os.getenv(f"{chain}_RPC_BUDGET_PER_SECOND", "") or os.getenv("RPC_BUDGET_PER_SECOND", 0) or 0)
+
+class Budget:
+    def __init__(self, chain):
+        self.chain = chain
+        self.tokens = None
+        self.updated = time.monotonic()
+        self.waiting = []
+        self.cond = threading.Condition()
+        self.stats = {name: {"granted": 0, "queued": 0, "shed": 0, "wait_ms": 0.0} for name in PRIORITIES}
+
+    def _refill(self, rate, burst):
+        now = time.monotonic()
+        self.tokens = burst if self.tokens is None else min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+
+    def acquire(self, name, cost=1):
+        rate = _rate(self.chain)
+        stats = self.stats[name]
+        if rate <= 0:
+            stats["granted"] += 1
+            return
+        burst = max(cost, rate * float(os.getenv("RPC_BUDGET_BURST_SECONDS", 2)))
+        reserve = burst * int(os.getenv("RPC_BUDGET_RESERVE_PERCENT", 25)) / 100
+        rank = PRIORITIES.index(name)
+        ticket = (rank, next(_seq))
+        started = time.monotonic()
+        deadline = started + float(os.getenv("RPC_BUDGET_MAX_WAIT_SECONDS", 5))
+        with self.cond:
+            self._refill(rate, burst)
+            if name == "admin" and self.tokens - cost < reserve:
+                stats["shed"] += 1
+                raise RPCBudgetExceeded(f"{self.chain} RPC budget reserved for payment processing")
+            self.waiting.append(ticket)
+            try:
+                while True:
+                    self._refill(rate, burst)
+                    if min(self.waiting) == ticket and self.tokens >= cost:
+                        self.tokens -= cost
+                        break
+                    wait = (cost - self.tokens) / rate if min(self.waiting) == ticket else 0.05
+                    if rank >= SHEDDABLE:
+                        if time.monotonic() >= deadline:
+                            stats["shed"] += 1
+                            raise RPCBudgetExceeded(f"{self.chain} RPC budget exhausted, {name} call shed")
+                        wait = min(wait, deadline - time.monotonic())
+                    self.cond.wait(max(0.001, wait))
+            finally:
+                self.waiting.remove(ticket)
+                self.cond.notify_all()
+        waited = time.monotonic() - started
+        stats["granted"] += 1
+        if waited > 0.001:
+            stats["queued"] += 1
+            stats["wait_ms"] += waited * 1000
+
+    def state(self):
+        with self.cond:
+            queued = {name: 0 for name in PRIORITIES}
+            for rank, _ in self.waiting:
+                queued[PRIORITIES[rank]] += 1
+            return {"rate": _rate(self.chain), "tokens": None if self.tokens is None else round(self.tokens, 2),
+                "waiting": queued, "classes": {name: dict(s, wait_ms=round(s["wait_ms"], 1)) for name, s in self.stats.items()}}
+
+def get_budget(chain):
+    with _budgets_lock:
+        budget = _budgets.get(chain)
+        if budget is None:
+            budget = _budgets[chain] = Budget(chain)
+        return budget
+
+def acquire(chain, cost=1, name=None):
+    get_budget(chain).acquire(name or current_priority(), cost)
+
+def budget_stats():
+    with _budgets_lock:
+        budgets = list(_budgets.values())
+    return {budget.chain: budget.state() for budget in budgets}
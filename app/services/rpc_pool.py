@@ -0,0 +1,179 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from web3.providers import HTTPProvider, JSONBaseProvider
+from app.services import rpc_budget
+
+logger = logging.getLogger(__name__)
+
+WRITE_METHODS = ("eth_sendRawTransaction", "eth_sendTransaction")
+
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="rpc")
+_pools = {}
+_pools_lock = threading.Lock()
+
+class RPCError(Exception):
+    def __init__(self, error, response):
+        super().__init__(f"{error.get('code')}: {error.get('message')}" if isinstance(error, dict) else str(error))
+        self.response = response
+
+def _response_error(response):
+    for entry in response if isinstance(response, list) else [response]:
+        error = entry.get("error") if isinstance(entry, dict) else None
+        if error and not (isinstance(error, dict) and error.get("code") == 3):
+            return error
+    return None
+
+def parse_urls(value):
+    return [u.strip() for u in (value or "").split(",") if u.strip()]
+
+class Endpoint:
+    __slots__ = ("url", "provider", "ewma", "samples", "failures", "open_until", "requests", "errors", "last_error", "_lock")
+
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.provider = HTTPProvider(url, request_kwargs={"timeout": timeout}, exception_retry_configuration=None)
+        self.ewma = None
+        self.samples = deque(maxlen=200)
+        self.failures = 0
+        self.open_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def state(self, now=None):
+        if not self.open_until:
+            return "closed"
+        return "open" if (now or time.monotonic()) < self.open_until else "half-open"
+
+    def p95(self):
+        with self._lock:
+            samples = sorted(self.samples)
+        if len(samples) < 20:
+            return None
+        return samples[int(len(samples) * 0.95) - 1]
+
+    def record_success(self, latency):
+        alpha = float(os.getenv("RPC_EWMA_ALPHA", 0.3))
+        with self._lock:
+            self.requests += 1
+            self.samples.append(latency)
+            self.ewma = latency if self.ewma is None else alpha * latency + (1 - alpha) * self.ewma
+            self.failures = 0
+            self.open_until = 0.0
+
+    def record_failure(self, error):
+        with self._lock:
+            self.requests += 1
+            self.errors += 1
+            self.failures += 1
+            self.last_error = str(error)[:200]
+            if self.failures >= int(os.getenv("RPC_BREAKER_FAILURES", 3)):
+                if self.state() != "open":
+                    logger.warning("RPC endpoint %s ejected after %d failures: %s", self.url, self.failures, error)
+                self.open_until = time.monotonic() + float(os.getenv("RPC_BREAKER_COOLDOWN_SECONDS", 30))
+
+    def stats(self):
+        p95 = self.p95()
+        return {"url": self.url, "state": self.state(), "ewma_ms": None if self.ewma is None else round(self.ewma * 1000, 1),
+            "p95_ms": None if p95 is None else round(p95 * 1000, 1), "requests": self.requests, "errors": self.errors,
+            "last_error": self.last_error}
+
+class EndpointPool:
+    def __init__(self, chain, urls):
+        self.chain = chain
+        self.urls = tuple(urls)
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.hedged = 0
+
+    def ranked(self):
+        now = time.monotonic()
+        usable = [e for e in self.endpoints if e.state(now) != "open"]
+        if not usable:
+            return sorted(self.endpoints, key=lambda e: e.open_until)
+        return sorted(usable, key=lambda e: (e.failures > 0, e.ewma is not None, e.ewma or 0))
+
+    def _hedge_after(self, endpoint):
+        p95 = endpoint.p95()
+        floor = int(os.getenv("RPC_HEDGE_MIN_MS", 150)) / 1000
+        return max(floor, p95 if p95 is not None else int(os.getenv("RPC_HEDGE_DEFAULT_MS", 1000)) / 1000)
+
+    def _call(self, endpoint, fn, check=True):
+        start = time.monotonic()
+        try:
+            result = fn(endpoint.provider)
+            error = _response_error(result) if check else None
+            if error is not None:
+                raise RPCError(error, result)
+        except Exception as e:
+            endpoint.record_failure(e)
+            raise
+        endpoint.record_success(time.monotonic() - start)
+        return result
+
+    def _read(self, fn):
+        candidates = self.ranked()
+        pending = {_executor.submit(self._call, candidates[0], fn)}
+        spare = iter(candidates[1:])
+        error = None
+        timeout = self._hedge_after(candidates[0]) if len(candidates) > 1 and os.getenv("RPC_HEDGE", "true").lower() == "true" else None
+        while pending:
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+            if not done or error is not None:
+                backup = next(spare, None)
+                if backup is not None:
+                    if not done:
+                        self.hedged += 1
+                    pending.add(_executor.submit(self._call, backup, fn))
+            timeout = None
+        if isinstance(error, RPCError):
+            return error.response
+        raise error
+
+    def make_request(self, method, params):
+        if method in WRITE_METHODS:
+            rpc_budget.acquire(self.chain, name="critical")
+            return self._call(self.ranked()[0], lambda p: p.make_request(method, params), check=False)
+        rpc_budget.acquire(self.chain)
+        return self._read(lambda p: p.make_request(method, params))
+
+    def make_batch_request(self, requests):
+        rpc_budget.acquire(self.chain, cost=len(requests))
+        return self._read(lambda p: p.make_batch_request(requests))
+
+    def stats(self):
+        return {"endpoints": [e.stats() for e in self.endpoints], "hedged": self.hedged}
+
+class PooledProvider(JSONBaseProvider):
+    def __init__(self, pool):
+        super().__init__()
+        self.pool = pool
+
+    def make_request(self, method, params):
+        return self.pool.make_request(method, params)
+
+    def make_batch_request(self, requests):
+        return self.pool.make_batch_request(requests)
+
+    def is_connected(self, show_traceback=False):
+        return any(e.provider.is_connected(show_traceback) for e in self.pool.ranked()[:1])
+
+def get_pool(chain, urls):
+    urls = tuple(urls)
+    with _pools_lock:
+        pool = _pools.get(chain)
+        if pool is None or pool.urls != urls:
+            pool = _pools[chain] = EndpointPool(chain, urls)
+        return pool
+
+def pool_stats():
+    with _pools_lock:
+        return {chain: pool.stats() for chain, pool in _pools.items()}
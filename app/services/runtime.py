@@ -0,0 +1,61 @@
+import os
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_listeners = {}
+_stats = {"applied": 0, "last_keys": []}
+
+def get_str(key, default=""):
+    return os.getenv(key, default)
+
+def get_int(key, default=0):
+    return int(os.getenv(key) or default)
+
+def get_float(key, default=0.0):
+    return float(os.getenv(key) or default)
+
+def get_bool(key, default=False):
+    return (os.getenv(key) or str(default)).lower() == "true"
+
+def coerce(key, value):
+    from app.config import Config
+    current = getattr(Config, key, None)
+    if isinstance(current, bool):
+        return str(value).lower() == "true"
+    if isinstance(current, (int, float)):
+        return type(current)(value or 0)
+    return value
+
+def subscribe(name, keys, callback):
+    with _lock:
+        _listeners[name] = (frozenset(keys) if keys is not None else None, callback)
+
+def apply(updates):
+    with _lock:
+        changed = {k: str(v) for k, v in updates.items() if os.environ.get(k) != str(v)}
+        os.environ.update(changed)
+        listeners = list(_listeners.items())
+        if changed:
+            _stats["applied"] += 1
+            _stats["last_keys"] = sorted(changed)
+    for name, (keys, callback) in listeners:
+        if changed and (keys is None or keys & changed.keys()):
+            try:
+                callback(changed)
+            except Exception as e:
+                logger.error("Applying %s to %s failed: %s", ", ".join(sorted(changed)), name, e, exc_info=True)
+    if changed:
+        logger.info("Runtime settings changed: %s", ", ".join(sorted(changed)))
+    return changed
+
+def save(updates):
+    from app.services.env_writer import write_env
+    write_env(updates)
+    return apply(updates)
+
+def runtime_stats():
+    with _lock:
+        return dict(_stats, listeners=sorted(_listeners))
@@ -0,0 +1,63 @@
+import re
+
+COLUMNS = ("invoice_id", "deposit_address", "tx_hashes", "merchant_ref", "metadata")
+WEIGHTS = (10.0, 10.0, 10.0, 5.0, 1.0)
+TABLES = (("invoices", ""), ("invoices_archive", "-"))
+MIN_TERM = 3
+
+def _fields(t):
+    return (f"{t}.id, {t}.deposit_address, trim(coalesce({t}.tx_in_hash, '') || ' ' || coalesce({t}.gas_tx_hash, '') || ' ' || "
+        f"coalesce({t}.tx_out_hash, '')), {t}.merchant_ref, {t}.metadata")
+
+def _insert(sign, t):
+    return f"INSERT INTO invoice_search (rowid, {', '.join(COLUMNS)}) SELECT {sign}{t}.rowid, {_fields(t)}"
+
+def create_search_index(db):
+    # FTS rowid is invoices.rowid for hot rows and -invoices_archive.rowid for archived ones
+    db.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS invoice_search USING fts5(invoice_id, deposit_address, tx_hashes,
+        merchant_ref, metadata, tokenize="unicode61 tokenchars '-_'")""")
+    for table, sign in TABLES:
+        db.executescript(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} BEGIN
+                {_insert(sign, "new")};
+            END;
+            CREATE TRIGGER IF NOT EXISTS {table}_search_update
+            AFTER UPDATE OF deposit_address, tx_in_hash, gas_tx_hash, tx_out_hash, merchant_ref, metadata ON {table} BEGIN
+                DELETE FROM invoice_search WHERE rowid={sign}old.rowid;
+                {_insert(sign, "new")};
+            END;
+            CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} BEGIN
+                DELETE FROM invoice_search WHERE rowid={sign}old.rowid;
+            END;
+        """)
+    db.execute("""CREATE TRIGGER IF NOT EXISTS invoices_archive_search_replace BEFORE INSERT ON invoices_archive BEGIN
+        DELETE FROM invoice_search WHERE rowid=-(SELECT rowid FROM invoices_archive WHERE id=new.id);
+    END""")
+    rebuild_search_index(db)
+
+def rebuild_search_index(db):
+    db.execute("DELETE FROM invoice_search")
+    for table, sign in TABLES:
+        db.execute(f"{_insert(sign, 'i')} FROM {table} i")
+    db.execute("INSERT INTO invoice_search (invoice_search) VALUES ('optimize')")
+
+def _match(query):
+    terms = [t for t in re.findall(r"[\w\-]+", query) if len(t) >= MIN_TERM]
+    return " ".join(f'"{t}"*' for t in terms)
+
+def search_invoices(db, query, page=1, per_page=25):
+    match = _match(query)
+    if not match:
+        return [], False
+    docs = [r[0] for r in db.execute(f"""SELECT rowid FROM invoice_search WHERE invoice_search MATCH ?
+        ORDER BY bm25(invoice_search, {', '.join(map(str, WEIGHTS))}) LIMIT ? OFFSET ?""",
+        (match, per_page + 1, (page - 1) * per_page)).fetchall()]
+    has_next = len(docs) > per_page
+    docs = docs[:per_page]
+    rows = {}
+    for table, sign in TABLES:
+        rowids = [abs(d) for d in docs if (d < 0) == bool(sign)]
+        if rowids:
+            for row in db.execute(f"SELECT {sign}rowid AS doc, * FROM {table} WHERE rowid IN ({','.join('?' * len(rowids))})", rowids):
+                rows[row["doc"]] = {k: row[k] for k in row.keys() if k != "doc"}
+    return [rows[d] for d in docs if d in rows], has_next
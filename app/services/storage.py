@@ -0,0 +1,121 @@
+import os
+import time
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import Future
+from app.db import open_db
+
+logger = logging.getLogger(__name__)
+
+_queue = queue.Queue()
+_lock = threading.Lock()
+_writer = {"thread": None}
+_readers = {}
+_stats = {"ops": 0, "batches": 0, "largest_batch": 0, "failed_ops": 0, "failed_batches": 0}
+
+def _db_path():
+    return os.getenv("DB_PATH", "data/ghost.db")
+
+def submit(fn, *args, **kwargs):
+    future = Future()
+    _queue.put((fn, args, kwargs, future))
+    with _lock:
+        if _writer["thread"] is None or not _writer["thread"].is_alive():
+            _writer["thread"] = threading.Thread(target=_run, name="db-writer", daemon=True)
+            _writer["thread"].start()
+    return future
+
+def write(fn, *args, **kwargs):
+    return submit(fn, *args, **kwargs).result()
+
+def flush(timeout=None):
+    return submit(lambda db: None).result(timeout)
+
+def _take():
+    batch = [_queue.get()]
+    limit = int(os.getenv("DB_WRITER_MAX_BATCH", 256))
+    deadline = time.monotonic() + float(os.getenv("DB_WRITER_LINGER_MS", 2)) / 1000
+    while len(batch) < limit:
+        try:
+            batch.append(_queue.get_nowait())
+        except queue.Empty:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+    return batch
+
+def _run():
+    db, path = None, None
+    while True:
+        batch = _take()
+        if path != _db_path():
+            if db is not None:
+                db.close()
+            path = _db_path()
+            db = open_db(path)
+            db.isolation_level = None
+        _commit(db, batch)
+
+def _commit(db, batch):
+    results = []
+    try:
+        db.execute("BEGIN IMMEDIATE")
+        for fn, args, kwargs, future in batch:
+            db.execute("SAVEPOINT op")
+            try:
+                results.append((future, fn(db, *args, **kwargs), None))
+                db.execute("RELEASE op")
+            except Exception as e:
+                db.execute("ROLLBACK TO op")
+                db.execute("RELEASE op")
+                results.append((future, None, e))
+        db.execute("COMMIT")
+    except Exception as e:
+        if db.in_transaction:
+            db.execute("ROLLBACK")
+        _stats["failed_batches"] += 1
+        logger.error("Write batch of %d failed: %s", len(batch), e, exc_info=True)
+        for fn, args, kwargs, future in batch:
+            future.set_exception(e)
+        return
+    _stats["ops"] += len(batch)
+    _stats["batches"] += 1
+    _stats["largest_batch"] = max(_stats["largest_batch"], len(batch))
+    for future, result, error in results:
+        if error is not None:
+            _stats["failed_ops"] += 1
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+@contextmanager
+def reader():
+    path = _db_path()
+    with _lock:
+        pool = _readers.setdefault(path, [])
+        db = pool.pop() if pool else None
+    if db is None:
+        db = open_db(path)
+        db.execute("PRAGMA query_only=ON")
+    try:
+        yield db
+    finally:
+        if db.in_transaction:
+            db.rollback()
+        with _lock:
+            if len(_readers.get(path, ())) < int(os.getenv("DB_READERS", 8)):
+                _readers[path].append(db)
+                db = None
+        if db is not None:
+            db.close()
+
+def storage_stats():
+    with _lock:
+        readers = sum(len(pool) for pool in _readers.values())
+    return dict(_stats, queued=_queue.qsize(), idle_readers=readers)
@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import logging
+import threading
+from app.extensions import scheduler
+from app.services import working_set
+
+logger = logging.getLogger(__name__)
+
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+
+CHAINS = ("BSC", "POLYGON")
+_subscribers = {}
+_pending = {}
+_pending_lock = threading.Lock()
+
+def _topic_for(address):
+    return "0x" + address.lower()[2:].rjust(64, "0")
+
+def _log_filter(chain, addresses):
+    from app.services.chains import USDT_CONTRACTS
+    return {"address": USDT_CONTRACTS[chain], "topics": [TRANSFER_TOPIC, None, sorted(_topic_for(a) for a in addresses)]}
+
+def open_invoices(chain):
+    by_address, native_ids = {}, []
+    for record in working_set.snapshot(statuses=("pending", "underpaid"), chain=chain):
+        if record.token == "USDT":
+            by_address.setdefault(record.deposit_address.lower(), []).append(record.id)
+        else:
+            native_ids.append(record.id)
+    return by_address, native_ids
+
+def _drain(chain):
+    from app.services.monitor import poll_invoices
+    with _pending_lock:
+        ids = _pending.pop(chain, set())
+    if ids:
+        poll_invoices(ids=sorted(ids), sweep=False)
+
+def schedule_check(chain, ids):
+    with _pending_lock:
+        _pending.setdefault(chain, set()).update(ids)
+    scheduler.add_job(_drain, args=[chain], id=f"subscriber-{chain}", replace_existing=True, misfire_grace_time=30)
+
+class ChainSubscriber(threading.Thread):
+    def __init__(self, chain, url, on_check=schedule_check, on_state=None, max_backoff=30):
+        super().__init__(name=f"subscriber-{chain}", daemon=True)
+        self.chain = chain
+        self.url = url
+        self.on_check = on_check
+        self.on_state = on_state
+        self.max_backoff = max_backoff
+        self.connected = False
+        self.last_block = None
+        self._stop_event = threading.Event()
+        self._next_id = 0
+        self._native_checked = 0.0
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _set_connected(self, connected):
+        if connected != self.connected:
+            self.connected = connected
+            if self.on_state:
+                self.on_state()
+
+    def run(self):
+        from websockets.sync.client import connect
+        backoff = 1
+        while not self._stop_event.is_set():
+            try:
+                with connect(self.url, open_timeout=10, close_timeout=2) as ws:
+                    backoff = 1
+                    self._session(ws)
+            except Exception as e:
+                logger.warning("%s subscription dropped, falling back to polling: %s", self.chain, e)
+            self._set_connected(False)
+            self._stop_event.wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def _request(self, ws, method, params):
+        self._next_id += 1
+        request_id = self._next_id
+        ws.send(json.dumps({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}))
+        while True:
+            msg = json.loads(ws.recv(timeout=10))
+            if msg.get("id") == request_id:
+                if "error" in msg:
+                    raise RuntimeError(f"{method}: {msg['error']}")
+                return msg["result"]
+            self._handle(msg)
+
+    def _session(self, ws):
+        self._matched = set()
+        self._refresh_due = False
+        self._logs_sub = None
+        self._watched = frozenset()
+        self._heads_sub = self._request(ws, "eth_subscribe", ["newHeads"])
+        by_address, native_ids = self._refresh(ws)
+        if self.last_block is not None and by_address:
+            logs = self._request(ws, "eth_getLogs", [dict(_log_filter(self.chain, by_address), fromBlock=hex(self.last_block + 1), toBlock="latest")])
+            for log in logs:
+                self._match_log(log)
+        self._native_checked = time.monotonic()
+        self._check(native_ids)
+        self._set_connected(True)
+        while not self._stop_event.is_set():
+            try:
+                raw = ws.recv(timeout=1)
+            except TimeoutError:
+                continue
+            self._handle(json.loads(raw))
+            if self._refresh_due:
+                _, native_ids = self._refresh(ws)
+                self._check(native_ids if self._native_due() else ())
+            elif self._matched:
+                self._check(())
+
+    def _refresh(self, ws):
+        self._refresh_due = False
+        by_address, native_ids = open_invoices(self.chain)
+        watched = frozenset(by_address)
+        if watched != self._watched:
+            if self._logs_sub:
+                self._request(ws, "eth_unsubscribe", [self._logs_sub])
+                self._logs_sub = None
+            if watched:
+                self._logs_sub = self._request(ws, "eth_subscribe", ["logs", _log_filter(self.chain, watched)])
+            self._watched = watched
+        self._by_address = by_address
+        return by_address, native_ids
+
+    def _match_log(self, log):
+        topics = log.get("topics") or []
+        if len(topics) < 3:
+            return
+        self._matched.update(self._by_address.get("0x" + topics[2][-40:].lower(), ()))
+        if log.get("blockNumber"):
+            self.last_block = max(self.last_block or 0, int(log["blockNumber"], 16))
+
+    def _handle(self, msg):
+        if msg.get("method") != "eth_subscription":
+            return
+        params = msg["params"]
+        if params["subscription"] == self._heads_sub:
+            self.last_block = int(params["result"]["number"], 16)
+            self._refresh_due = True
+        elif params["subscription"] == self._logs_sub:
+            self._match_log(params["result"])
+
+    def _native_due(self):
+        if os.getenv("WS_CHECK_NATIVE_ON_HEAD", "true").lower() != "true":
+            return False
+        now = time.monotonic()
+        if now - self._native_checked < float(os.getenv("POLL_INTERVAL_SECONDS", 20)):
+            return False
+        self._native_checked = now
+        return True
+
+    def _check(self, native_ids):
+        ids = self._matched | set(native_ids)
+        self._matched = set()
+        if ids:
+            self.on_check(self.chain, ids)
+
+def _on_state_change():
+    from app.services.monitor import set_poll_interval
+    if all(chain in _subscribers and _subscribers[chain].connected for chain in CHAINS):
+        set_poll_interval(int(os.getenv("WS_POLL_INTERVAL_SECONDS", 120)))
+    else:
+        set_poll_interval(int(os.getenv("POLL_INTERVAL_SECONDS", 20)))
+
+def start_subscribers(app):
+    from app.services import runtime
+    runtime.subscribe("poll-interval", ("POLL_INTERVAL_SECONDS", "WS_POLL_INTERVAL_SECONDS"), lambda changed: _on_state_change())
+    for chain in CHAINS:
+        url = os.getenv(f"{chain}_WS_URL", "")
+        if not url or chain in _subscribers:
+            continue
+        sub = ChainSubscriber(chain, url, on_state=_on_state_change)
+        _subscribers[chain] = sub
+        sub.start()
+        logger.info("Subscription mode enabled for %s via %s", chain, url)
+
+def stop_subscribers():
+    for sub in list(_subscribers.values()):
+        sub.stop()
+
+def subscriber_stats():
+    return {chain: {"connected": s.connected, "last_block": s.last_block} for chain, s in _subscribers.items()}
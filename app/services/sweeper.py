@@ -1,21 +1,13 @@
 import os
 import logging
-from datetime import datetime, timezone
+import threading
+from datetime import datetime, timezone, timedelta
+from decimal import Decimal
 
 logger = logging.getLogger(__name__)
-from app.services.wallet import derive_address, get_fee_address
-from app.services.chains import (get_native_balance, get_token_balance, get_gas_price,
-    estimate_token_transfer_gas, send_native, send_token, wait_for_receipt, parse_token_amount)
-from app.db import open_db
-import requests
-
-def _fire_webhook(invoice):
-    if not invoice["webhook_url"]:
-        return
-    try:
-        requests.post(invoice["webhook_url"], json={"invoice_id": invoice["id"], "status": invoice["status"]}, timeout=10)
-    except Exception:
-        pass
+from app.services.invoices import update_invoice, write_invoice, committed
+from app.services.events import record, record_event
+from app.services import journal, storage, rpc_budget
 
 def _now():
     return datetime.now(timezone.utc).isoformat()
@@ -26,64 +18,322 @@ def _resolve_main_wallet():
         return addr
     mnemonic = os.getenv("MAIN_MNEMONIC", "")
     if mnemonic:
+        from app.services.wallet import derive_address
         derived, _ = derive_address(mnemonic, 0)
         return derived
     raise ValueError("No main wallet configured: set MAIN_WALLET_ADDRESS or MAIN_MNEMONIC")
 
-def sweep_token(invoice):
-    logger.info("Sweeping token for invoice %s (%s %s)", invoice["id"], invoice["token"], invoice["chain"])
-    chain = invoice["chain"]
+def _gas_ceiling_wei(chain):
+    gwei = Decimal(os.getenv(f"{chain}_SWEEP_MAX_GAS_GWEI", "0") or "0")
+    return int(gwei * 10**9)
+
+def _gas_spent(receipt, gas_price):
+    return receipt["gasUsed"] * receipt.get("effectiveGasPrice", gas_price)
+
+def _send(invoice, kind, from_address, sign, chain, *args, fees, nonce):
+    from app.services.chains import broadcast
+    with journal.step():
+        raw_tx, tx_hash = sign(chain, *args, nonce=nonce, fees=fees)
+        journal.record_signed(invoice["id"], chain, kind, from_address, nonce, raw_tx, tx_hash)
+        broadcast(chain, raw_tx)
+        journal.mark(tx_hash, "broadcast")
+    return tx_hash
+
+def _resender(invoice, kind, from_address, sign, chain, *args, fees, nonce):
+    return lambda factor: _send(invoice, kind, from_address, sign, chain, *args, fees=fees.bumped(factor), nonce=nonce)
+
+def _sent_amount(invoice_id, tx_hash):
+    with storage.reader() as db:
+        row = db.execute("SELECT detail FROM invoice_events WHERE invoice_id=? AND tx_hash=? AND event IN ('gas_topup_sent','transfer_sent')",
+            (invoice_id, tx_hash)).fetchone()
+    return int(row[0]) if row and row[0] else None
+
+def _resume(invoice, kind, fees, sign, *args):
+    rows = journal.entries(invoice["id"], kind)
+    if not rows:
+        return None
+    resend = None
+    amount = _sent_amount(invoice["id"], rows[0]["tx_hash"])
+    if amount is not None:
+        resend = _resender(invoice, kind, rows[-1]["from_address"], sign, invoice["chain"], *args, amount, fees=fees, nonce=rows[-1]["nonce"])
+    return journal.resume(invoice["chain"], rows, resend)
+
+def _reverted(invoice, kind, receipt):
+    if receipt.get("status", 1):
+        return False
+    record(invoice["id"], invoice["chain"], "sweep_reverted", tx_hash=receipt.get("transactionHash"),
+        block_number=receipt.get("blockNumber"), detail=kind)
+    write_invoice(invoice["id"], status="failed")
+    logger.error("%s %s for invoice %s reverted, marking it failed", kind, receipt.get("transactionHash"), invoice["id"])
+    return True
+
+def _record_mined(invoice, event, receipt):
+    record(invoice["id"], invoice["chain"], event, tx_hash=receipt.get("transactionHash"), block_number=receipt.get("blockNumber"),
+        detail=str(receipt["gasUsed"]) if "gasUsed" in receipt else None)
+
+def _log_refund(invoice):
+    def done(future):
+        if future.exception() is not None:
+            logger.warning("Refund for invoice %s not confirmed: %s", invoice["id"], future.exception())
+        elif not future.result().get("status", 1):
+            journal.settle(invoice["id"], "refund", future.result())
+            logger.warning("Refund %s for invoice %s reverted", future.result().get("transactionHash"), invoice["id"])
+        else:
+            journal.settle(invoice["id"], "refund", future.result())
+            _record_mined(invoice, "refund_mined", future.result())
+    return done
+
+def is_sweep_due(invoice, gas_price, now=None):
+    ceiling = _gas_ceiling_wei(invoice["chain"])
+    if not ceiling or gas_price <= ceiling or invoice["status"] == "sweeping":
+        return True
+    now = now or datetime.now(timezone.utc)
+    max_delay = int(os.getenv("SWEEP_MAX_DELAY_MINUTES", 60))
+    confirmed = datetime.fromisoformat((invoice["confirmed_at"] or invoice["created_at"]).replace("Z", "+00:00"))
+    return now - confirmed >= timedelta(minutes=max_delay)
+
+def _complete(invoice, tx_out_hash, gas_tx_hash, gas_expected, gas_spent):
+    write_invoice(invoice["id"], status="completed", tx_out_hash=tx_out_hash, gas_tx_hash=gas_tx_hash,
+        completed_at=_now(), gas_expected_wei=gas_expected, gas_spent_wei=gas_spent)
+
+def _sweep_tokens(chain, invoices, fees):
+    from app.services.wallet import derive_address, get_fee_address
+    from app.services.chains import get_native_balance, get_token_balance, get_nonce, estimate_token_transfer_gas, sign_native, sign_token
+    from app.services.fees import record_gas_used, token_gas_limit
+    from app.services.receipts import track
     main_mnemonic = os.getenv("MAIN_MNEMONIC", "")
     fee_mnemonic = os.getenv("FEE_MNEMONIC", "")
     main_wallet = _resolve_main_wallet()
     gas_buffer = int(os.getenv("GAS_BUFFER_PERCENT", 60))
-    deposit_address, deposit_privkey = derive_address(main_mnemonic, invoice["hd_index"])
+    gas_price = fees.price
+    gas_units = estimate_token_transfer_gas(chain, "USDT")
+    gas_cost_wei = int(token_gas_limit(chain, "USDT") * fees.ceiling * (1 + gas_buffer / 100))
+    refund_gas = 21000 * fees.ceiling
     fee_address, fee_privkey = get_fee_address(fee_mnemonic or None, chain)
-    gas_units = estimate_token_transfer_gas(chain, invoice["token"])
-    gas_price = get_gas_price(chain)
-    gas_cost_wei = int(gas_units * gas_price * (1 + gas_buffer / 100))
-    native_balance = get_native_balance(chain, deposit_address)
-    gas_tx_hash = None
-    if native_balance < gas_cost_wei:
-        deficit = gas_cost_wei - native_balance
-        gas_tx_hash = send_native(chain, fee_privkey, deposit_address, deficit, gas_price)
-        wait_for_receipt(chain, gas_tx_hash)
-    token_balance = get_token_balance(chain, deposit_address, invoice["token"])
-    tx_out_hash = send_token(chain, deposit_privkey, invoice["token"], main_wallet, token_balance)
-    wait_for_receipt(chain, tx_out_hash)
-    leftover = get_native_balance(chain, deposit_address)
-    refund_gas = int(21000 * gas_price * (1 + gas_buffer / 100))
-    if leftover > refund_gas:
-        send_native(chain, deposit_privkey, fee_address, leftover - refund_gas, gas_price)
-    db = open_db()
-    db.execute("UPDATE invoices SET status='completed', tx_out_hash=?, gas_tx_hash=?, completed_at=? WHERE id=?",
-        (tx_out_hash, gas_tx_hash, _now(), invoice["id"]))
-    db.commit()
-    invoice_row = db.execute("SELECT * FROM invoices WHERE id=?", (invoice["id"],)).fetchone()
-    db.close()
-    logger.info("Token sweep complete for invoice %s, tx=%s", invoice["id"], tx_out_hash)
-    _fire_webhook(invoice_row)
-
-def sweep_native(invoice):
-    logger.info("Sweeping native for invoice %s (%s)", invoice["id"], invoice["chain"])
-    chain = invoice["chain"]
+    plans = []
+    for inv in invoices:
+        try:
+            deposit_address, deposit_privkey = derive_address(main_mnemonic, inv["hd_index"])
+            p = {"invoice": inv, "address": deposit_address, "privkey": deposit_privkey, "deficit": 0, "gas_tx_hash": None,
+                "expected": gas_units * gas_price, "spent": 0}
+            transfer = _resume(inv, "transfer", fees, sign_token, deposit_privkey, "USDT", main_wallet)
+            top_up = None if transfer else _resume(inv, "gas_topup", fees, sign_native, fee_privkey, deposit_address)
+            if transfer:
+                p["tx_out_hash"], p["receipt"] = transfer
+                mined = [r["tx_hash"] for r in journal.entries(inv["id"], "gas_topup") if r["state"] == "mined"]
+                p["gas_tx_hash"] = mined[-1] if mined else None
+            elif top_up:
+                p["gas_tx_hash"], p["gas_receipt"] = top_up
+                p["expected"] += 21000 * gas_price
+            else:
+                p["deficit"] = max(0, gas_cost_wei - get_native_balance(chain, deposit_address))
+            plans.append(p)
+        except Exception as e:
+            logger.error("Error planning sweep for invoice %s: %s", inv["id"], e, exc_info=True)
+    top_ups = [p for p in plans if p["deficit"]]
+    if top_ups:
+        nonce = get_nonce(chain, fee_address)
+        for p in top_ups:
+            try:
+                p["gas_tx_hash"] = _send(p["invoice"], "gas_topup", fee_address, sign_native, chain, fee_privkey, p["address"],
+                    p["deficit"], fees=fees, nonce=nonce)
+                record(p["invoice"]["id"], chain, "gas_topup_sent", tx_hash=p["gas_tx_hash"], detail=str(p["deficit"]))
+                p["gas_receipt"] = track(chain, p["gas_tx_hash"], _resender(p["invoice"], "gas_topup", fee_address, sign_native,
+                    chain, fee_privkey, p["address"], p["deficit"], fees=fees, nonce=nonce))
+                p["expected"] += 21000 * gas_price
+                nonce += 1
+            except Exception as e:
+                p["failed"] = True
+                logger.error("Gas top-up failed for invoice %s: %s", p["invoice"]["id"], e, exc_info=True)
+                break
+    for p in plans:
+        if "gas_receipt" in p or p["deficit"]:
+            try:
+                receipt = p["gas_receipt"].result()
+                p["gas_tx_hash"] = receipt.get("transactionHash", p["gas_tx_hash"])
+                journal.settle(p["invoice"]["id"], "gas_topup", receipt)
+                if _reverted(p["invoice"], "gas_topup", receipt):
+                    p["failed"] = True
+                    continue
+                _record_mined(p["invoice"], "gas_topup_mined", receipt)
+                p["spent"] += _gas_spent(receipt, gas_price)
+            except Exception as e:
+                p["failed"] = True
+                if p["gas_tx_hash"]:
+                    logger.error("Gas top-up %s for invoice %s not mined: %s", p["gas_tx_hash"], p["invoice"]["id"], e)
+    plans = [p for p in plans if not p.get("failed")]
+    for p in plans:
+        if p.get("tx_out_hash"):
+            continue
+        try:
+            token_balance = get_token_balance(chain, p["address"], "USDT")
+            nonce = get_nonce(chain, p["address"])
+            p["tx_out_hash"] = _send(p["invoice"], "transfer", p["address"], sign_token, chain, p["privkey"], "USDT", main_wallet,
+                token_balance, fees=fees, nonce=nonce)
+            record(p["invoice"]["id"], chain, "transfer_sent", tx_hash=p["tx_out_hash"], detail=str(token_balance))
+            p["receipt"] = track(chain, p["tx_out_hash"], _resender(p["invoice"], "transfer", p["address"], sign_token, chain,
+                p["privkey"], "USDT", main_wallet, token_balance, fees=fees, nonce=nonce))
+        except Exception as e:
+            logger.error("Token transfer failed for invoice %s: %s", p["invoice"]["id"], e, exc_info=True)
+    for p in plans:
+        if not p.get("tx_out_hash"):
+            continue
+        try:
+            receipt = p["receipt"].result()
+            p["tx_out_hash"] = receipt.get("transactionHash", p["tx_out_hash"])
+            journal.settle(p["invoice"]["id"], "transfer", receipt)
+            if _reverted(p["invoice"], "transfer", receipt):
+                continue
+            _record_mined(p["invoice"], "transfer_mined", receipt)
+            p["spent"] += _gas_spent(receipt, gas_price)
+            record_gas_used(chain, "USDT", receipt["gasUsed"])
+            leftover = get_native_balance(chain, p["address"])
+            if leftover > refund_gas and not journal.entries(p["invoice"]["id"], "refund"):
+                refund_hash = _send(p["invoice"], "refund", p["address"], sign_native, chain, p["privkey"], fee_address,
+                    leftover - refund_gas, fees=fees, nonce=get_nonce(chain, p["address"]))
+                record(p["invoice"]["id"], chain, "refund_sent", tx_hash=refund_hash, detail=str(leftover - refund_gas))
+                track(chain, refund_hash).add_done_callback(_log_refund(p["invoice"]))
+            _complete(p["invoice"], p["tx_out_hash"], p["gas_tx_hash"], p["expected"], p["spent"])
+            logger.info("Token sweep complete for invoice %s, tx=%s", p["invoice"]["id"], p["tx_out_hash"])
+        except Exception as e:
+            logger.error("Error finishing sweep for invoice %s: %s", p["invoice"]["id"], e, exc_info=True)
+
+def _sweep_natives(chain, invoices, fees):
+    from app.services.wallet import derive_address
+    from app.services.chains import get_native_balance, get_nonce, sign_native
+    from app.services.fees import native_sweep_reserve
+    from app.services.receipts import track
     main_mnemonic = os.getenv("MAIN_MNEMONIC", "")
     main_wallet = _resolve_main_wallet()
-    gas_buffer = int(os.getenv("GAS_BUFFER_PERCENT", 60))
-    _, deposit_privkey = derive_address(main_mnemonic, invoice["hd_index"])
-    deposit_address = invoice["deposit_address"]
-    gas_price = get_gas_price(chain)
-    gas_cost = int(21000 * gas_price * (1 + gas_buffer / 100))
-    balance = get_native_balance(chain, deposit_address)
-    sweep_amount = balance - gas_cost
-    if sweep_amount <= 0:
+    gas_price = fees.price
+    gas_cost = native_sweep_reserve(fees)
+    sent = []
+    for inv in invoices:
+        try:
+            _, deposit_privkey = derive_address(main_mnemonic, inv["hd_index"])
+            resumed = _resume(inv, "transfer", fees, sign_native, deposit_privkey, main_wallet)
+            if resumed:
+                sent.append((inv, *resumed))
+                continue
+            balance = get_native_balance(chain, inv["deposit_address"])
+            sweep_amount = balance - gas_cost
+            if sweep_amount <= 0:
+                continue
+            nonce = get_nonce(chain, inv["deposit_address"])
+            tx_out_hash = _send(inv, "transfer", inv["deposit_address"], sign_native, chain, deposit_privkey, main_wallet,
+                sweep_amount, fees=fees, nonce=nonce)
+            record(inv["id"], chain, "transfer_sent", tx_hash=tx_out_hash, detail=str(sweep_amount))
+            sent.append((inv, tx_out_hash, track(chain, tx_out_hash, _resender(inv, "transfer", inv["deposit_address"], sign_native,
+                chain, deposit_privkey, main_wallet, sweep_amount, fees=fees, nonce=nonce))))
+        except Exception as e:
+            logger.error("Native sweep failed for invoice %s: %s", inv["id"], e, exc_info=True)
+    for inv, tx_out_hash, future in sent:
+        try:
+            receipt = future.result()
+            tx_out_hash = receipt.get("transactionHash", tx_out_hash)
+            journal.settle(inv["id"], "transfer", receipt)
+            if _reverted(inv, "transfer", receipt):
+                continue
+            _record_mined(inv, "transfer_mined", receipt)
+            _complete(inv, tx_out_hash, None, 21000 * gas_price, _gas_spent(receipt, gas_price))
+            logger.info("Native sweep complete for invoice %s, tx=%s", inv["id"], tx_out_hash)
+        except Exception as e:
+            logger.error("Error finishing sweep for invoice %s: %s", inv["id"], e, exc_info=True)
+
+def _mark_sweeping(db, chain, invoices):
+    for inv in invoices:
+        if inv["status"] == "confirming":
+            record_event(db, inv["id"], chain, "confirmed", commit=False)
+        update_invoice(db, inv["id"], commit=False, status="sweeping")
+
+def sweep_batch(chain, invoices, fees=None):
+    if fees is None:
+        from app.services.fees import get_fees
+        fees = get_fees(chain)
+    storage.write(_mark_sweeping, chain, invoices)
+    for inv in invoices:
+        inv["status"] = "sweeping"
+    committed(*(inv["id"] for inv in invoices))
+    logger.info("Sweeping batch of %d %s invoices with %r", len(invoices), chain, fees)
+    natives = [inv for inv in invoices if inv["token"] != "USDT"]
+    tokens = sorted((inv for inv in invoices if inv["token"] == "USDT"), key=lambda inv: inv["hd_index"])
+    if natives:
+        _sweep_natives(chain, natives, fees)
+    if tokens:
+        _sweep_tokens(chain, tokens, fees)
+
+def _sweep_lock():
+    import fcntl
+    handle = open(os.getenv("DB_PATH", "data/ghost.db") + ".sweep.lock", "a")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+def run_sweeps(db):
+    lock = _sweep_lock()
+    if lock is None:
+        logger.info("Another process is sweeping, skipping this cycle")
         return
-    tx_out_hash = send_native(chain, deposit_privkey, main_wallet, sweep_amount, gas_price)
-    logger.info("Native sweep complete for invoice %s, tx=%s", invoice["id"], tx_out_hash)
-    db = open_db()
-    db.execute("UPDATE invoices SET status='completed', tx_out_hash=?, completed_at=? WHERE id=?",
-        (tx_out_hash, _now(), invoice["id"]))
-    db.commit()
-    invoice_row = db.execute("SELECT * FROM invoices WHERE id=?", (invoice["id"],)).fetchone()
-    db.close()
-    _fire_webhook(invoice_row)
+    try:
+        _run_sweeps(db)
+    finally:
+        lock.close()
+
+def _run_sweeps(db):
+    from app.services.fees import get_fees
+    rows = db.execute("SELECT * FROM invoices WHERE status IN ('confirming','sweeping') ORDER BY confirmed_at").fetchall()
+    by_chain = {}
+    for row in rows:
+        by_chain.setdefault(row["chain"], []).append(dict(row))
+    batch_size = int(os.getenv("SWEEP_BATCH_SIZE", 20))
+    now = datetime.now(timezone.utc)
+    for chain, invoices in by_chain.items():
+        try:
+            fees = get_fees(chain)
+            due = [inv for inv in invoices if is_sweep_due(inv, fees.price, now)]
+            if len(due) < len(invoices):
+                logger.info("Holding %d %s sweeps: gas price %d above ceiling %d",
+                    len(invoices) - len(due), chain, fees.price, _gas_ceiling_wei(chain))
+            for i in range(0, len(due), batch_size):
+                sweep_batch(chain, due[i:i + batch_size], fees)
+        except Exception as e:
+            logger.error("Error sweeping %s invoices: %s", chain, e, exc_info=True)
+
+_cycle_lock = threading.Lock()
+_wake = threading.Event()
+_worker = {"thread": None}
+
+def run_cycle():
+    with _cycle_lock, rpc_budget.priority("critical"):
+        try:
+            with storage.reader() as db:
+                run_sweeps(db)
+        except Exception as e:
+            logger.error("Sweep cycle failed: %s", e, exc_info=True)
+
+def _loop():
+    samples = False
+    while True:
+        _wake.wait(float(os.getenv("SWEEP_INTERVAL_SECONDS", 0) or os.getenv("POLL_INTERVAL_SECONDS", 20)))
+        _wake.clear()
+        if not samples:
+            from app.services.fees import load_gas_samples
+            try:
+                load_gas_samples()
+            except Exception as e:
+                logger.warning("Could not load gas samples: %s", e)
+            samples = True
+        run_cycle()
+
+def wake_sweeps():
+    _wake.set()
+
+def start_sweeper(app):
+    from app.services import runtime
+    runtime.subscribe("sweeper", ("SWEEP_INTERVAL_SECONDS", "POLL_INTERVAL_SECONDS"), lambda changed: wake_sweeps())
+    if _worker["thread"] is None or not _worker["thread"].is_alive():
+        _worker["thread"] = threading.Thread(target=_loop, name="sweeper", daemon=True)
+        _worker["thread"].start()
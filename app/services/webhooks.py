@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import logging
+import threading
+from urllib.parse import urlsplit
+from datetime import datetime, timezone, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from app.services import storage
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_STATUSES = ("confirming", "completed", "expired", "failed")
+PAYLOAD_FIELDS = ("chain", "token", "amount_native", "amount_requested", "amount_usd", "deposit_address", "tx_in_hash",
+    "gas_tx_hash", "tx_out_hash", "merchant_ref", "created_at", "expires_at", "confirmed_at", "completed_at")
+
+def _now():
+    return datetime.now(timezone.utc)
+
+def enqueue(db, invoice_id, status):
+    if status not in WEBHOOK_STATUSES:
+        return False
+    row = db.execute("SELECT * FROM invoices WHERE id=?", (invoice_id,)).fetchone()
+    if row is None or not row["webhook_url"]:
+        return False
+    invoice = dict(row)
+    payload = {"event": f"payment.{status}", "invoice_id": invoice_id, "status": status,
+        **{k: invoice.get(k) for k in PAYLOAD_FIELDS}, "metadata": json.loads(invoice["metadata"]) if invoice["metadata"] else None}
+    now = _now().isoformat()
+    db.execute("""INSERT INTO webhook_outbox (invoice_id, event, url, payload, next_attempt_at, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)""", (invoice_id, payload["event"], invoice["webhook_url"], json.dumps(payload), now, now))
+    return True
+
+CLAIM_GRACE_SECONDS = 60
+
+def _backoff(attempts):
+    base = float(os.getenv("WEBHOOK_BACKOFF_SECONDS", 10))
+    return min(float(os.getenv("WEBHOOK_MAX_BACKOFF_SECONDS", 3600)), base * 2 ** (attempts - 1))
+
+class Dispatcher:
+    def __init__(self, send=None):
+        self._send = send or self._post
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._invoices = set()
+        self._hosts = {}
+        self._sessions = {}
+        self._pool = None
+        self._thread = None
+        self.stats = {"deliveries": 0, "retries": 0, "dead_lettered": 0}
+
+    def _session(self, host):
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                limit = int(os.getenv("WEBHOOK_HOST_CONCURRENCY", 2))
+                session = self._sessions[host] = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=limit)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers["User-Agent"] = "GhostPayments-Webhook"
+            return session
+
+    def _post(self, row):
+        resp = self._session(urlsplit(row["url"]).netloc).post(row["url"], data=row["payload"], timeout=float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", 10)),
+            headers={"Content-Type": "application/json", "X-GhostPay-Event": row["event"], "X-GhostPay-Delivery": str(row["id"])})
+        resp.close()
+        return resp.status_code
+
+    def start(self):
+        self._stopped.clear()
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="webhook-dispatcher", daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout=0):
+        self._stopped.set()
+        self._wake.set()
+        deadline = time.monotonic() + timeout
+        while self._invoices and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return not self._invoices
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(float(os.getenv("WEBHOOK_POLL_SECONDS", 2)))
+            self._wake.clear()
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error("Webhook dispatch failed: %s", e, exc_info=True)
+
+    def tick(self):
+        if self._stopped.is_set():
+            return []
+        concurrency = int(os.getenv("WEBHOOK_CONCURRENCY", 8))
+        host_limit = int(os.getenv("WEBHOOK_HOST_CONCURRENCY", 2))
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="webhook")
+            free = concurrency - len(self._invoices)
+        if free <= 0:
+            return []
+        with storage.reader() as db:
+            rows = db.execute("""SELECT * FROM webhook_outbox o WHERE state='pending' AND next_attempt_at <= ?
+                AND NOT EXISTS (SELECT 1 FROM webhook_outbox p WHERE p.invoice_id=o.invoice_id AND p.state='pending' AND p.id < o.id)
+                ORDER BY next_attempt_at LIMIT ?""", (_now().isoformat(), free * 4)).fetchall()
+        chosen = []
+        with self._lock:
+            for row in rows:
+                host = urlsplit(row["url"]).netloc
+                if len(chosen) >= free or row["invoice_id"] in self._invoices or self._hosts.get(host, 0) >= host_limit:
+                    continue
+                self._invoices.add(row["invoice_id"])
+                self._hosts[host] = self._hosts.get(host, 0) + 1
+                chosen.append((dict(row), host))
+        claimed = storage.write(_claim, [row["id"] for row, _ in chosen]) if chosen else set()
+        futures = []
+        for row, host in chosen:
+            if row["id"] in claimed:
+                futures.append(self._pool.submit(self._deliver, row, host))
+            else:
+                self._release(row, host)
+        return futures
+
+    def _release(self, row, host):
+        with self._lock:
+            self._invoices.discard(row["invoice_id"])
+            self._hosts[host] -= 1
+
+    def _deliver(self, row, host):
+        try:
+            try:
+                status, error = self._send(row), None
+            except Exception as e:
+                status, error = None, str(e)[:500]
+            self._record(row, status, error)
+        finally:
+            self._release(row, host)
+        self.wake()
+
+    def _record(self, row, status, error):
+        outcome = storage.write(_record, row, status, error)
+        self.stats[outcome] += 1
+        if outcome == "dead_lettered":
+            logger.warning("Webhook %s for invoice %s dead after %d attempts: %s", row["event"], row["invoice_id"], row["attempts"] + 1,
+                status or error)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, inflight=len(self._invoices), hosts=len(self._sessions))
+
+def _claim(db, ids):
+    # another process (e.g. a successor during a restart) may deliver the same rows, so lease them first
+    now = _now()
+    lease = now + timedelta(seconds=float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", 10)) + CLAIM_GRACE_SECONDS)
+    return {r[0] for r in db.execute(f"""UPDATE webhook_outbox SET next_attempt_at=?
+        WHERE id IN ({','.join('?' * len(ids))}) AND state='pending' AND next_attempt_at <= ? RETURNING id""",
+        (lease.isoformat(), *ids, now.isoformat())).fetchall()}
+
+def _record(db, row, status, error):
+    from app.services.events import record_event
+    attempts = row["attempts"] + 1
+    now = _now()
+    chain = (db.execute("SELECT chain FROM invoices_all WHERE id=?", (row["invoice_id"],)).fetchone() or ["-"])[0]
+    if status is not None and 200 <= status < 300:
+        db.execute("UPDATE webhook_outbox SET state='delivered', attempts=?, last_status=?, last_error=NULL, delivered_at=? WHERE id=?",
+            (attempts, status, now.isoformat(), row["id"]))
+        record_event(db, row["invoice_id"], chain, "webhook_delivered", detail=f"{row['event']} {status}", commit=False)
+        return "deliveries"
+    if attempts >= int(os.getenv("WEBHOOK_MAX_ATTEMPTS", 8)):
+        db.execute("UPDATE webhook_outbox SET state='dead', attempts=?, last_status=?, last_error=? WHERE id=?",
+            (attempts, status, error, row["id"]))
+        record_event(db, row["invoice_id"], chain, "webhook_dead", detail=f"{row['event']} {status or error}", commit=False)
+        return "dead_lettered"
+    next_at = now + timedelta(seconds=_backoff(attempts))
+    db.execute("UPDATE webhook_outbox SET attempts=?, last_status=?, last_error=?, next_attempt_at=? WHERE id=?",
+        (attempts, status, error, next_at.isoformat(), row["id"]))
+    return "retries"
+
+dispatcher = Dispatcher()
+
+def wake():
+    if dispatcher._thread is not None:
+        dispatcher.wake()
+
+def _retry(db, outbox_id):
+    query = "UPDATE webhook_outbox SET state='pending', attempts=0, next_attempt_at=? WHERE state='dead'"
+    params = [_now().isoformat()]
+    if outbox_id is not None:
+        query += " AND id=?"
+        params.append(outbox_id)
+    return db.execute(query, params).rowcount
+
+def retry(outbox_id=None):
+    count = storage.write(_retry, outbox_id)
+    wake()
+    return count
+
+def outbox_counts(db):
+    return dict(db.execute("SELECT state, COUNT(*) FROM webhook_outbox GROUP BY state").fetchall())
+
+def webhook_stats():
+    with storage.reader() as db:
+        counts = outbox_counts(db)
+    return dict(dispatcher.snapshot(), **{s: counts.get(s, 0) for s in ("pending", "delivered", "dead")})
+
+def start_webhooks(app):
+    dispatcher.start()
+    dispatcher.wake()
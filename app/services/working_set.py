@@ -0,0 +1,107 @@
+import os
+import heapq
+import threading
+from datetime import datetime
+from app.services import storage
+
+OPEN_STATUSES = ("pending", "underpaid", "confirming", "sweeping")
+COLUMNS = ("id", "chain", "token", "status", "deposit_address", "amount_native", "amount_requested", "expires_at")
+
+class OpenInvoice:
+    __slots__ = COLUMNS + ("expires",)
+
+    def __init__(self, row):
+        for column in COLUMNS:
+            setattr(self, column, row[column])
+        self.expires = datetime.fromisoformat(row["expires_at"].replace("Z", "+00:00")).timestamp()
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+_lock = threading.Lock()
+_state = {"path": None, "loads": 0, "refreshes": 0}
+_by_id = {}
+_by_address = {}
+_expiry = []
+
+def _select(db, where, params):
+    return db.execute(f"SELECT {', '.join(COLUMNS)} FROM invoices WHERE {where}", params).fetchall()
+
+def _put(record):
+    old = _by_id.get(record.id)
+    if old is not None and old.deposit_address.lower() != record.deposit_address.lower():
+        _by_address.pop(old.deposit_address.lower(), None)
+    _by_id[record.id] = record
+    _by_address[record.deposit_address.lower()] = record.id
+    if old is None or old.expires != record.expires:
+        heapq.heappush(_expiry, (record.expires, record.id))
+
+def _drop(invoice_id):
+    record = _by_id.pop(invoice_id, None)
+    if record is not None and _by_address.get(record.deposit_address.lower()) == invoice_id:
+        del _by_address[record.deposit_address.lower()]
+
+def load():
+    path = os.getenv("DB_PATH", "data/ghost.db")
+    with storage.reader() as db:
+        rows = _select(db, f"status IN ({','.join('?' * len(OPEN_STATUSES))})", OPEN_STATUSES)
+    with _lock:
+        _by_id.clear()
+        _by_address.clear()
+        _expiry.clear()
+        for row in rows:
+            _put(OpenInvoice(row))
+        _state["path"] = path
+        _state["loads"] += 1
+    return len(rows)
+
+def _ensure():
+    if _state["path"] != os.getenv("DB_PATH", "data/ghost.db"):
+        load()
+
+def refresh(*invoice_ids):
+    if not invoice_ids:
+        return
+    _ensure()
+    with storage.reader() as db:
+        rows = {row["id"]: row for row in _select(db, f"id IN ({','.join('?' * len(invoice_ids))})", invoice_ids)}
+    with _lock:
+        for invoice_id in invoice_ids:
+            row = rows.get(invoice_id)
+            if row is not None and row["status"] in OPEN_STATUSES:
+                _put(OpenInvoice(row))
+            else:
+                _drop(invoice_id)
+        _state["refreshes"] += 1
+
+def snapshot(ids=None, statuses=OPEN_STATUSES, chain=None):
+    _ensure()
+    with _lock:
+        records = _by_id.values() if ids is None else [_by_id[i] for i in ids if i in _by_id]
+        return [r for r in records if r.status in statuses and (chain is None or r.chain == chain)]
+
+def by_address(address):
+    _ensure()
+    with _lock:
+        return _by_id.get(_by_address.get(address.lower()))
+
+def expiring(now):
+    _ensure()
+    due = []
+    with _lock:
+        while _expiry and _expiry[0][0] <= now:
+            expires, invoice_id = heapq.heappop(_expiry)
+            record = _by_id.get(invoice_id)
+            if record is not None and record.expires == expires and record.status in ("pending", "underpaid"):
+                due.append(record)
+        for record in due:
+            heapq.heappush(_expiry, (record.expires, record.id))
+    return due
+
+def working_set_stats():
+    with _lock:
+        counts = {}
+        for record in _by_id.values():
+            counts[record.status] = counts.get(record.status, 0) + 1
+        return {"size": len(_by_id), "by_status": counts, "expiry_heap": len(_expiry), "loads": _state["loads"],
+            "refreshes": _state["refreshes"]}
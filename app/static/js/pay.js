@@ -71,13 +71,17 @@
     else if (status === "expired") { dot.classList.add("expired"); text.textContent = "Invoice expired"; }
   }
 
-  var es = new EventSource(PP_BASE + "/pay/" + INVOICE_ID + "/stream");
-  es.addEventListener("status", function(e) {
-    var data = JSON.parse(e.data);
-    setStatus(data.status);
-    if (terminal.indexOf(data.status) !== -1) es.close();
-  });
-  es.onerror = function() {
-    if (terminal.indexOf(currentStatus) !== -1) es.close();
-  };
+  function connect() {
+    var es = new EventSource(PP_BASE + "/pay/" + INVOICE_ID + "/stream");
+    es.addEventListener("status", function(e) {
+      var data = JSON.parse(e.data);
+      setStatus(data.status);
+      if (terminal.indexOf(data.status) !== -1) es.close();
+    });
+    es.onerror = function() {
+      if (terminal.indexOf(currentStatus) !== -1) es.close();
+      else if (es.readyState === EventSource.CLOSED) setTimeout(connect, 10000);
+    };
+  }
+  connect();
 })();
@@ -1,21 +1,37 @@
 #!/bin/bash
 set -e
-echo "Building GhostPayments binary..."
+# Usage: build.sh [--onedir]
+#   default   single self-extracting binary (dist/ghostpayments)
+#   --onedir  unpacked layout that starts without re-extracting on every launch
+#             (dist/ghostpayments-onedir.tar.gz, contains ghostpayments/ghostpayments + ghostpayments/_internal)
+LAYOUT="${BUILD_LAYOUT:-onefile}"
+[ "$1" = "--onedir" ] && LAYOUT="onedir"
+echo "Building GhostPayments binary (${LAYOUT})..."
 cd "$(dirname "$0")/.."
-python3.13 -m PyInstaller \
-    --onefile \
-    --name ghostpayments \
-    --collect-all bip_utils \
-    --collect-all coincurve \
-    --collect-all cffi \
-    --hidden-import coincurve._cffi_backend \
-    --hidden-import _cffi_backend \
-    --add-data "app/static:app/static" \
-    --add-data "app/templates:app/templates" \
-    run.py
-echo "Generating checksums..."
-cd dist
-sha256sum ghostpayments > ghostpayments.sha256
+echo "Precompressing static assets..."
+python3.13 -c "from app.services.assets import precompress; print(precompress('app/static'), 'files')"
+PYI_ARGS=(
+    --name ghostpayments
+    --collect-all bip_utils
+    --collect-all coincurve
+    --collect-all cffi
+    --hidden-import coincurve._cffi_backend
+    --hidden-import _cffi_backend
+    --add-data "app/static:app/static"
+    --add-data "app/templates:app/templates"
+)
+if [ "${LAYOUT}" = "onedir" ]; then
+    python3.13 -m PyInstaller --onedir --noconfirm --distpath dist/onedir "${PYI_ARGS[@]}" run.py
+    tar -czf dist/ghostpayments-onedir.tar.gz -C dist/onedir ghostpayments
+    echo "Generating checksums..."
+    cd dist
+    sha256sum ghostpayments-onedir.tar.gz > ghostpayments-onedir.tar.gz.sha256
+else
+    python3.13 -m PyInstaller --onefile "${PYI_ARGS[@]}" run.py
+    echo "Generating checksums..."
+    cd dist
+    sha256sum ghostpayments > ghostpayments.sha256
+fi
 cd ..
 echo "Build complete!"
 ls -lh dist/
@@ -1,11 +1,43 @@
 import sys
 import os
-import asyncio
 import argparse
-from dotenv import load_dotenv
+
+def _warm_imports():
+    import app.services.chains
+    import app.services.wallet
+    import app.services.sweeper
+
+def _export(argv):
+    parser = argparse.ArgumentParser(prog="ghostpayments export", description="Stream invoices as CSV or NDJSON")
+    parser.add_argument("--format", choices=("csv", "ndjson"), default="csv")
+    parser.add_argument("--gzip", action="store_true", help="gzip the output (implied by a .gz output file)")
+    parser.add_argument("--from", dest="since", help="Only invoices created at or after this ISO date/time")
+    parser.add_argument("--to", dest="until", help="Only invoices created before this ISO date/time")
+    parser.add_argument("--status", default="", help="Comma-separated statuses, e.g. completed,expired")
+    parser.add_argument("--chain", choices=("BSC", "POLYGON", "bsc", "polygon"))
+    parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    args = parser.parse_args(argv)
+    from dotenv import load_dotenv
+    load_dotenv()
+    from app.services.export import export_invoices
+    compress = args.gzip or (args.output or "").endswith(".gz")
+    chunks = export_invoices(args.format, compress, since=args.since, until=args.until,
+        statuses=[s for s in args.status.split(",") if s], chain=args.chain)
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+        else:
+            out.flush()
+    return 0
 
 def main():
     if len(sys.argv) >= 2 and sys.argv[1] == "update":
+        import asyncio
+        from dotenv import load_dotenv
         load_dotenv()
         from updater import Updater
         asyncio.run(Updater(
@@ -13,6 +45,17 @@ def main():
             https_proxy=os.getenv("UPDATE_HTTPS_PROXY", ""),
         ).manual_update())
         sys.exit(0)
+    if len(sys.argv) >= 2 and sys.argv[1] == "export":
+        sys.exit(_export(sys.argv[2:]))
+    if len(sys.argv) >= 2 and sys.argv[1] == "compact":
+        from dotenv import load_dotenv
+        load_dotenv()
+        from app.services.archiver import compact_database
+        print(f"Database compacted to {compact_database() / 2**20:.1f} MiB")
+        sys.exit(0)
+    if len(sys.argv) >= 2 and sys.argv[1] == "loadtest":
+        from app.loadtest.harness import main as loadtest
+        sys.exit(loadtest(sys.argv[2:]))
     parser = argparse.ArgumentParser(description="GhostPayments — Crypto Payment Processor")
     parser.add_argument("--version", action="store_true", help="Print version and exit")
     parser.add_argument("--generate-token", action="store_true", help="Print a new nanoid(20) token to stdout and exit")
@@ -25,29 +68,40 @@ def main():
         from nanoid import generate
         print(generate(size=20))
         sys.exit(0)
+    from dotenv import load_dotenv
     load_dotenv()
     from app.db import init_db
     init_db()
     from app import create_app
     app = create_app()
+    import threading
+    threading.Thread(target=_warm_imports, daemon=True).start()
     auto_update = os.getenv("AUTO_UPDATE", "true").lower() == "true"
     if auto_update:
-        import threading
+        import asyncio
         from updater import Updater
+        from app.services.handoff import request_restart
         shutdown_event = asyncio.Event()
         updater = Updater(
             check_interval=int(os.getenv("UPDATE_CHECK_INTERVAL", 300)),
             check_on_startup=os.getenv("UPDATE_CHECK_ON_STARTUP", "true").lower() == "true",
             http_proxy=os.getenv("UPDATE_HTTP_PROXY", ""),
             https_proxy=os.getenv("UPDATE_HTTPS_PROXY", ""),
+            restart=request_restart,
         )
         def _run_update_loop():
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
             loop.run_until_complete(updater.update_loop(shutdown_event))
         threading.Thread(target=_run_update_loop, daemon=True).start()
-    from waitress import serve
-    serve(app, host="0.0.0.0", port=int(os.getenv("PORT", 5000)), threads=app.config["WAITRESS_THREADS"], channel_timeout=120)
+        from app.services import runtime
+        def _retune_updater(changed):
+            updater.check_interval = runtime.get_int("UPDATE_CHECK_INTERVAL", 300)
+            updater.http_proxy = runtime.get_str("UPDATE_HTTP_PROXY")
+            updater.https_proxy = runtime.get_str("UPDATE_HTTPS_PROXY")
+        runtime.subscribe("updater", ("UPDATE_CHECK_INTERVAL", "UPDATE_HTTP_PROXY", "UPDATE_HTTPS_PROXY"), _retune_updater)
+    from app.services.handoff import serve
+    serve(app, host="0.0.0.0", port=int(os.getenv("PORT", 5000)), threads=app.config["WAITRESS_THREADS"])
 
 if __name__ == "__main__":
     main()
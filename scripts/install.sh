@@ -15,6 +15,8 @@ NC="\033[0m"
 CONFIG_DIR="/etc/ghostpayments"
 SERVICE_FILE="/etc/systemd/system/ghostpayments.service"
 BIN_PATH="/usr/local/bin/ghostpayments"
+ONEDIR_PATH="/opt/ghostpayments"
+LAYOUT="${GHOSTPAYMENTS_LAYOUT:-onefile}"   # onedir = unpacked install, no self-extraction on each start
 
 p_step() { echo -e "\n${BLUE}${BOLD}▶  $1${NC}"; }
 p_ok()   { echo -e "  ${GREEN}✓${NC}  $1"; }
@@ -82,17 +84,27 @@ p_ok "OS: Linux — OK"
 
 p_step "Downloading GhostPayments binary..."
 TMP=$(mktemp -d)
-wget -q --show-progress "https://github.com/${GITHUB_REPO}/releases/${VERSION}/download/ghostpayments" -O "${TMP}/ghostpayments"
-wget -q "https://github.com/${GITHUB_REPO}/releases/${VERSION}/download/ghostpayments.sha256" -O "${TMP}/ghostpayments.sha256"
+ARTIFACT="ghostpayments"
+[ "${LAYOUT}" = "onedir" ] && ARTIFACT="ghostpayments-onedir.tar.gz"
+wget -q --show-progress "https://github.com/${GITHUB_REPO}/releases/${VERSION}/download/${ARTIFACT}" -O "${TMP}/${ARTIFACT}"
+wget -q "https://github.com/${GITHUB_REPO}/releases/${VERSION}/download/${ARTIFACT}.sha256" -O "${TMP}/${ARTIFACT}.sha256"
 
 p_step "Verifying checksum..."
 cd "${TMP}"
-sha256sum -c ghostpayments.sha256
+sha256sum -c "${ARTIFACT}.sha256"
 p_ok "Checksum verified"
 
 p_step "Installing binary..."
-install -m 755 "${TMP}/ghostpayments" "${BIN_PATH}"
-p_ok "Binary installed to ${BIN_PATH}"
+if [ "${LAYOUT}" = "onedir" ]; then
+    tar -xzf "${TMP}/${ARTIFACT}" -C "${TMP}"
+    rm -rf "${ONEDIR_PATH}"
+    mv "${TMP}/ghostpayments" "${ONEDIR_PATH}"
+    ln -sf "${ONEDIR_PATH}/ghostpayments" "${BIN_PATH}"
+    p_ok "Installed to ${ONEDIR_PATH}, linked at ${BIN_PATH}"
+else
+    install -m 755 "${TMP}/ghostpayments" "${BIN_PATH}"
+    p_ok "Binary installed to ${BIN_PATH}"
+fi
 cd /
 
 p_step "Creating configuration directory..."
@@ -209,9 +221,11 @@ Description=GhostPayments Crypto Payment Processor
 After=network.target
 
 [Service]
-Type=simple
+Type=notify
+NotifyAccess=all
 EnvironmentFile=/etc/ghostpayments/.env
 ExecStart=/usr/local/bin/ghostpayments
+ExecReload=/bin/kill -HUP $MAINPID
 Restart=always
 RestartSec=5
 
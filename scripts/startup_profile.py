@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+import argparse
+import subprocess
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    "version": ["run.py", "--version"],
+    "generate-token": ["run.py", "--generate-token"],
+    "create-app": ["-c", "from app import create_app; create_app()"],
+}
+
+def _parse_line(line):
+    self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+    return name.rstrip()[1:], int(self_us), int(cumulative_us)
+
+def profile(args, python, env):
+    start = time.perf_counter()
+    proc = subprocess.run([python, "-X", "importtime"] + args, cwd=ROOT, env=env, capture_output=True, text=True, timeout=120)
+    wall = time.perf_counter() - start
+    rows = [_parse_line(l) for l in proc.stderr.splitlines() if l.startswith("import time:") and "self [us]" not in l]
+    return wall, rows, proc.returncode
+
+def time_binary(binary, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([binary, "--version"], capture_output=True, timeout=120)
+        samples.append(time.perf_counter() - start)
+    return min(samples), sum(samples) / len(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup-time profile for GhostPayments CLI and app boot paths")
+    parser.add_argument("--top", type=int, default=10, help="Top-level imports to show per scenario")
+    parser.add_argument("--python", default=sys.executable)
+    parser.add_argument("--binary", help="Also time '<binary> --version' (e.g. dist/ghostpayments)")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    env = dict(os.environ)
+    env.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "profile.db"))
+    env["AUTO_UPDATE"] = "false"
+    for name, scenario in SCENARIOS.items():
+        wall, rows, rc = profile(scenario, args.python, env)
+        top_level = [r for r in rows if not r[0].startswith(" ")]
+        total_ms = sum(r[2] for r in top_level) / 1000
+        print(f"== {name}: wall {wall * 1000:.0f} ms, imports {total_ms:.0f} ms, {len(rows)} modules{'' if rc == 0 else f' (exit {rc})'}")
+        for mod, _, cumulative in sorted(top_level, key=lambda r: -r[2])[:args.top]:
+            print(f"   {cumulative / 1000:8.1f} ms  {mod}")
+    if args.binary:
+        best, mean = time_binary(args.binary, args.runs)
+        print(f"== binary {args.binary} --version: best {best * 1000:.0f} ms, mean {mean * 1000:.0f} ms over {args.runs} runs")
+
+if __name__ == "__main__":
+    main()
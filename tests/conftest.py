@@ -4,3 +4,38 @@ os.environ.setdefault("MAIN_MNEMONIC", "abandon abandon abandon abandon abandon
 os.environ.setdefault("ADMIN_PATH", "testadmin")
 os.environ.setdefault("PAYMENT_PATH", "testpay")
 os.environ.setdefault("MAIN_WALLET_ADDRESS", "0x0000000000000000000000000000000000000001")
+os.environ.setdefault("ADMISSION_BURST", "1000")
+import json
+import pytest
+from datetime import datetime, timezone, timedelta
+from app.db import init_db, open_db
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "test.db")
+    init_db(path)
+    monkeypatch.setenv("DB_PATH", path)
+    return path
+
+@pytest.fixture
+def db(db_path):
+    db = open_db(db_path)
+    yield db
+    db.close()
+
+@pytest.fixture
+def insert_invoice(db_path):
+    def insert(invoice_id, hd_index=1, age=timedelta(0), expires_in=timedelta(0), **fields):
+        created = datetime.now(timezone.utc) - age
+        row = {"id": invoice_id, "chain": "BSC", "token": "USDT", "amount_native": "1", "amount_requested": "1",
+            "deposit_address": f"0x{hd_index:040x}", "hd_index": hd_index, "status": "pending",
+            "created_at": created.isoformat(), "expires_at": (created + expires_in).isoformat(), **fields}
+        if isinstance(row.get("metadata"), dict):
+            row["metadata"] = json.dumps(row["metadata"])
+        db = open_db(db_path)
+        try:
+            db.execute(f"INSERT INTO invoices ({', '.join(row)}) VALUES ({','.join('?' * len(row))})", tuple(row.values()))
+            db.commit()
+        finally:
+            db.close()
+    return insert
@@ -0,0 +1,80 @@
+import hashlib
+import sqlite3
+import pytest
+from datetime import datetime, timezone
+from app.db import init_db
+init_db()
+from app import create_app
+from app.services import admission
+
+@pytest.fixture(scope="module")
+def app():
+    application = create_app()
+    application.config["TESTING"] = True
+    return application
+
+@pytest.fixture
+def client(app):
+    yield app.test_client()
+    admission.configure()
+    admission._buckets.clear()
+
+@pytest.fixture(scope="module")
+def api_key(app):
+    plaintext = "gp_admissionkey1234567890123456789"
+    db = sqlite3.connect(app.config["DB_PATH"])
+    db.execute("INSERT OR REPLACE INTO api_keys (id, label, key_hash, key_prefix, is_active, created_at) VALUES ('admid','adm',?,?,1,?)",
+        (hashlib.sha256(plaintext.encode()).hexdigest(), plaintext[:8], datetime.now(timezone.utc).isoformat()))
+    db.commit()
+    db.close()
+    admission._active_keys["loaded"] = 0.0
+    return plaintext
+
+def test_public_poll_rate_limited(client):
+    admission.configure({"ADMISSION_RATE_PER_SECOND": "1", "ADMISSION_BURST": "2"})
+    codes = [client.get("/testpay/api/invoice/doesnotexist00000000").status_code for _ in range(3)]
+    assert codes[:2] == [404, 404]
+    assert codes[2] == 429
+    resp = client.get("/testpay/api/invoice/doesnotexist00000000")
+    assert int(resp.headers["Retry-After"]) >= 1
+
+def test_saturated_lane_sheds_with_503(client):
+    admission.configure({"ADMISSION_PUBLIC_CONCURRENCY": "1"})
+    assert admission._lanes["public"].try_acquire()
+    resp = client.get("/testpay/api/invoice/doesnotexist00000000")
+    admission._lanes["public"].release()
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "1"
+
+def test_lane_slot_released_after_response(client):
+    admission.configure({"ADMISSION_PUBLIC_CONCURRENCY": "1"})
+    for _ in range(3):
+        assert client.get("/testpay/api/invoice/doesnotexist00000000").status_code == 404
+    assert admission._lanes["public"].active == 0
+
+def test_authenticated_requests_bypass_limits(client, api_key):
+    admission.configure({"ADMISSION_PUBLIC_CONCURRENCY": "1", "ADMISSION_RATE_PER_SECOND": "1", "ADMISSION_BURST": "1"})
+    assert admission._lanes["public"].try_acquire()
+    for _ in range(3):
+        resp = client.get("/testpay/api/invoice/doesnotexist00000000", headers={"X-GhostPay-Key": api_key})
+        assert resp.status_code == 404
+    admission._lanes["public"].release()
+
+def test_reconfigure_keeps_in_flight_slots(client):
+    admission.configure({"ADMISSION_STREAM_CONCURRENCY": "2"})
+    lane = admission._lanes["stream"]
+    assert lane.try_acquire() and lane.try_acquire()
+    admission.configure({"ADMISSION_STREAM_CONCURRENCY": "3"})
+    assert admission._lanes["stream"] is lane
+    assert lane.try_acquire()
+    assert not lane.try_acquire()
+    for _ in range(3):
+        lane.release()
+
+def test_saturated_stream_lane_defers_with_retry_hint(client):
+    admission.configure({"ADMISSION_STREAM_CONCURRENCY": "1"})
+    assert admission._lanes["stream"].try_acquire()
+    resp = client.get("/testpay/pay/doesnotexist00000000/stream")
+    admission._lanes["stream"].release()
+    assert resp.status_code == 200 and resp.mimetype == "text/event-stream"
+    assert resp.get_data(as_text=True) == "retry: 10000\n\n"
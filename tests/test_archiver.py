@@ -0,0 +1,59 @@
+import sqlite3
+from datetime import timedelta
+from app.db import init_db, open_db
+from app.services import storage
+from app.services.archiver import archive_invoices, compact_database, run_maintenance
+
+def test_archives_old_terminal_invoices(db, insert_invoice):
+    insert_invoice("old-done", 1, status="completed", age=timedelta(days=40))
+    insert_invoice("old-expired", 2, status="expired", age=timedelta(days=40))
+    insert_invoice("new-done", 3, status="completed", age=timedelta(days=1))
+    insert_invoice("old-open", 4, status="pending", age=timedelta(days=40))
+    assert archive_invoices(older_than_days=30) == 2
+    hot = {r[0] for r in db.execute("SELECT id FROM invoices").fetchall()}
+    cold = {r[0] for r in db.execute("SELECT id FROM invoices_archive").fetchall()}
+    assert hot == {"new-done", "old-open"}
+    assert cold == {"old-done", "old-expired"}
+
+def test_archived_invoices_visible_through_view(db, insert_invoice):
+    insert_invoice("old-done", 7, status="completed", age=timedelta(days=40))
+    archive_invoices(older_than_days=30)
+    row = db.execute("SELECT * FROM invoices_all WHERE id='old-done'").fetchone()
+    assert row["status"] == "completed"
+    assert row["hd_index"] == 7
+
+def test_archive_disabled_with_zero_days(db, insert_invoice):
+    insert_invoice("old-done", 1, status="completed", age=timedelta(days=400))
+    assert archive_invoices(older_than_days=0) == 0
+    assert db.execute("SELECT COUNT(*) FROM invoices").fetchone()[0] == 1
+
+def test_maintenance_goes_through_writer_in_batches(db, insert_invoice):
+    for i in range(5):
+        insert_invoice(f"old-{i}", i, status="expired", age=timedelta(days=40))
+    db.execute("""INSERT INTO idempotency_keys (api_key_id, idem_key, request_hash, state, created_at, expires_at)
+        VALUES ('k', 'a', 'h', 'done', '2026-01-01T00:00:00+00:00', '2026-01-02T00:00:00+00:00')""")
+    db.commit()
+    ops = storage.storage_stats()["ops"]
+    assert archive_invoices(older_than_days=30, batch_size=2) == 5
+    assert storage.storage_stats()["ops"] - ops == 3
+    run_maintenance()
+    assert db.execute("SELECT COUNT(*) FROM idempotency_keys").fetchone()[0] == 0
+    assert db.execute("SELECT COUNT(*) FROM invoices_archive").fetchone()[0] == 5
+
+def test_new_database_uses_incremental_vacuum(db):
+    assert db.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+def test_compact_switches_legacy_database(tmp_path):
+    db_path = str(tmp_path / "legacy.db")
+    legacy = sqlite3.connect(db_path)
+    legacy.execute("CREATE TABLE t (x)")
+    legacy.commit()
+    legacy.close()
+    init_db(db_path)
+    db = open_db(db_path)
+    assert db.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+    db.close()
+    assert compact_database(db_path) > 0
+    db = open_db(db_path)
+    assert db.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    db.close()
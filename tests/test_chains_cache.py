@@ -0,0 +1,65 @@
+import time
+import threading
+import pytest
+from app.services import chains
+
+class FakeEth:
+    def __init__(self):
+        self.calls = {"gas_price": 0, "chain_id": 0, "balance": 0}
+
+    @property
+    def gas_price(self):
+        self.calls["gas_price"] += 1
+        time.sleep(0.2)
+        return 5 * 10**9
+
+    @property
+    def chain_id(self):
+        self.calls["chain_id"] += 1
+        return 56
+
+    def get_balance(self, address):
+        self.calls["balance"] += 1
+        return self.calls["balance"]
+
+class FakeW3:
+    def __init__(self):
+        self.eth = FakeEth()
+
+@pytest.fixture
+def w3(monkeypatch):
+    chains.clear_rpc_cache()
+    fake = FakeW3()
+    monkeypatch.setattr(chains, "get_w3", lambda chain: fake)
+    yield fake
+    chains.clear_rpc_cache()
+
+def test_concurrent_gas_price_reads_coalesce(w3):
+    before = chains.rpc_cache_stats()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(chains.get_gas_price("BSC"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [5 * 10**9] * 8
+    assert w3.eth.calls["gas_price"] == 1
+    chains.get_gas_price("BSC")
+    stats = chains.rpc_cache_stats()
+    assert stats["misses"] - before["misses"] == 1
+    assert stats["hits"] + stats["coalesced"] - before["hits"] - before["coalesced"] == 8
+
+def test_gas_price_expires(w3, monkeypatch):
+    monkeypatch.setenv("RPC_CACHE_GAS_PRICE_TTL", "0.01")
+    chains.get_gas_price("BSC")
+    time.sleep(0.05)
+    chains.get_gas_price("BSC")
+    assert w3.eth.calls["gas_price"] == 2
+
+def test_chain_id_cached_forever_and_balances_fresh_by_default(w3):
+    assert chains.get_chain_id("BSC") == chains.get_chain_id("BSC") == 56
+    assert w3.eth.calls["chain_id"] == 1
+    assert chains.get_native_balance("BSC", "0xAA") == 1
+    assert chains.get_native_balance("BSC", "0xAA") == 2
+    assert chains.get_native_balance("BSC", "0xAA", max_age=60) == 3
+    assert chains.get_native_balance("BSC", "0xaa", max_age=60) == 3
@@ -2,7 +2,7 @@ import os
 import sqlite3
 import pytest
 import tempfile
-from app.db import init_db, open_db
+from app.db import init_db, open_db, SCHEMA_VERSION
 
 @pytest.fixture
 def tmp_db(tmp_path):
@@ -14,7 +14,7 @@ def tmp_db(tmp_path):
 def test_schema_version(tmp_db):
     db = open_db(tmp_db)
     version = db.execute("PRAGMA user_version").fetchone()[0]
-    assert version == 1
+    assert version == SCHEMA_VERSION
     db.close()
 
 def test_invoices_table_exists(tmp_db):
@@ -23,6 +23,7 @@ def test_invoices_table_exists(tmp_db):
     names = [t[0] for t in tables]
     assert "invoices" in names
     assert "api_keys" in names
+    assert "invoices_archive" in names
     db.close()
 
 def test_invoices_columns(tmp_db):
@@ -51,5 +52,27 @@ def test_idempotent_init(tmp_db):
     init_db(tmp_db)
     db = open_db(tmp_db)
     version = db.execute("PRAGMA user_version").fetchone()[0]
-    assert version == 1
+    assert version == SCHEMA_VERSION
+    db.close()
+
+def test_merchant_ref_backfilled_from_metadata(tmp_path):
+    db_path = str(tmp_path / "v5.db")
+    init_db(db_path)
+    db = sqlite3.connect(db_path)
+    db.execute("DROP VIEW invoices_all")
+    for (trigger,) in db.execute("SELECT name FROM sqlite_master WHERE type='trigger' AND name LIKE '%search%'").fetchall():
+        db.execute(f"DROP TRIGGER {trigger}")
+    db.execute("DROP TABLE invoice_search")
+    for table in ("invoices", "invoices_archive"):
+        db.execute(f"DROP INDEX idx_{table}_merchant_ref")
+        db.execute(f"ALTER TABLE {table} DROP COLUMN merchant_ref")
+    db.execute("""INSERT INTO invoices (id, chain, token, amount_native, deposit_address, hd_index, status, metadata, created_at, expires_at)
+        VALUES ('m1', 'BSC', 'USDT', '1', '0xabc', 1, 'pending', '{"order_id": "A-1"}', '2026-01-01', '2026-01-01')""")
+    db.execute("PRAGMA user_version=5")
+    db.commit()
+    db.close()
+    init_db(db_path)
+    db = sqlite3.connect(db_path)
+    assert db.execute("SELECT merchant_ref FROM invoices_all WHERE id='m1'").fetchone()[0] == "A-1"
+    assert db.execute("SELECT invoice_id FROM invoice_search WHERE invoice_search MATCH ?", ('"A-1"',)).fetchone()[0] == "m1"
     db.close()
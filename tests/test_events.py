@@ -0,0 +1,33 @@
+import sqlite3
+import pytest
+from datetime import datetime, timezone, timedelta
+from app.services.events import record_event, invoice_events, latency_report
+
+def _at(db, invoice_id, chain, event, seconds, base=datetime(2026, 1, 1, tzinfo=timezone.utc)):
+    db.execute("INSERT INTO invoice_events (invoice_id, chain, event, created_at) VALUES (?, ?, ?, ?)",
+        (invoice_id, chain, event, (base + timedelta(seconds=seconds)).isoformat()))
+
+def test_events_are_append_only(db):
+    record_event(db, "inv1", "BSC", "detected", block_number=100)
+    record_event(db, "inv1", "BSC", "transfer_sent", tx_hash="0xabc")
+    assert [(e["event"], e["block_number"], e["tx_hash"]) for e in invoice_events(db, "inv1")] == [
+        ("detected", 100, None), ("transfer_sent", None, "0xabc")]
+    with pytest.raises(sqlite3.IntegrityError):
+        db.execute("UPDATE invoice_events SET event='confirmed'")
+    with pytest.raises(sqlite3.IntegrityError):
+        db.execute("DELETE FROM invoice_events")
+
+def test_latency_percentiles_per_chain(db):
+    for i in range(1, 101):
+        _at(db, f"bsc{i}", "BSC", "detected", 0)
+        _at(db, f"bsc{i}", "BSC", "transfer_sent", i / 2)
+        _at(db, f"bsc{i}", "BSC", "transfer_mined", i)
+    _at(db, "pol1", "POLYGON", "detected", 0)
+    _at(db, "pol-open", "POLYGON", "detected", 0)
+    _at(db, "pol1", "POLYGON", "transfer_mined", 42)
+    db.commit()
+    report = latency_report(db, "2025-12-01")
+    assert report["BSC"]["total"] == {"count": 100, "p50": 50.0, "p95": 95.0, "p99": 99.0}
+    assert report["BSC"]["transfer"]["p50"] == 25.0
+    assert report["POLYGON"]["total"]["count"] == 1
+    assert "gas_topup" not in report["BSC"]
@@ -0,0 +1,36 @@
+import csv
+import gzip
+import io
+import json
+import pytest
+from app.db import open_db
+from app.services.export import export_invoices, _query
+
+@pytest.fixture(autouse=True)
+def invoices(insert_invoice):
+    for i, (status, chain) in enumerate([("completed", "BSC"), ("expired", "POLYGON"), ("completed", "POLYGON"), ("pending", "BSC")]):
+        created = f"2026-01-0{i + 1}T00:00:00+00:00"
+        insert_invoice(f"inv{i}", i, chain=chain, status=status, created_at=created, expires_at=created)
+
+def test_csv_export_in_created_order_with_filters(db_path):
+    data = b"".join(export_invoices("csv", db_path=db_path, since="2026-01-02", statuses=["completed", "expired"]))
+    rows = list(csv.DictReader(io.StringIO(data.decode())))
+    assert [r["id"] for r in rows] == ["inv1", "inv2"]
+    assert rows[0]["status"] == "expired"
+
+def test_gzipped_ndjson_export(db_path):
+    data = gzip.decompress(b"".join(export_invoices("ndjson", compress=True, db_path=db_path, chain="bsc", until="2026-01-04")))
+    lines = [json.loads(line) for line in data.decode().splitlines()]
+    assert [l["id"] for l in lines] == ["inv0"]
+    assert lines[0]["hd_index"] == 0
+
+def test_export_streams_in_chunks(db_path):
+    chunks = export_invoices("ndjson", db_path=db_path, batch_size=1)
+    assert next(chunks).count(b"\n") == 4
+
+def test_filtered_export_scans_created_index(db_path):
+    db = open_db(db_path)
+    query, params = _query(since="2026-01-02", statuses=["completed"], chain="bsc")
+    plan = [r[3] for r in db.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()]
+    db.close()
+    assert any("idx_invoices_created" in p for p in plan) and "USE TEMP B-TREE FOR ORDER BY" not in plan
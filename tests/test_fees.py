@@ -0,0 +1,61 @@
+import pytest
+from app.services import chains, fees
+
+GWEI = 10**9
+
+class FakeEth:
+    gas_price = 5 * GWEI
+
+    def get_block(self, block):
+        return {"baseFeePerGas": 40 * GWEI}
+
+    def fee_history(self, blocks, newest, percentiles):
+        return {"baseFeePerGas": [30 * GWEI, 40 * GWEI], "reward": [[GWEI], [50 * GWEI], [60 * GWEI]]}
+
+class FakeW3:
+    eth = FakeEth()
+
+@pytest.fixture(autouse=True)
+def fake_chain(monkeypatch):
+    chains.clear_rpc_cache()
+    monkeypatch.setattr(fees, "get_w3", lambda chain: FakeW3())
+    monkeypatch.setattr(fees, "get_gas_price", lambda chain: 5 * GWEI)
+    monkeypatch.setattr(fees, "_gas_samples", {})
+    yield
+    chains.clear_rpc_cache()
+
+def test_polygon_uses_type2_fees_from_fee_history(monkeypatch):
+    monkeypatch.setenv("POLYGON_MIN_PRIORITY_GWEI", "30")
+    quote = fees.get_fees("POLYGON")
+    assert quote.tx_fields() == {"type": 2, "maxFeePerGas": 2 * 40 * GWEI + 50 * GWEI, "maxPriorityFeePerGas": 50 * GWEI}
+    assert quote.price == 90 * GWEI
+    bumped = quote.bumped(1.2)
+    assert bumped.max_fee == int(quote.max_fee * 1.2) and bumped.priority_fee == int(quote.priority_fee * 1.2)
+
+def test_priority_floor_and_legacy_mode(monkeypatch):
+    monkeypatch.setenv("POLYGON_MIN_PRIORITY_GWEI", "100")
+    assert fees.get_fees("POLYGON").priority_fee == 100 * GWEI
+    assert fees.get_fees("BSC").tx_fields() == {"gasPrice": 5 * GWEI}
+    monkeypatch.setenv("POLYGON_FEE_MODE", "legacy")
+    assert not fees.get_fees("POLYGON").is_eip1559
+
+def test_token_gas_limit_follows_measured_usage(monkeypatch):
+    monkeypatch.setenv("TOKEN_GAS_LIMIT_MARGIN_PERCENT", "10")
+    assert fees.estimated_gas("BSC", "USDT") == fees.DEFAULT_TOKEN_GAS
+    fees.record_gas_used("BSC", "USDT", 34000)
+    fees.record_gas_used("BSC", "USDT", 51000)
+    assert chains.estimate_token_transfer_gas("BSC", "USDT") == 51000
+    assert fees.token_gas_limit("BSC", "USDT") == 56100
+    assert fees.estimated_gas("POLYGON", "USDT") == fees.DEFAULT_TOKEN_GAS
+
+def test_cold_start_limit_and_newest_samples(db, insert_invoice, monkeypatch):
+    monkeypatch.setenv("TOKEN_GAS_LIMIT_MARGIN_PERCENT", "10")
+    assert fees.token_gas_limit("BSC", "USDT") >= 100000
+    insert_invoice("inv")
+    db.executemany("INSERT INTO invoice_events (invoice_id, chain, event, detail, created_at) VALUES ('inv', 'BSC', 'transfer_mined', ?, ?)",
+        [(str(90000 if i < 10 else 40000 + i), f"2026-01-01T00:{i:02d}:00+00:00") for i in range(60)])
+    db.commit()
+    plan = " ".join(r[3] for r in db.execute(f"EXPLAIN QUERY PLAN {fees.GAS_SAMPLES_QUERY}", ("BSC", 50)).fetchall())
+    assert "idx_invoice_events_event" in plan and "TEMP B-TREE" not in plan
+    fees.load_gas_samples()
+    assert fees.gas_usage_stats() == {"BSC/USDT": {"samples": 50, "max": 40059, "last": 40059}}
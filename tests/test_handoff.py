@@ -0,0 +1,71 @@
+import sys
+import time
+import threading
+import collections
+from app.services import handoff, journal, receipts, webhooks
+
+SUCCESSOR = """
+import os, socket
+sock = socket.socket(fileno=int(os.environ["GHOSTPAY_LISTEN_FD"]))
+if sock.getsockname()[1] == int(os.environ["EXPECT_PORT"]):
+    os.write(int(os.environ["GHOSTPAY_READY_FD"]), b"1")
+"""
+
+def test_successor_inherits_socket_and_signals_ready(monkeypatch):
+    sock = handoff.listen_socket("127.0.0.1", 0)
+    monkeypatch.setenv("EXPECT_PORT", str(sock.getsockname()[1]))
+    proc = handoff.spawn(sock, [sys.executable, "-c", SUCCESSOR])
+    assert proc is not None
+    proc.wait(timeout=10)
+    sock.close()
+
+def test_successor_without_readiness_is_killed(monkeypatch):
+    monkeypatch.setenv("HANDOFF_READY_TIMEOUT_SECONDS", "0.5")
+    sock = handoff.listen_socket("127.0.0.1", 0)
+    assert handoff.spawn(sock, [sys.executable, "-c", "import time; time.sleep(30)"]) is None
+    sock.close()
+
+class FakeServer:
+    def __init__(self):
+        self.accepting = True
+        self.active_channels = {}
+        self.task_dispatcher = type("Dispatcher", (), {"queue": collections.deque()})()
+
+    def pull_trigger(self):
+        pass
+
+def test_drain_waits_for_requests_and_journal_step(monkeypatch):
+    from app.services import sweeper
+    monkeypatch.setenv("HANDOFF_DRAIN_SECONDS", "5")
+    monkeypatch.setattr(receipts, "tracker", receipts.ReceiptTracker(autostart=False))
+    monkeypatch.setattr(webhooks, "dispatcher", webhooks.Dispatcher())
+    server = FakeServer()
+    server.active_channels[1] = type("Channel", (), {"requests": [object()]})()
+    done = threading.Event()
+    def finish_request():
+        time.sleep(0.2)
+        server.active_channels.clear()
+    def sweep_step():
+        with journal.step():
+            time.sleep(0.4)
+            done.set()
+    threading.Thread(target=finish_request).start()
+    threading.Thread(target=sweep_step).start()
+    time.sleep(0.05)
+    try:
+        handoff.drain(server)
+        assert not server.accepting
+        assert not server.active_channels
+        assert done.is_set()
+        assert webhooks.dispatcher.tick() == []
+    finally:
+        journal.release()
+        sweeper._cycle_lock.release()
+
+def test_failed_successor_rolls_back_update(monkeypatch):
+    rolled_back = []
+    monkeypatch.setattr(handoff, "spawn", lambda sock, argv=None: None)
+    monkeypatch.setitem(handoff._state, "server", FakeServer())
+    assert handoff.restart(rollback=lambda: rolled_back.append(True)) is False
+    assert rolled_back == [True]
+    assert not handoff.draining()
@@ -78,3 +78,114 @@ def test_missing_api_key_rejected(client):
 def test_invalid_api_key_rejected(client):
     resp = client.post("/testpay/api/invoice", json={"chain": "BSC", "token": "USDT", "amount_native": "1.00"}, headers={"X-GhostPay-Key": "gp_invalid"})
     assert resp.status_code == 401
+
+def test_get_invoice_etag_not_modified(client, api_key):
+    resp = client.post("/testpay/api/invoice", json={"chain": "BSC", "token": "USDT", "amount_native": "2.00"}, headers={"X-GhostPay-Key": api_key})
+    invoice_id = resp.get_json()["invoice_id"]
+    first = client.get(f"/testpay/api/invoice/{invoice_id}")
+    etag = first.headers["ETag"]
+    assert etag
+    second = client.get(f"/testpay/api/invoice/{invoice_id}", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.data == b""
+
+def test_get_invoice_etag_changes_on_cancel(client, api_key):
+    resp = client.post("/testpay/api/invoice", json={"chain": "BSC", "token": "USDT", "amount_native": "3.00"}, headers={"X-GhostPay-Key": api_key})
+    invoice_id = resp.get_json()["invoice_id"]
+    etag = client.get(f"/testpay/api/invoice/{invoice_id}").headers["ETag"]
+    client.post(f"/testpay/api/invoice/{invoice_id}/cancel", headers={"X-GhostPay-Key": api_key})
+    resp2 = client.get(f"/testpay/api/invoice/{invoice_id}", headers={"If-None-Match": etag})
+    assert resp2.status_code == 200
+    assert resp2.get_json()["status"] == "expired"
+
+def test_pay_page_etag_not_modified(client, api_key):
+    resp = client.post("/testpay/api/invoice", json={"chain": "POLYGON", "token": "USDT", "amount_native": "4.00"}, headers={"X-GhostPay-Key": api_key})
+    invoice_id = resp.get_json()["invoice_id"]
+    page = client.get(f"/testpay/pay/{invoice_id}")
+    assert page.status_code == 200
+    again = client.get(f"/testpay/pay/{invoice_id}", headers={"If-None-Match": page.headers["ETag"]})
+    assert again.status_code == 304
+    api_etag = client.get(f"/testpay/api/invoice/{invoice_id}").headers["ETag"]
+    assert api_etag != page.headers["ETag"]
+
+def test_pay_page_cached_and_compressed(client, api_key):
+    import gzip, re
+    from app.services import assets
+    resp = client.post("/testpay/api/invoice", json={"chain": "BSC", "token": "USDT", "amount_native": "6.00"}, headers={"X-GhostPay-Key": api_key})
+    invoice_id = resp.get_json()["invoice_id"]
+    hits = assets.asset_stats()["page_hits"]
+    plain = client.get(f"/testpay/pay/{invoice_id}")
+    packed = client.get(f"/testpay/pay/{invoice_id}", headers={"Accept-Encoding": "gzip"})
+    assert assets.asset_stats()["page_hits"] == hits + 1
+    assert packed.headers["Content-Encoding"] == "gzip" and "Accept-Encoding" in packed.headers["Vary"]
+    assert gzip.decompress(packed.data) == plain.data
+    script = re.search(r'src="([^"]*js/pay\.js\?v=[0-9a-f]{12})"', plain.get_data(as_text=True)).group(1)
+    asset = client.get(script, headers={"Accept-Encoding": "gzip"})
+    assert asset.headers["Content-Encoding"] == "gzip" and "immutable" in asset.headers["Cache-Control"]
+    assert "immutable" not in client.get("/static/js/pay.js").headers.get("Cache-Control", "")
+
+def test_export_endpoint_streams_csv(client, api_key):
+    client.post("/testpay/api/invoice", json={"chain": "POLYGON", "token": "USDT", "amount_native": "3.00"}, headers={"X-GhostPay-Key": api_key})
+    resp = client.get("/testpay/api/invoices/export?format=csv&chain=POLYGON", headers={"X-GhostPay-Key": api_key})
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/csv"
+    assert "attachment" in resp.headers["Content-Disposition"]
+    lines = resp.get_data(as_text=True).splitlines()
+    assert lines[0].startswith("id,chain,token")
+    assert len(lines) >= 2 and all(",POLYGON," in line for line in lines[1:])
+
+def test_export_requires_api_key(client):
+    assert client.get("/testpay/api/invoices/export").status_code == 401
+
+def test_lookup_by_merchant_ref(client, api_key):
+    from nanoid import generate
+    headers = {"X-GhostPay-Key": api_key}
+    ref, order_id = f"order-{generate(size=10)}", generate("0123456789", 12)
+    explicit = client.post("/testpay/api/invoice", json={"chain": "BSC", "token": "USDT", "amount_native": "1.00", "merchant_ref": ref}, headers=headers).get_json()
+    from_meta = client.post("/testpay/api/invoice", json={"chain": "BSC", "token": "USDT", "amount_native": "2.00", "metadata": {"order_id": int(order_id)}}, headers=headers).get_json()
+    assert explicit["merchant_ref"] == ref and from_meta["merchant_ref"] == str(int(order_id))
+    resp = client.get(f"/testpay/api/invoices/by-ref/{ref}", headers=headers)
+    assert resp.status_code == 200
+    assert [i["id"] for i in resp.get_json()["invoices"]] == [explicit["invoice_id"]]
+    listed = client.get(f"/testpay/api/invoices?merchant_ref={int(order_id)}", headers=headers).get_json()
+    assert listed["total"] == 1 and listed["invoices"][0]["id"] == from_meta["invoice_id"]
+    assert client.get("/testpay/api/invoices/by-ref/nope", headers=headers).status_code == 404
+
+def test_idempotency_key_replays_original_response(client, api_key):
+    body = {"chain": "BSC", "token": "USDT", "amount_native": "3.00"}
+    headers = {"X-GhostPay-Key": api_key, "Idempotency-Key": "order-77-attempt"}
+    first = client.post("/testpay/api/invoice", json=body, headers=headers)
+    second = client.post("/testpay/api/invoice", json=body, headers=headers)
+    assert first.status_code == second.status_code == 201
+    assert second.headers.get("Idempotent-Replayed") == "true"
+    assert second.get_json() == first.get_json()
+    mismatch = client.post("/testpay/api/invoice", json=dict(body, amount_native="4.00"), headers=headers)
+    assert mismatch.status_code == 422
+
+def test_idempotency_key_concurrent_duplicates_create_one_invoice(app, api_key):
+    import threading
+    body = {"chain": "BSC", "token": "USDT", "amount_native": "6.00"}
+    headers = {"X-GhostPay-Key": api_key, "Idempotency-Key": "concurrent-key"}
+    results = []
+    def post():
+        results.append(app.test_client().post("/testpay/api/invoice", json=body, headers=headers))
+    threads = [threading.Thread(target=post) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert [r.status_code for r in results] == [201] * 4
+    assert len({r.get_json()["invoice_id"] for r in results}) == 1
+
+def test_concurrent_creates_get_distinct_deposit_addresses(app, api_key):
+    import threading
+    results = []
+    def post():
+        results.append(app.test_client().post("/testpay/api/invoice", json={"chain": "BSC", "token": "USDT", "amount_native": "1.00"},
+            headers={"X-GhostPay-Key": api_key}).get_json())
+    threads = [threading.Thread(target=post) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len({r["deposit_address"] for r in results}) == 6
@@ -0,0 +1,37 @@
+import pytest
+from app.services import chains
+from app.services.wallet import derive_address
+from app.loadtest.fakechain import FakeChain
+
+MNEMONIC = "abandon abandon abandon abandon abandon abandon abandon abandon abandon abandon abandon about"
+MAIN = "0x000000000000000000000000000000000000dEaD"
+
+@pytest.fixture
+def fake_chain(monkeypatch):
+    chain = FakeChain("BSC", block_time=0.05)
+    monkeypatch.setenv("BSC_RPC_URL", chain.start())
+    monkeypatch.setenv("RECEIPT_POLL_SECONDS", "0.05")
+    chains.clear_rpc_cache()
+    yield chain
+    chain.stop()
+    chains.clear_rpc_cache()
+
+def test_fake_chain_mines_signed_transfers(fake_chain):
+    address, privkey = derive_address(MNEMONIC, 1)
+    fake_chain.credit(address, 10**18)
+    fake_chain.credit(address, 5 * 10**18, token=True)
+    assert chains.get_native_balance("BSC", address) == 10**18
+    assert chains.get_token_balance("BSC", address, "USDT") == 5 * 10**18
+    native = chains.send_native("BSC", privkey, MAIN, 10**17, gas_price=10**9, nonce=0)
+    token = chains.send_token("BSC", privkey, "USDT", MAIN, 2 * 10**18, gas_price=10**9, nonce=1)
+    assert chains.wait_for_receipt("BSC", native, timeout=5)["status"] == 1
+    assert chains.wait_for_receipt("BSC", token, timeout=5)["gasUsed"] == fake_chain.token_gas
+    assert fake_chain.balance(MAIN) == 10**17
+    assert fake_chain.balance(MAIN, token=True) == 2 * 10**18
+    assert chains.get_nonce("BSC", address) == 2
+
+def test_fake_chain_reverts_overdrawn_token_transfer(fake_chain):
+    address, privkey = derive_address(MNEMONIC, 2)
+    tx = chains.send_token("BSC", privkey, "USDT", MAIN, 10**18, gas_price=10**9, nonce=0)
+    assert chains.wait_for_receipt("BSC", tx, timeout=5)["status"] == 0
+    assert fake_chain.balance(MAIN, token=True) == 0
@@ -0,0 +1,50 @@
+import pytest
+from app.services.receipts import ReceiptTracker
+
+def test_pending_hashes_resolved_in_one_batch_per_chain():
+    calls = []
+    mined = {"0xa": {"gasUsed": 21000}, "0xc": {"gasUsed": 50000}}
+    def fetch(chain, hashes):
+        calls.append((chain, list(hashes)))
+        return [mined.get(h) for h in hashes]
+    tracker = ReceiptTracker(fetch, autostart=False)
+    a, b, c = tracker.track("BSC", "0xa"), tracker.track("BSC", "0xb"), tracker.track("POLYGON", "0xc")
+    tracker.tick()
+    assert sorted(calls) == [("BSC", ["0xa", "0xb"]), ("POLYGON", ["0xc"])]
+    assert a.result(timeout=0)["gasUsed"] == 21000 and c.result(timeout=0)["gasUsed"] == 50000
+    assert not b.done()
+    assert tracker.snapshot()["pending"] == 1
+
+def test_stuck_transaction_rebroadcast_with_higher_gas(monkeypatch):
+    monkeypatch.setenv("RECEIPT_STUCK_SECONDS", "0")
+    monkeypatch.setenv("RECEIPT_BUMP_PERCENT", "25")
+    mined = {}
+    factors = []
+    def rebroadcast(factor):
+        factors.append(factor)
+        return "0xreplacement"
+    tracker = ReceiptTracker(lambda chain, hashes: [mined.get(h) for h in hashes], autostart=False)
+    future = tracker.track("BSC", "0xslow", rebroadcast)
+    tracker.tick()
+    assert factors == [1.25]
+    mined["0xreplacement"] = {"gasUsed": 21000, "transactionHash": "0xreplacement"}
+    tracker.tick()
+    assert future.result(timeout=0)["transactionHash"] == "0xreplacement"
+    assert tracker.snapshot()["rebroadcasts"] == 1
+
+def test_unmined_transaction_times_out():
+    tracker = ReceiptTracker(lambda chain, hashes: [None for h in hashes], autostart=False)
+    future = tracker.track("BSC", "0xlost", timeout=-1)
+    tracker.tick()
+    with pytest.raises(TimeoutError):
+        future.result(timeout=0)
+
+def test_failing_lookup_still_times_out():
+    def fetch(chain, hashes):
+        raise ConnectionError("rpc down")
+    tracker = ReceiptTracker(fetch, autostart=False)
+    lost, waiting = tracker.track("BSC", "0xlost", timeout=-1), tracker.track("BSC", "0xwaiting")
+    tracker.tick()
+    with pytest.raises(TimeoutError):
+        lost.result(timeout=0)
+    assert not waiting.done() and tracker.snapshot()["timeouts"] == 1
@@ -0,0 +1,55 @@
+import pytest
+from datetime import datetime, timezone, timedelta
+from app.services import recycler, storage, chains
+from app.services.events import record_event
+from app.routes.api import _insert_invoice
+
+@pytest.fixture(autouse=True)
+def recycling(monkeypatch):
+    monkeypatch.setenv("ADDRESS_RECYCLING", "true")
+    monkeypatch.setenv("ADDRESS_RECYCLE_COOLDOWN_HOURS", "24")
+
+def _expired(insert_invoice, invoice_id, hd_index, hours_ago=48, status="expired"):
+    insert_invoice(invoice_id, hd_index, status=status, age=timedelta(hours=hours_ago))
+
+def _chain(monkeypatch, balances=None, nonces=None, tokens=None):
+    monkeypatch.setattr(chains, "get_native_balance", lambda chain, address, max_age=0: (balances or {}).get((chain, address), 0))
+    monkeypatch.setattr(chains, "get_token_balance", lambda chain, address, token: (tokens or {}).get((chain, address), 0))
+    monkeypatch.setattr(chains, "get_nonce", lambda chain, address: (nonces or {}).get((chain, address), 0))
+
+def _lease(invoice_id):
+    now = datetime.now(timezone.utc).isoformat()
+    return storage.write(_insert_invoice, "abandon " * 11 + "about", invoice_id, "BSC", "USDT", "1", "1", None, "", None, None, now, now)
+
+def test_recycles_only_untouched_addresses_after_cooldown(db, insert_invoice, monkeypatch):
+    _expired(insert_invoice, "clean", 1)
+    _expired(insert_invoice, "recent", 2, hours_ago=1)
+    _expired(insert_invoice, "paid", 3)
+    record_event(db, "paid", "BSC", "detected")
+    _expired(insert_invoice, "late", 4)
+    _expired(insert_invoice, "done", 5, status="completed")
+    _chain(monkeypatch, nonces={("POLYGON", f"0x{4:040x}"): 1})
+    assert recycler.recycle_addresses() == 1
+    assert recycler.pool_stats() == {"enabled": True, "available": 1, "leased": 0, "dirty": 1}
+    assert db.execute("SELECT chain FROM invoice_events WHERE invoice_id='late' AND event='late_payment'").fetchone()[0] == "POLYGON"
+    assert recycler.recycle_addresses() == 0
+
+def test_late_payment_during_cooldown_retires_address(db, insert_invoice, monkeypatch):
+    _expired(insert_invoice, "cooling", 11, hours_ago=1)
+    _expired(insert_invoice, "quiet", 12, hours_ago=1)
+    _chain(monkeypatch, tokens={("BSC", f"0x{11:040x}"): 10 ** 18})
+    assert recycler.recycle_addresses() == 0
+    assert recycler.pool_stats()["dirty"] == 1
+    assert [r[0] for r in db.execute("SELECT invoice_id FROM invoice_events WHERE event='late_payment'")] == ["cooling"]
+    recycler.recycle_addresses()
+    assert recycler.pool_stats()["dirty"] == 1
+
+def test_create_draws_from_pool_first(db, insert_invoice, monkeypatch):
+    _expired(insert_invoice, "old", 7)
+    _chain(monkeypatch)
+    recycler.recycle_addresses()
+    assert _lease("reuse") == f"0x{7:040x}"
+    assert _lease("fresh") != f"0x{7:040x}"
+    assert [r[0] for r in db.execute("SELECT hd_index FROM invoices WHERE id IN ('reuse','fresh') ORDER BY hd_index")] == [7, 8]
+    assert recycler.pool_stats()["leased"] == 1
+    assert recycler.recycle_addresses() == 0
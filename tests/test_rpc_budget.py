@@ -0,0 +1,55 @@
+import time
+import threading
+import pytest
+from app.services import rpc_budget
+
+@pytest.fixture(autouse=True)
+def budget(monkeypatch):
+    monkeypatch.setenv("RPC_BUDGET_PER_SECOND", "10")
+    monkeypatch.setenv("RPC_BUDGET_BURST_SECONDS", "0.2")
+    monkeypatch.setenv("RPC_BUDGET_RESERVE_PERCENT", "50")
+    monkeypatch.setenv("RPC_BUDGET_MAX_WAIT_SECONDS", "0.3")
+    rpc_budget._budgets.clear()
+    yield
+    rpc_budget._budgets.clear()
+
+def test_unlimited_without_budget(monkeypatch):
+    monkeypatch.setenv("RPC_BUDGET_PER_SECOND", "0")
+    for _ in range(100):
+        rpc_budget.acquire("BSC", name="admin")
+    assert rpc_budget.budget_stats()["BSC"]["classes"]["admin"]["granted"] == 100
+
+def test_admin_reads_shed_before_budget_runs_low():
+    rpc_budget.acquire("BSC", name="detect")
+    with pytest.raises(rpc_budget.RPCBudgetExceeded):
+        rpc_budget.acquire("BSC", name="admin")
+    rpc_budget.acquire("BSC", name="critical")
+    assert rpc_budget.budget_stats()["BSC"]["classes"]["admin"]["shed"] == 1
+
+def test_critical_calls_jump_queued_detection():
+    rpc_budget.acquire("BSC", cost=2, name="critical")
+    order = []
+    def call(name):
+        with rpc_budget.priority(name):
+            rpc_budget.acquire("BSC")
+        order.append(name)
+    detect = threading.Thread(target=call, args=("detect",))
+    detect.start()
+    time.sleep(0.02)
+    critical = threading.Thread(target=call, args=("critical",))
+    critical.start()
+    detect.join(2)
+    critical.join(2)
+    assert order == ["critical", "detect"]
+
+def test_detection_shed_after_max_wait():
+    rpc_budget.acquire("BSC", cost=2, name="critical")
+    waiters = [threading.Thread(target=rpc_budget.acquire, args=("BSC", 1, "critical")) for _ in range(5)]
+    for t in waiters:
+        t.start()
+    time.sleep(0.02)
+    with pytest.raises(rpc_budget.RPCBudgetExceeded):
+        rpc_budget.acquire("BSC", name="detect")
+    for t in waiters:
+        t.join(2)
+    assert rpc_budget.budget_stats()["BSC"]["classes"]["critical"]["granted"] == 6
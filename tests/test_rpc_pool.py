@@ -0,0 +1,88 @@
+import time
+import pytest
+from app.services.rpc_pool import EndpointPool
+
+class FakeProvider:
+    def __init__(self, delay=0.0, fail=False, error=None):
+        self.delay = delay
+        self.fail = fail
+        self.error = error
+        self.calls = []
+
+    def make_request(self, method, params):
+        self.calls.append(method)
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("boom")
+        if self.error:
+            return {"jsonrpc": "2.0", "id": 1, "error": self.error}
+        return {"jsonrpc": "2.0", "id": 1, "result": self.delay}
+
+    def make_batch_request(self, requests):
+        return [self.make_request(method, params) for method, params in requests]
+
+def _pool(*providers):
+    pool = EndpointPool("BSC", [f"http://node{i}" for i in range(len(providers))])
+    for endpoint, provider in zip(pool.endpoints, providers):
+        endpoint.provider = provider
+    return pool
+
+def test_slow_read_is_hedged_to_second_endpoint(monkeypatch):
+    monkeypatch.setenv("RPC_HEDGE_DEFAULT_MS", "50")
+    monkeypatch.setenv("RPC_HEDGE_MIN_MS", "10")
+    slow, fast = FakeProvider(delay=1.0), FakeProvider()
+    pool = _pool(slow, fast)
+    start = time.monotonic()
+    assert pool.make_request("eth_blockNumber", [])["result"] == 0.0
+    assert time.monotonic() - start < 0.5
+    assert pool.hedged == 1
+    assert fast.calls == ["eth_blockNumber"]
+
+def test_failing_endpoint_is_ejected(monkeypatch):
+    monkeypatch.setenv("RPC_BREAKER_FAILURES", "2")
+    bad, good = FakeProvider(fail=True), FakeProvider(delay=0.01)
+    pool = _pool(bad, good)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            pool._call(pool.endpoints[0], lambda p: p.make_request("eth_blockNumber", []))
+    assert pool.endpoints[0].state() == "open"
+    assert pool.ranked() == [pool.endpoints[1]]
+    assert pool.make_request("eth_blockNumber", [])["result"] == 0.01
+    assert len(bad.calls) == 2
+    stats = pool.stats()["endpoints"][0]
+    assert stats["errors"] == 2 and stats["state"] == "open"
+
+def test_failed_read_fails_over_and_demotes_endpoint():
+    bad, good = FakeProvider(fail=True), FakeProvider()
+    pool = _pool(bad, good)
+    assert pool.make_request("eth_blockNumber", [])["result"] == 0.0
+    assert pool.ranked()[0] is pool.endpoints[1]
+
+def test_writes_go_to_lowest_latency_endpoint_without_hedging():
+    a, b = FakeProvider(), FakeProvider()
+    pool = _pool(a, b)
+    pool.endpoints[0].ewma = 0.2
+    pool.endpoints[1].ewma = 0.05
+    pool.make_request("eth_sendRawTransaction", ["0x00"])
+    assert b.calls == ["eth_sendRawTransaction"] and a.calls == []
+
+def test_all_endpoints_failing_raises():
+    pool = _pool(FakeProvider(fail=True), FakeProvider(fail=True))
+    with pytest.raises(ConnectionError):
+        pool.make_request("eth_blockNumber", [])
+
+def test_rate_limit_error_body_counts_as_failure(monkeypatch):
+    monkeypatch.setenv("RPC_BREAKER_FAILURES", "1")
+    limited, good = FakeProvider(error={"code": -32005, "message": "limit exceeded"}), FakeProvider(delay=0.01)
+    pool = _pool(limited, good)
+    assert pool.make_batch_request([("eth_blockNumber", []), ("eth_gasPrice", [])])[0]["result"] == 0.01
+    assert pool.endpoints[0].state() == "open" and pool.endpoints[0].ewma is None
+
+def test_error_from_every_endpoint_is_returned_to_web3():
+    pool = _pool(FakeProvider(error={"code": -32005, "message": "limit exceeded"}), FakeProvider(error={"code": -32603, "message": "internal"}))
+    assert "error" in pool.make_request("eth_blockNumber", [])
+
+def test_execution_revert_is_not_an_endpoint_failure():
+    pool = _pool(FakeProvider(error={"code": 3, "message": "execution reverted"}), FakeProvider())
+    assert pool.make_request("eth_call", [{}])["error"]["code"] == 3
+    assert pool.endpoints[0].failures == 0
@@ -0,0 +1,36 @@
+import os
+from app.db import init_db
+init_db()
+from app import create_app
+from app.services import runtime, admission, invoices
+
+def test_apply_notifies_only_matching_listeners(monkeypatch):
+    monkeypatch.setenv("GAS_BUFFER_PERCENT", "60")
+    monkeypatch.setenv("RECEIPT_MAX_BUMPS", "2")
+    seen = []
+    runtime.subscribe("test-gas", ("GAS_BUFFER_PERCENT",), seen.append)
+    try:
+        assert runtime.apply({"RECEIPT_MAX_BUMPS": "3"}) == {"RECEIPT_MAX_BUMPS": "3"}
+        assert runtime.apply({"GAS_BUFFER_PERCENT": 60}) == {}
+        runtime.apply({"GAS_BUFFER_PERCENT": 80})
+    finally:
+        runtime._listeners.pop("test-gas")
+    assert seen == [{"GAS_BUFFER_PERCENT": "80"}]
+    assert runtime.get_int("GAS_BUFFER_PERCENT") == 80 and os.environ["RECEIPT_MAX_BUMPS"] == "3"
+
+def test_tuning_applies_live(monkeypatch, tmp_path):
+    monkeypatch.setenv("ENV_PATH", str(tmp_path / ".env"))
+    for key in ("WAITRESS_THREADS", "ADMISSION_PUBLIC_CONCURRENCY", "INVOICE_TTL_MINUTES", "INVOICE_CACHE_OPEN_TTL"):
+        monkeypatch.setenv(key, os.getenv(key, ""))
+    app = create_app()
+    invoices._cache["x"] = (0, {}, "etag")
+    try:
+        runtime.save({"WAITRESS_THREADS": "16", "ADMISSION_PUBLIC_CONCURRENCY": "0", "INVOICE_TTL_MINUTES": "45",
+            "INVOICE_CACHE_OPEN_TTL": "2"})
+        assert admission._lanes["public"].limit == 8
+        assert app.config["INVOICE_TTL_MINUTES"] == 45 and app.config["WAITRESS_THREADS"] == 16
+        assert "x" not in invoices._cache
+        assert "WAITRESS_THREADS=16" in open(tmp_path / ".env").read()
+    finally:
+        monkeypatch.undo()
+        admission.configure()
@@ -0,0 +1,36 @@
+from datetime import timedelta
+from app.services.archiver import archive_invoices
+from app.services.search import search_invoices, rebuild_search_index
+
+def _ids(db, query, **kwargs):
+    return [r["id"] for r in search_invoices(db, query, **kwargs)[0]]
+
+def test_triggers_keep_index_in_sync(db, insert_invoice):
+    insert_invoice("inv-a", 1, metadata={"order_id": "A-9001", "email": "alice@example.com"})
+    insert_invoice("inv-b", 2, merchant_ref="shop-77")
+    insert_invoice("inv-old", 3, age=timedelta(days=40), status="completed")
+    assert _ids(db, "A-9001") == ["inv-a"]
+    assert _ids(db, "alice") == ["inv-a"]
+    assert _ids(db, "shop-77") == ["inv-b"]
+    assert _ids(db, f"0x{2:040x}".upper()) == ["inv-b"]
+    db.execute("UPDATE invoices SET tx_in_hash='0xfeedbeef01', tx_out_hash='0xc0ffee02' WHERE id='inv-b'")
+    db.commit()
+    assert _ids(db, "0xc0ffee") == ["inv-b"]
+    assert archive_invoices(older_than_days=30) == 1
+    assert search_invoices(db, "inv-old")[0][0]["status"] == "completed"
+    db.execute("DELETE FROM invoices WHERE id='inv-a'")
+    db.commit()
+    assert _ids(db, "alice") == [] and _ids(db, "0x") == []
+
+def test_ranked_and_paginated(db, insert_invoice):
+    for i in range(5):
+        insert_invoice(f"inv-{i}", 10 + i, metadata={"note": "refund batch"})
+    insert_invoice("refund-x", 20)
+    assert _ids(db, "refund")[0] == "refund-x"
+    first, more = search_invoices(db, "batch", per_page=3)
+    second, last = search_invoices(db, "batch", page=2, per_page=3)
+    assert more and not last
+    assert sorted(r["id"] for r in first + second) == [f"inv-{i}" for i in range(5)]
+    db.execute("DELETE FROM invoice_search")
+    rebuild_search_index(db)
+    assert len(_ids(db, "batch")) == 5
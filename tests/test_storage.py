@@ -0,0 +1,40 @@
+import sqlite3
+import threading
+import pytest
+from app.services import storage
+
+@pytest.fixture
+def db_path(db_path, monkeypatch):
+    monkeypatch.setenv("DB_WRITER_LINGER_MS", "50")
+    storage.flush()
+    return db_path
+
+def _insert(db, key_id):
+    db.execute("INSERT INTO api_keys (id, label, key_hash, key_prefix, created_at) VALUES (?, 'k', ?, 'gp_', 'now')", (key_id, key_id))
+    return key_id
+
+def test_concurrent_writes_share_one_commit(db_path):
+    batches = storage._stats["batches"]
+    gate = threading.Event()
+    storage.submit(lambda db: gate.wait(5))
+    futures = [storage.submit(_insert, f"k{i}") for i in range(20)]
+    gate.set()
+    assert [f.result(5) for f in futures] == [f"k{i}" for i in range(20)]
+    assert storage._stats["batches"] - batches <= 2
+    with storage.reader() as db:
+        assert db.execute("SELECT COUNT(*) FROM api_keys").fetchone()[0] == 20
+
+def test_failed_op_does_not_roll_back_its_batch(db_path):
+    ok = storage.submit(_insert, "a")
+    dup = storage.submit(_insert, "a")
+    other = storage.submit(_insert, "b")
+    assert ok.result(5) == "a" and other.result(5) == "b"
+    with pytest.raises(sqlite3.IntegrityError):
+        dup.result(5)
+    with storage.reader() as db:
+        assert db.execute("SELECT COUNT(*) FROM api_keys").fetchone()[0] == 2
+
+def test_readers_are_read_only(db_path):
+    with storage.reader() as db:
+        with pytest.raises(sqlite3.OperationalError):
+            db.execute("DELETE FROM api_keys")
@@ -0,0 +1,102 @@
+import json
+import queue
+import threading
+import pytest
+from websockets.sync.server import serve
+from app.services import subscriber
+
+DEPOSIT = "0x00000000000000000000000000000000000000aa"
+
+class FakeNode:
+    def __init__(self):
+        self.calls = []
+        self.connections = 0
+        self.server = serve(self._handle, "127.0.0.1", 0)
+        self.url = "ws://127.0.0.1:%d" % self.server.socket.getsockname()[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def _handle(self, ws):
+        self.connections += 1
+        first = self.connections == 1
+        for raw in ws:
+            msg = json.loads(raw)
+            self.calls.append((msg["method"], msg["params"]))
+            if msg["method"] == "eth_subscribe":
+                sub_id = "0x%s" % msg["params"][0]
+                ws.send(json.dumps({"jsonrpc": "2.0", "id": msg["id"], "result": sub_id}))
+                if first and msg["params"][0] == "logs":
+                    ws.send(json.dumps({"jsonrpc": "2.0", "method": "eth_subscription", "params": {"subscription": "0xnewHeads",
+                        "result": {"number": "0x10"}}}))
+                    ws.send(json.dumps({"jsonrpc": "2.0", "method": "eth_subscription", "params": {"subscription": "0xlogs",
+                        "result": {"blockNumber": "0x10", "topics": [subscriber.TRANSFER_TOPIC, "0x" + "0" * 64, subscriber._topic_for(DEPOSIT)]}}}))
+                    ws.close()
+                    return
+            elif msg["method"] == "eth_getLogs":
+                ws.send(json.dumps({"jsonrpc": "2.0", "id": msg["id"], "result": [
+                    {"blockNumber": "0x12", "topics": [subscriber.TRANSFER_TOPIC, "0x" + "0" * 64, subscriber._topic_for(DEPOSIT)]}]}))
+            else:
+                ws.send(json.dumps({"jsonrpc": "2.0", "id": msg["id"], "result": True}))
+
+@pytest.fixture
+def node(monkeypatch):
+    monkeypatch.setattr(subscriber, "open_invoices", lambda chain: ({DEPOSIT: ["inv-usdt"]}, ["inv-bnb"]))
+    monkeypatch.setenv("POLL_INTERVAL_SECONDS", "0")
+    node = FakeNode()
+    yield node
+    node.server.shutdown()
+
+def _collect(node, count):
+    checks = queue.Queue()
+    states = []
+    sub = subscriber.ChainSubscriber("BSC", node.url, on_check=lambda chain, ids: checks.put(set(ids)), max_backoff=1)
+    sub.on_state = lambda: states.append(sub.connected)
+    sub.start()
+    seen = [checks.get(timeout=10) for _ in range(count)]
+    sub.stop()
+    sub.join(timeout=5)
+    return sub, seen, states
+
+def test_transfer_log_triggers_check_for_deposit_invoice(node):
+    sub, seen, _ = _collect(node, 3)
+    assert "inv-usdt" in set().union(*seen)
+    logs_sub = next(params for method, params in node.calls if method == "eth_subscribe" and params[0] == "logs")
+    assert logs_sub[1]["topics"][2] == [subscriber._topic_for(DEPOSIT)]
+
+def test_reconnect_backfills_from_last_seen_block(node):
+    sub, seen, states = _collect(node, 4)
+    backfill = next(params for method, params in node.calls if method == "eth_getLogs")
+    assert backfill[0]["fromBlock"] == "0x11"
+    assert node.connections >= 2
+    assert False in states and True in states
+    assert sub.last_block == 0x12
+
+def test_native_checks_on_head_are_throttled_to_poll_interval(monkeypatch):
+    monkeypatch.setenv("POLL_INTERVAL_SECONDS", "20")
+    sub = subscriber.ChainSubscriber("BSC", "ws://unused")
+    assert sub._native_due()
+    assert not sub._native_due()
+    monkeypatch.setenv("WS_CHECK_NATIVE_ON_HEAD", "false")
+    sub._native_checked = 0.0
+    assert not sub._native_due()
+
+def test_head_triggered_drain_does_not_sweep(monkeypatch):
+    from app.services import monitor
+    calls = []
+    monkeypatch.setattr(monitor, "poll_invoices", lambda ids=None, sweep=True: calls.append((ids, sweep)))
+    with subscriber._pending_lock:
+        subscriber._pending["BSC"] = {"inv-bnb"}
+    subscriber._drain("BSC")
+    assert calls == [(["inv-bnb"], False)]
+
+def test_poll_interval_relaxed_only_when_every_chain_subscribed(monkeypatch):
+    from types import SimpleNamespace
+    from app.services import monitor
+    intervals = []
+    monkeypatch.setattr(monitor, "set_poll_interval", intervals.append)
+    monkeypatch.setenv("POLL_INTERVAL_SECONDS", "20")
+    monkeypatch.setenv("WS_POLL_INTERVAL_SECONDS", "120")
+    monkeypatch.setattr(subscriber, "_subscribers", {"BSC": SimpleNamespace(connected=True)})
+    subscriber._on_state_change()
+    subscriber._subscribers["POLYGON"] = SimpleNamespace(connected=True)
+    subscriber._on_state_change()
+    assert intervals == [20, 120]
@@ -0,0 +1,191 @@
+from concurrent.futures import Future
+from datetime import datetime, timezone, timedelta
+from app.db import open_db
+from app.services import sweeper
+from app.services import fees, chains, journal, wallet
+from app.services import receipts as receipts_module
+from app.services.fees import Fees
+
+GWEI = 10**9
+
+def _invoice(invoice_id, token, hd_index, status="confirming", held_minutes=0):
+    confirmed = (datetime.now(timezone.utc) - timedelta(minutes=held_minutes)).isoformat()
+    return {"id": invoice_id, "chain": "BSC", "token": token, "hd_index": hd_index, "status": status,
+        "deposit_address": f"0xdep{hd_index}", "confirmed_at": confirmed, "created_at": confirmed, "webhook_url": None}
+
+def _insert(insert_invoice, inv):
+    insert_invoice(inv["id"], **{k: v for k, v in inv.items() if k != "id"})
+
+def test_sweep_due_without_ceiling(monkeypatch):
+    monkeypatch.delenv("BSC_SWEEP_MAX_GAS_GWEI", raising=False)
+    assert sweeper.is_sweep_due(_invoice("a", "USDT", 1), 50 * GWEI)
+
+def test_sweep_held_above_ceiling(monkeypatch):
+    monkeypatch.setenv("BSC_SWEEP_MAX_GAS_GWEI", "3")
+    monkeypatch.setenv("SWEEP_MAX_DELAY_MINUTES", "60")
+    assert not sweeper.is_sweep_due(_invoice("a", "USDT", 1), 5 * GWEI)
+    assert sweeper.is_sweep_due(_invoice("a", "USDT", 1), 2 * GWEI)
+
+def test_sweep_released_after_max_delay(monkeypatch):
+    monkeypatch.setenv("BSC_SWEEP_MAX_GAS_GWEI", "3")
+    monkeypatch.setenv("SWEEP_MAX_DELAY_MINUTES", "60")
+    assert sweeper.is_sweep_due(_invoice("a", "USDT", 1, held_minutes=61), 5 * GWEI)
+
+def _fake_chain(monkeypatch, receipts=None):
+    sent = []
+    def fake_sign_native(chain, privkey, to, value, nonce, gas_price=None, fees=None):
+        sent.append(("native", to, nonce))
+        return f"0xrawnative{len(sent)}", f"0xnative{len(sent)}"
+    def fake_sign_token(chain, privkey, token, to, amount, nonce, gas_price=None, fees=None):
+        sent.append(("token", to, nonce))
+        return f"0xrawtoken{len(sent)}", f"0xtoken{len(sent)}"
+    def fake_broadcast(chain, raw_tx):
+        sent.append(("broadcast", raw_tx))
+        return raw_tx.replace("raw", "")
+    def fake_track(chain, tx_hash, rebroadcast=None):
+        future = Future()
+        future.set_result({"transactionHash": tx_hash, "gasUsed": 21000, "effectiveGasPrice": GWEI})
+        return future
+    monkeypatch.setattr(fees, "_gas_samples", {})
+    monkeypatch.setattr(wallet, "get_fee_address", lambda mnemonic=None, chain=None: ("0xfee", "0x01"))
+    monkeypatch.setattr(wallet, "derive_address", lambda mnemonic, index: (f"0xdep{index}", "0x02"))
+    monkeypatch.setattr(chains, "get_native_balance", lambda chain, address: 0)
+    monkeypatch.setattr(chains, "get_token_balance", lambda chain, address, token: 10**18)
+    monkeypatch.setattr(chains, "get_nonce", lambda chain, address: 7)
+    monkeypatch.setattr(chains, "sign_native", fake_sign_native)
+    monkeypatch.setattr(chains, "sign_token", fake_sign_token)
+    monkeypatch.setattr(chains, "broadcast", fake_broadcast)
+    monkeypatch.setattr(chains, "get_receipts", lambda chain, hashes: [(receipts or {}).get(h) for h in hashes])
+    monkeypatch.setattr(receipts_module, "track", fake_track)
+    return sent
+
+def test_token_batch_pipelines_top_ups(db_path, insert_invoice, monkeypatch):
+    sent = _fake_chain(monkeypatch)
+    invoices = [_invoice("b", "USDT", 2), _invoice("a", "USDT", 1)]
+    for inv in invoices:
+        _insert(insert_invoice, inv)
+    sweeper.sweep_batch("BSC", invoices, Fees(gas_price=GWEI))
+    top_ups = [s for s in sent if s[0] == "native"]
+    assert top_ups == [("native", "0xdep1", 7), ("native", "0xdep2", 8)]
+    assert len([s for s in sent if s[0] == "token"]) == 2
+    db = open_db(db_path)
+    rows = db.execute("SELECT status, gas_expected_wei, gas_spent_wei FROM invoices").fetchall()
+    db.close()
+    assert all(r["status"] == "completed" for r in rows)
+    assert all(r["gas_spent_wei"] == 2 * 21000 * GWEI for r in rows)
+    assert all(r["gas_expected_wei"] == (fees.DEFAULT_TOKEN_GAS + 21000) * GWEI for r in rows)
+    db = open_db(db_path)
+    events = [r[0] for r in db.execute("SELECT event FROM invoice_events WHERE invoice_id='a' ORDER BY id").fetchall()]
+    db.close()
+    assert events == ["confirmed", "gas_topup_sent", "gas_topup_mined", "transfer_sent", "transfer_mined"]
+    db = open_db(db_path)
+    journaled = db.execute("SELECT kind, state FROM sweep_journal WHERE invoice_id='a' ORDER BY id").fetchall()
+    db.close()
+    assert [tuple(r) for r in journaled] == [("gas_topup", "mined"), ("transfer", "mined")]
+    fees._gas_samples.clear()
+    fees.load_gas_samples()
+    assert list(fees._gas_samples[("BSC", "USDT")]) == [21000, 21000]
+
+def _journal_transfer(db_path, inv, state="broadcast"):
+    journal.record_signed(inv["id"], "BSC", "transfer", inv["deposit_address"], 3, "0xrawjournaled", "0xjournaled")
+    if state != "signed":
+        journal.mark("0xjournaled", state)
+
+def test_resume_rebroadcasts_journaled_transfer(db_path, insert_invoice, monkeypatch):
+    sent = _fake_chain(monkeypatch)
+    inv = _invoice("a", "BNB", 1, status="sweeping")
+    _insert(insert_invoice, inv)
+    _journal_transfer(db_path, inv, state="signed")
+    sweeper.sweep_batch("BSC", [inv], Fees(gas_price=GWEI))
+    assert sent == [("broadcast", "0xrawjournaled")]
+    db = open_db(db_path)
+    row = db.execute("SELECT status, tx_out_hash FROM invoices WHERE id='a'").fetchone()
+    state = db.execute("SELECT state FROM sweep_journal WHERE tx_hash='0xjournaled'").fetchone()[0]
+    db.close()
+    assert tuple(row) == ("completed", "0xjournaled")
+    assert state == "mined"
+
+def test_resume_skips_mined_token_transfer(db_path, insert_invoice, monkeypatch):
+    sent = _fake_chain(monkeypatch, receipts={"0xjournaled": {"transactionHash": "0xjournaled", "gasUsed": 52000,
+        "effectiveGasPrice": GWEI, "blockNumber": 9}})
+    inv = _invoice("a", "USDT", 1, status="sweeping")
+    _insert(insert_invoice, inv)
+    _journal_transfer(db_path, inv)
+    sweeper.sweep_batch("BSC", [inv], Fees(gas_price=GWEI))
+    assert sent == []
+    db = open_db(db_path)
+    row = db.execute("SELECT status, tx_out_hash FROM invoices WHERE id='a'").fetchone()
+    db.close()
+    assert tuple(row) == ("completed", "0xjournaled")
+
+def test_resumed_transfer_can_be_fee_bumped(db_path, insert_invoice, monkeypatch):
+    sent = _fake_chain(monkeypatch)
+    resenders = []
+    def capture_track(chain, tx_hash, rebroadcast=None):
+        resenders.append(rebroadcast)
+        future = Future()
+        future.set_result({"transactionHash": tx_hash, "gasUsed": 21000})
+        return future
+    monkeypatch.setattr(receipts_module, "track", capture_track)
+    inv = _invoice("a", "BNB", 1, status="sweeping")
+    _insert(insert_invoice, inv)
+    _journal_transfer(db_path, inv)
+    from app.services.events import record
+    record("a", "BSC", "transfer_sent", tx_hash="0xjournaled", detail="500")
+    signed = []
+    monkeypatch.setattr(chains, "sign_native", lambda chain, privkey, to, value, nonce, gas_price=None, fees=None:
+        signed.append((to, value, nonce, fees.gas_price)) or ("0xrawbumped", "0xbumped"))
+    sweeper.sweep_batch("BSC", [inv], Fees(gas_price=GWEI))
+    assert resenders[0](1.5) == "0xbumped"
+    assert signed == [("0x0000000000000000000000000000000000000001", 500, 3, int(1.5 * GWEI))]
+    assert [r["tx_hash"] for r in journal.entries("a", "transfer")] == ["0xjournaled", "0xbumped"]
+
+def test_reverted_transfer_fails_invoice(db_path, insert_invoice, monkeypatch):
+    _fake_chain(monkeypatch, receipts={"0xjournaled": {"transactionHash": "0xjournaled", "gasUsed": 52000,
+        "effectiveGasPrice": GWEI, "blockNumber": 9, "status": 0}})
+    inv = _invoice("a", "USDT", 1, status="sweeping")
+    _insert(insert_invoice, inv)
+    _journal_transfer(db_path, inv)
+    sweeper.sweep_batch("BSC", [inv], Fees(gas_price=GWEI))
+    db = open_db(db_path)
+    status = db.execute("SELECT status FROM invoices WHERE id='a'").fetchone()[0]
+    events = [r[0] for r in db.execute("SELECT event FROM invoice_events WHERE invoice_id='a' ORDER BY id").fetchall()]
+    db.close()
+    assert status == "failed"
+    assert "sweep_reverted" in events and "transfer_mined" not in events
+
+def test_detection_does_not_wait_for_running_sweep(db_path, insert_invoice, monkeypatch):
+    from app.services import monitor
+    insert_invoice("a", 1, token="BNB", deposit_address="0xdep1", expires_in=timedelta(minutes=30))
+    monkeypatch.setattr(chains, "get_native_balance", lambda chain, address: 2 * 10**18)
+    monkeypatch.setattr(chains, "get_block_number", lambda chain: 100)
+    sweeper._wake.clear()
+    with sweeper._cycle_lock:
+        start = datetime.now(timezone.utc)
+        monitor.poll_invoices()
+        assert datetime.now(timezone.utc) - start < timedelta(seconds=2)
+    assert sweeper._wake.is_set()
+    db = open_db(db_path)
+    assert db.execute("SELECT status FROM invoices WHERE id='a'").fetchone()[0] == "confirming"
+    db.close()
+
+def test_token_sweep_refunds_leftover_gas(db_path, insert_invoice, monkeypatch):
+    sent = _fake_chain(monkeypatch)
+    monkeypatch.setattr(chains, "get_native_balance", lambda chain, address: 10**18)
+    inv = _invoice("a", "USDT", 1)
+    _insert(insert_invoice, inv)
+    sweeper.sweep_batch("BSC", [inv], Fees(gas_price=GWEI))
+    assert [s[0] for s in sent if s[0] != "broadcast"] == ["token", "native"]
+    db = open_db(db_path)
+    events = [tuple(r) for r in db.execute("SELECT event, tx_hash FROM invoice_events WHERE invoice_id='a' AND event LIKE 'refund%' ORDER BY id").fetchall()]
+    journaled = db.execute("SELECT state FROM sweep_journal WHERE invoice_id='a' AND kind='refund'").fetchone()[0]
+    db.close()
+    assert events == [("refund_sent", "0xnative3"), ("refund_mined", "0xnative3")]
+    assert journaled == "mined"
+
+def test_create_app_leaves_web3_unloaded(tmp_path):
+    import os, subprocess, sys
+    env = dict(os.environ, DB_PATH=str(tmp_path / "boot.db"), AUTO_UPDATE="false")
+    code = "import sys; from app import create_app; create_app(); print(sorted(m for m in ('web3', 'bip_utils') if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, timeout=60)
+    assert out.stdout.strip().splitlines()[-1] == "[]", out.stderr
@@ -0,0 +1,108 @@
+import json
+import threading
+import pytest
+from app.db import open_db
+from app.services.invoices import update_invoice, get_invoice, committed
+from app.services.events import invoice_events
+from app.services import webhooks
+from app.services.webhooks import Dispatcher, retry, outbox_counts
+
+@pytest.fixture(autouse=True)
+def idle_dispatcher():
+    running = webhooks.dispatcher._thread is not None
+    webhooks.dispatcher.stop()
+    yield
+    if running:
+        webhooks.dispatcher.start()
+
+def _invoice(insert_invoice, invoice_id, webhook_url="https://merchant.example/hook"):
+    insert_invoice(invoice_id, webhook_url=webhook_url, metadata={"order_id": "A1"})
+
+def _outbox(db):
+    return [dict(r) for r in db.execute("SELECT * FROM webhook_outbox ORDER BY id").fetchall()]
+
+def test_status_change_writes_outbox_in_same_transaction(db, insert_invoice):
+    _invoice(insert_invoice, "inv1")
+    _invoice(insert_invoice, "inv2", webhook_url="")
+    update_invoice(db, "inv1", commit=False, status="confirming")
+    db.rollback()
+    assert _outbox(db) == []
+    update_invoice(db, "inv1", status="confirming")
+    update_invoice(db, "inv1", status="sweeping")
+    update_invoice(db, "inv1", status="completed", tx_out_hash="0xout")
+    update_invoice(db, "inv2", status="expired")
+    rows = _outbox(db)
+    assert [r["event"] for r in rows] == ["payment.confirming", "payment.completed"]
+    payload = json.loads(rows[1]["payload"])
+    assert payload["invoice_id"] == "inv1" and payload["tx_out_hash"] == "0xout" and payload["metadata"] == {"order_id": "A1"}
+
+def test_uncommitted_update_is_not_cached_stale(db, db_path, insert_invoice):
+    _invoice(insert_invoice, "inv3")
+    update_invoice(db, "inv3", commit=False, status="confirming")
+    assert get_invoice("inv3", lambda: open_db(db_path))[0]["status"] == "pending"
+    db.commit()
+    committed("inv3")
+    assert get_invoice("inv3", lambda: open_db(db_path))[0]["status"] == "confirming"
+
+def test_delivery_retries_with_backoff_then_dead_letters(db, insert_invoice, monkeypatch):
+    monkeypatch.setenv("WEBHOOK_MAX_ATTEMPTS", "3")
+    monkeypatch.setenv("WEBHOOK_BACKOFF_SECONDS", "0")
+    _invoice(insert_invoice, "inv1")
+    update_invoice(db, "inv1", status="expired")
+    responses = iter([500, ConnectionError("refused"), 502])
+    def send(row):
+        result = next(responses)
+        if isinstance(result, Exception):
+            raise result
+        return result
+    dispatcher = Dispatcher(send=send)
+    for _ in range(3):
+        [f.result() for f in dispatcher.tick()]
+    row = _outbox(db)[0]
+    assert (row["state"], row["attempts"], row["last_status"]) == ("dead", 3, 502)
+    assert dispatcher.snapshot()["retries"] == 2
+    assert [e["event"] for e in invoice_events(db, "inv1")] == ["webhook_dead"]
+    assert retry() == 1
+    dispatcher._send = lambda row: 200
+    [f.result() for f in dispatcher.tick()]
+    assert outbox_counts(db) == {"delivered": 1}
+    assert invoice_events(db, "inv1")[-1]["detail"] == "payment.expired 200"
+
+def test_failed_delivery_is_scheduled_with_exponential_backoff(db, insert_invoice, monkeypatch):
+    monkeypatch.setenv("WEBHOOK_BACKOFF_SECONDS", "60")
+    _invoice(insert_invoice, "inv1")
+    update_invoice(db, "inv1", status="confirming")
+    dispatcher = Dispatcher(send=lambda row: 503)
+    [f.result() for f in dispatcher.tick()]
+    assert dispatcher.tick() == []
+    row = _outbox(db)[0]
+    assert row["state"] == "pending" and row["attempts"] == 1 and row["next_attempt_at"] > row["created_at"]
+
+def test_events_for_one_invoice_are_delivered_in_order(db, insert_invoice):
+    _invoice(insert_invoice, "inv1")
+    _invoice(insert_invoice, "inv2", webhook_url="https://other.example/hook")
+    update_invoice(db, "inv1", status="confirming")
+    update_invoice(db, "inv1", status="completed")
+    update_invoice(db, "inv2", status="confirming")
+    delivered = []
+    dispatcher = Dispatcher(send=lambda row: delivered.append((row["invoice_id"], row["event"])) or 204)
+    [f.result() for f in dispatcher.tick()]
+    assert sorted(delivered) == [("inv1", "payment.confirming"), ("inv2", "payment.confirming")]
+    [f.result() for f in dispatcher.tick()]
+    assert delivered[-1] == ("inv1", "payment.completed")
+
+def test_rows_are_claimed_by_one_process_only(db, insert_invoice):
+    _invoice(insert_invoice, "inv1")
+    update_invoice(db, "inv1", status="confirming")
+    delivered, gate = [], threading.Event()
+    first = Dispatcher(send=lambda row: gate.wait(5) and delivered.append("first") or 200)
+    second = Dispatcher(send=lambda row: delivered.append("second") or 200)
+    futures = first.tick()
+    assert len(futures) == 1 and second.tick() == []
+    gate.set()
+    [f.result() for f in futures]
+    assert delivered == ["first"] and outbox_counts(db) == {"delivered": 1}
+    update_invoice(db, "inv1", status="completed")
+    assert first.stop() and first.tick() == []
+    [f.result() for f in second.tick()]
+    assert delivered == ["first", "second"]
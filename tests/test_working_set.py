@@ -0,0 +1,28 @@
+from datetime import datetime, timezone, timedelta
+from app.services import working_set
+from app.services.invoices import write_invoice
+
+def test_loads_open_invoices_and_tracks_transitions(insert_invoice):
+    insert_invoice("a", 1, deposit_address="0xDep1", expires_in=timedelta(minutes=30))
+    insert_invoice("b", 2, status="completed", expires_in=timedelta(minutes=30))
+    assert working_set.load() == 1
+    assert working_set.by_address("0xdep1").id == "a"
+    insert_invoice("c", 3, expires_in=timedelta(minutes=30))
+    working_set.refresh("c")
+    assert sorted(r.id for r in working_set.snapshot()) == ["a", "c"]
+    write_invoice("a", status="confirming")
+    assert [r.id for r in working_set.snapshot(statuses=("pending",))] == ["c"]
+    write_invoice("a", status="completed")
+    assert working_set.by_address("0xdep1") is None
+    assert [r.id for r in working_set.snapshot()] == ["c"]
+
+def test_expiring_is_ordered_and_stops_after_transition(insert_invoice):
+    insert_invoice("late", 1, expires_in=timedelta(minutes=-1))
+    insert_invoice("early", 2, expires_in=timedelta(minutes=-5))
+    insert_invoice("open", 3, expires_in=timedelta(minutes=30))
+    working_set.load()
+    now = datetime.now(timezone.utc).timestamp()
+    assert [r.id for r in working_set.expiring(now)] == ["early", "late"]
+    assert [r.id for r in working_set.expiring(now)] == ["early", "late"]
+    write_invoice("early", status="expired")
+    assert [r.id for r in working_set.expiring(now)] == ["late"]
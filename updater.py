@@ -1,23 +1,25 @@
 import sys
 import os
-import asyncio
+import shutil
 import hashlib
 import logging
 from pathlib import Path
-import aiohttp
 
 GITHUB_REPO = "FrenchToblerone54/ghostpayments"
 COMPONENT = "ghostpayments"
 logger = logging.getLogger(__name__)
 
 class Updater:
-    def __init__(self, check_interval=300, check_on_startup=True, http_proxy="", https_proxy=""):
+    def __init__(self, check_interval=300, check_on_startup=True, http_proxy="", https_proxy="", restart=None):
         self.check_interval = check_interval
+        self.restart = restart
         self.check_on_startup = check_on_startup
         self.http_proxy = http_proxy
         self.https_proxy = https_proxy
         self.current_version = self._get_current_version()
-        self.binary_url = f"https://github.com/{GITHUB_REPO}/releases/latest/download/{COMPONENT}"
+        self.layout = self._get_layout()
+        artifact = f"{COMPONENT}-onedir.tar.gz" if self.layout == "onedir" else COMPONENT
+        self.binary_url = f"https://github.com/{GITHUB_REPO}/releases/latest/download/{artifact}"
         self.check_url = f"https://api.github.com/repos/{GITHUB_REPO}/releases/latest"
 
     def _get_current_version(self):
@@ -26,6 +28,11 @@ class Updater:
             return "v0.1.15"
         return "dev"
 
+    def _get_layout(self):
+        if getattr(sys, "frozen", False) and (Path(sys.executable).resolve().parent / "_internal").is_dir():
+            return "onedir"
+        return "onefile"
+
     def _proxy_for(self, url):
         if url.startswith("https://") and self.https_proxy:
             return self.https_proxy
@@ -34,6 +41,7 @@ class Updater:
         return None
 
     async def http_get(self, url, timeout=10):
+        import aiohttp
         proxy = self._proxy_for(url)
         async with aiohttp.ClientSession() as session:
             async with session.get(url, proxy=proxy, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
@@ -41,6 +49,7 @@ class Updater:
                 return await resp.json()
 
     async def http_download(self, url, output_path, timeout=300):
+        import aiohttp
         proxy = self._proxy_for(url)
         async with aiohttp.ClientSession() as session:
             async with session.get(url, proxy=proxy, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
@@ -77,8 +86,8 @@ class Updater:
     async def download_update(self, new_version):
         tmp_dir = Path(f"/tmp/ghostpayments-update-{os.getpid()}")
         tmp_dir.mkdir(parents=True, exist_ok=True)
-        binary_path = tmp_dir / COMPONENT
-        sha_path = tmp_dir / f"{COMPONENT}.sha256"
+        binary_path = tmp_dir / self.binary_url.rsplit("/", 1)[1]
+        sha_path = tmp_dir / f"{binary_path.name}.sha256"
         logger.info(f"Downloading update from {self.binary_url}")
         await self.http_download(self.binary_url, binary_path, 300)
         await self.http_download(f"{self.binary_url}.sha256", sha_path, 30)
@@ -87,11 +96,32 @@ class Updater:
             logger.error("Checksum mismatch — aborting update")
             return
         logger.info("Checksum verified")
-        current_bin = Path(sys.argv[0]).resolve()
-        os.chmod(binary_path, 0o755)
-        args = " ".join(sys.argv[1:])
+        if self.layout == "onedir":
+            import tarfile
+            with tarfile.open(binary_path) as tar:
+                tar.extractall(tmp_dir, filter="data")
+            install_dir = Path(sys.executable).resolve().parent
+            backup = Path(f"{install_dir}.old")
+            shutil.rmtree(backup, ignore_errors=True)
+            os.rename(install_dir, backup)
+            shutil.move(str(tmp_dir / COMPONENT), install_dir)
+            def rollback():
+                shutil.rmtree(install_dir, ignore_errors=True)
+                os.rename(backup, install_dir)
+        else:
+            current_bin = Path(sys.argv[0]).resolve()
+            staged = current_bin.with_name(f".{current_bin.name}.new")
+            backup = current_bin.with_name(f".{current_bin.name}.old")
+            shutil.copy2(binary_path, staged)
+            os.chmod(staged, 0o755)
+            backup.unlink(missing_ok=True)
+            os.link(current_bin, backup)
+            os.replace(staged, current_bin)
+            def rollback():
+                os.replace(backup, current_bin)
         logger.info(f"Successfully updated to {new_version}, restarting...")
-        os.execv("/bin/bash", ["/bin/bash", "-c", f"sleep 0.5; mv '{binary_path}' '{current_bin}'; exec '{current_bin}' {args}"])
+        if self.restart is not None:
+            self.restart(rollback=rollback)
 
     async def manual_update(self):
         if not self.http_proxy:
@@ -107,9 +137,10 @@ class Updater:
         print(f"Update available: {new_version}")
         await self.download_update(new_version)
         print("Restarting service...")
-        os.system("systemctl restart ghostpayments")
+        os.system("systemctl reload-or-restart ghostpayments")
 
     async def update_loop(self, shutdown_event):
+        import asyncio
         logger.info(f"Auto-update checker started (interval: {self.check_interval}s, current version: {self.current_version})")
         if self.check_on_startup:
             logger.info("Checking for updates on startup...")